@@ -16,16 +16,28 @@ from ROOT import RooFormulaVar, RooGenericPdf, RooGaussian, RooExponential, RooP
 from ROOT import PdfDiagonalizer, RooAlphaExp, RooErfExpPdf, Roo2ExpPdf, RooAlpha42ExpPdf, RooExpNPdf, RooAlpha4ExpNPdf, RooExpTailPdf, RooAlpha4ExpTailPdf, RooAlpha
 
 from tools.utils import *
+from tools.columns import loadColumns, fileColumns, selectFiles, columnsToTree, sampleFiles
+from tools.regions import partition, rangeCut
+from tools.events import EventStore
+from tools.integrals import rangeIntegrals
+from tools.fitcache import cachedFit
+from tools.gradfit import gradientFit, gradients
+from tools.seeds import getSeed, applySeed, saveSeed
 
 import optparse
 usage = "usage: %prog [options]"
 parser = optparse.OptionParser(usage)
 parser.add_option("-a", "--all", action="store_true", default=False, dest="all")
 parser.add_option("-b", "--bash", action="store_true", default=False, dest="bash")
+parser.add_option("-B", "--binned", action="store_true", default=False, dest="binned")
 parser.add_option("-c", "--channel", action="store", type="string", dest="channel", default="")
 parser.add_option("-d", "--different", action="store_true", default=False, dest="different")
 parser.add_option("-e", "--extrapolate", action="store_true", default=False, dest="extrapolate")
+parser.add_option("-f", "--fitcache", action="store_true", default=False, dest="fitcache")
+parser.add_option("-g", "--gradient", action="store_true", default=False, dest="gradient")
+parser.add_option("-k", "--cache", action="store_true", default=False, dest="cache")
 parser.add_option("-v", "--verbose", action="store_true", default=False, dest="verbose")
+parser.add_option("-w", "--warmstart", action="store_true", default=False, dest="warmstart")
 (options, args) = parser.parse_args()
 if options.bash: gROOT.SetBatch(True)
 
@@ -37,6 +49,7 @@ gStyle.SetPadTopMargin(0.06)
 gStyle.SetPadRightMargin(0.05)
 
 NTUPLEDIR   = "ntuples/"
+CACHEDIR    = "ntuples/cache/"
 PLOTDIR     = "plotsAlpha/"
 RATIO       = 4
 SHOWERR     = True
@@ -46,6 +59,11 @@ BLIND       = True if not EXTRAPOLATE else False
 LUMISILVER  = 2460.
 LUMIGOLDEN  = 2110.
 VERBOSE     = options.verbose
+CACHE       = options.cache
+BINNED      = options.binned
+FITCACHE    = options.fitcache
+GRADIENT    = options.gradient
+WARMSTART   = options.warmstart
 
 channelList = ['XZhnnb', 'XZhnnbb', 'XWhenb', 'XWhenbb', 'XWhmnb', 'XWhmnbb', 'XZheeb', 'XZhmmb', 'XZheebb', 'XZhmmbb']
 
@@ -69,10 +87,89 @@ XBINS  = 17
 
 
 
+# Branches read from the columnar cache in addition to the X mass, same as the RooArgSet in alpha()
+BRANCHES = ["fatjet1_prunedMassCorr", "fatjet1_CSVR1", "fatjet1_CSVR2", "fatjet1_nBtag", "bjet1_CSVR", "isZtoEE", "isZtoMM", "isWtoEN", "isWtoMN", "eventWeightLumi"]
+
 ########## ######## ##########
 
 
-def alpha(channel):
+# Sum of weights in a region, from the event store when the columnar cache is used
+def regionEntries(dataset, store, cut, names):
+    return store.sumWeights(names) if store is not None else dataset.sumEntries(cut)
+
+
+# Dataset used in the fits: the weighted events, or with --binned their histogram in the bins of the variable
+def fitData(name, var, dataset, store):
+    if not BINNED: return dataset
+    if store is not None: return store.dataHist(name, var)
+    return RooDataHist(name, name, RooArgSet(var), dataset)
+
+
+# Fit of a MC template, or with --fitcache the stored result of the same fit (same events, function, parameter ranges and fit range).
+# With --gradient the unbinned fits of the shapes in tools/gradfit.py (pars in the same order as in the constructor) use analytic gradients.
+# With --warmstart the fit starts from the last converged parameters of the same component and function in the nearest channel.
+def fitTemplate(model, component, var, dataset, store, fitFunc, pars=[], channel=""):
+    data = fitData("hist"+component, var, dataset, store)
+    options = [RooFit.SumW2Error(True), RooFit.Range("h_reasonable_range"), RooFit.Strategy(2), RooFit.Minimizer("Minuit2"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1)]
+    def fit():
+        if WARMSTART: applySeed(model, var, getSeed(channel, component, fitFunc, channelList))
+        if GRADIENT and not BINNED and fitFunc in gradients: fr = gradientFit(model, data, var, "h_reasonable_range", fitFunc, pars, store, options)
+        else: fr = model.fitTo(data, *options)
+        if WARMSTART and fr.status() == 0: saveSeed(channel, component, fitFunc, model, var)
+        return fr
+    if FITCACHE: return cachedFit(fit, model, data, var, "h_reasonable_range", fitFunc + ("/gradient" if GRADIENT else ""), store if not BINNED else None)
+    return fit()
+
+
+# Tree, trigger, mass variable and base selection of a channel
+def channelSelection(channel):
+    nElec = channel.count('e')
+    nLept = nElec + channel.count('m')
+    nBtag = channel.count('b')
+    if nLept == 0:
+        treeName = 'SR'
+        triName = "HLT_PFMET"
+        leptCut = "0==0"
+        topVeto = selection["TopVetocut"]
+        massVar = "X_cmass"
+    elif nLept == 1:
+        treeName = 'WCR'
+        triName = "HLT_Ele" if nElec > 0 else "HLT_Mu"
+        leptCut = "isWtoEN" if nElec > 0 else "isWtoMN"
+        topVeto = selection["TopVetocut"]
+        massVar = "X_mass"
+    else:
+        treeName = 'XZh'
+        triName = "HLT_Ele" if nElec > 0 else "HLT_Mu"
+        leptCut = "isZtoEE" if nElec > 0 else "isZtoMM"
+        topVeto = "0==0"
+        massVar = "X_mass"
+    btagCut = selection["2Btag"] if nBtag == 2 else selection["1Btag"]
+    baseCut = leptCut + " && " + btagCut + "&&" + topVeto
+    baseCut += " && " + massVar + ">%d" % XBINMIN
+    return treeName, triName, massVar, baseCut
+
+
+# Read every input file once for all the channels: each event is routed to the channels whose base selection it passes
+def readChannels(channels):
+    inputs = {}
+    for treeName in set([channelSelection(c)[0] for c in channels]):
+        group = [c for c in channels if channelSelection(c)[0] == treeName]
+        branches = BRANCHES + list(set([channelSelection(c)[2] for c in group]))
+        # Memory maps of each file, only the events passing the base selection of a channel are read into memory
+        colVjet = fileColumns(sampleFiles(["WJetsToLNu_HT", "DYJetsToNuNu_HT", "DYJetsToLL_HT"]), treeName, branches, NTUPLEDIR, CACHEDIR)
+        colVV = fileColumns(sampleFiles(["VV"]), treeName, branches, NTUPLEDIR, CACHEDIR)
+        colTop = fileColumns(sampleFiles(["ST", "TTbar"]), treeName, branches, NTUPLEDIR, CACHEDIR)
+        colData = {}
+        for c in group:
+            t, triName, massVar, baseCut = channelSelection(c)
+            if not triName in colData: colData[triName] = fileColumns(getPrimaryDataset(triName), treeName, branches, NTUPLEDIR, CACHEDIR)
+            inputs[c] = tuple([selectFiles(parts, branches, baseCut) for parts in [colData[triName], colVjet, colVV, colTop]])
+            print "  Channel", c, "preselected: data %d, V+jets %d, VV %d, Top %d" % tuple([len(x[massVar]) for x in inputs[c]])
+    return inputs
+
+
+def alpha(channel, inputs=None):
 
     nElec = channel.count('e')
     nMuon = channel.count('m')
@@ -82,13 +179,8 @@ def alpha(channel):
     # Channel-dependent settings
     # Background function. Semi-working options are: EXP, EXP2, EXPN, EXPTAIL
     if nLept == 0:
-        treeName = 'SR'
         signName = 'XZh'
         colorVjet = sample['DYJetsToNuNu']['linecolor']
-        triName = "HLT_PFMET"
-        leptCut = "0==0"
-        topVeto = selection["TopVetocut"]
-        massVar = "X_cmass"
         binFact = 1
         #fitFunc = "EXP"
         #fitFunc = "EXP2"
@@ -100,13 +192,8 @@ def alpha(channel):
         fitFuncVV   = "EXPGAUS"
         fitFuncTop  = "GAUS2"
     elif nLept == 1:
-        treeName = 'WCR'
         signName = 'XWh'
         colorVjet = sample['WJetsToLNu']['linecolor']
-        triName = "HLT_Ele" if nElec > 0 else "HLT_Mu"
-        leptCut = "isWtoEN" if nElec > 0 else "isWtoMN"
-        topVeto = selection["TopVetocut"]
-        massVar = "X_mass"
         binFact = 2
         if nElec > 0:
             fitFunc = "EXP" if nBtag < 2 else "EXP"
@@ -118,13 +205,8 @@ def alpha(channel):
         fitFuncVV   = "EXPGAUS"
         fitFuncTop  = "GAUS3" if nBtag < 2 else "GAUS2"
     else:
-        treeName = 'XZh'
         signName = 'XZh'
         colorVjet = sample['DYJetsToLL']['linecolor']
-        triName = "HLT_Ele" if nElec > 0 else "HLT_Mu"
-        leptCut = "isZtoEE" if nElec > 0 else "isZtoMM"
-        topVeto = "0==0"
-        massVar = "X_mass"
         binFact = 5
         if nElec > 0:
             fitFunc = "EXP" if nBtag < 2 else "EXP"
@@ -136,7 +218,7 @@ def alpha(channel):
         fitFuncVV   = "EXPGAUS2"
         fitFuncTop  = "GAUS"
     
-    btagCut = selection["2Btag"] if nBtag == 2 else selection["1Btag"]
+    treeName, triName, massVar, baseCut = channelSelection(channel)
     
     print "--- Channel", channel, "---"
     print "  number of electrons:", nElec, " muons:", nMuon, " b-tags:", nBtag
@@ -179,12 +261,7 @@ def alpha(channel):
     J_mass.setRange("SRrange",  SIGMIN, SIGMAX)
     J_mass.setBins(54)
     
-    # Define the selection for the various categories (base + SR / LSBcut / HSBcut )
-    baseCut = leptCut + " && " + btagCut + "&&" + topVeto
-    massCut = massVar + ">%d" % XBINMIN
-    baseCut += " && " + massCut
-    
-    # Cuts
+    # Cuts for the various categories (base + SR / LSBcut / HSBcut )
     SRcut  = baseCut + " && %s>%d && %s<%d" % (J_mass.GetName(), SIGMIN, J_mass.GetName(), SIGMAX)
     LSBcut = baseCut + " && %s>%d && %s<%d" % (J_mass.GetName(), LOWMIN, J_mass.GetName(), LOWMAX)
     HSBcut = baseCut + " && %s>%d && %s<%d" % (J_mass.GetName(), HIGMIN, J_mass.GetName(), HIGMAX)
@@ -215,44 +292,76 @@ def alpha(channel):
     # Read data
     pd = getPrimaryDataset(triName)
     if len(pd)==0: raw_input("Warning: Primary Dataset not recognized, continue?")
-    for i, s in enumerate(pd): treeData.Add(NTUPLEDIR + s + ".root")
     
-    # Read V+jets backgrounds
-    for i, s in enumerate(["WJetsToLNu_HT", "DYJetsToNuNu_HT", "DYJetsToLL_HT"]):
-        for j, ss in enumerate(sample[s]['files']): treeVjet.Add(NTUPLEDIR + ss + ".root")
+    if CACHE and inputs is not None:
+        # Columns already read and preselected by readChannels()
+        colData, colVjet, colVV, colTop = inputs
     
-    # Read VV backgrounds
-    for i, s in enumerate(["VV"]):
-        for j, ss in enumerate(sample[s]['files']): treeVV.Add(NTUPLEDIR + ss + ".root")
+    elif CACHE:
+        # Read only the branches in 'variables' from the columnar cache (filled on first use), and only the events passing baseCut
+        branches = variables.contentsString().split(',')
+        colData = loadColumns(pd, treeName, branches, NTUPLEDIR, CACHEDIR, baseCut)
+        colVjet = loadColumns(sampleFiles(["WJetsToLNu_HT", "DYJetsToNuNu_HT", "DYJetsToLL_HT"]), treeName, branches, NTUPLEDIR, CACHEDIR, baseCut)
+        colVV = loadColumns(sampleFiles(["VV"]), treeName, branches, NTUPLEDIR, CACHEDIR, baseCut)
+        colTop = loadColumns(sampleFiles(["ST", "TTbar"]), treeName, branches, NTUPLEDIR, CACHEDIR, baseCut)
     
-    # Read Top backgrounds
-    for i, s in enumerate(["ST", "TTbar"]):
-        for j, ss in enumerate(sample[s]['files']): treeTop.Add(NTUPLEDIR + ss + ".root")
+    else:
+        for i, s in enumerate(pd): treeData.Add(NTUPLEDIR + s + ".root")
+        
+        # Read V+jets backgrounds
+        for i, s in enumerate(["WJetsToLNu_HT", "DYJetsToNuNu_HT", "DYJetsToLL_HT"]):
+            for j, ss in enumerate(sample[s]['files']): treeVjet.Add(NTUPLEDIR + ss + ".root")
         
-    # Sum all background MC
-    treeMC.Add(treeVjet)
-    treeMC.Add(treeVV)
-    treeMC.Add(treeTop)
-    
-    # create a dataset to host data in sideband (using this dataset we are automatically blind in the SR!)
-    setDataSB = RooDataSet("setDataSB", "setDataSB", variables, RooFit.Cut(SBcut), RooFit.WeightVar(weight), RooFit.Import(treeData))
-    setDataLSB = RooDataSet("setDataLSB", "setDataLSB", variables, RooFit.Import(setDataSB), RooFit.Cut(LSBcut), RooFit.WeightVar(weight))
-    setDataHSB = RooDataSet("setDataHSB", "setDataHSB", variables, RooFit.Import(setDataSB), RooFit.Cut(HSBcut), RooFit.WeightVar(weight))
-    
-    # Observed data (WARNING, BLIND!)
-    setDataSR = RooDataSet("setDataSR", "setDataSR", variables, RooFit.Cut(SRcut), RooFit.WeightVar(weight), RooFit.Import(treeData))
-    setDataVR = RooDataSet("setDataVR", "setDataVR", variables, RooFit.Cut(VRcut), RooFit.WeightVar(weight), RooFit.Import(treeData)) # Observed in the VV mass, just for plotting purposes
-    
-    # same for the bkg datasets from MC, where we just apply the base selections (not blind)
-    setVjet = RooDataSet("setVjet", "setVjet", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeVjet))
-    setVjetSB = RooDataSet("setVjetSB", "setVjetSB", variables, RooFit.Import(setVjet), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
-    setVjetSR = RooDataSet("setVjetSR", "setVjetSR", variables, RooFit.Import(setVjet), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
-    setVV = RooDataSet("setVV", "setVV", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeVV))
-    setVVSB = RooDataSet("setVVSB", "setVVSB", variables, RooFit.Import(setVV), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
-    setVVSR = RooDataSet("setVVSR", "setVVSR", variables, RooFit.Import(setVV), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
-    setTop = RooDataSet("setTop", "setTop", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeTop))
-    setTopSB = RooDataSet("setTopSB", "setTopSB", variables, RooFit.Import(setTop), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
-    setTopSR = RooDataSet("setTopSR", "setTopSR", variables, RooFit.Import(setTop), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
+        # Read VV backgrounds
+        for i, s in enumerate(["VV"]):
+            for j, ss in enumerate(sample[s]['files']): treeVV.Add(NTUPLEDIR + ss + ".root")
+        
+        # Read Top backgrounds
+        for i, s in enumerate(["ST", "TTbar"]):
+            for j, ss in enumerate(sample[s]['files']): treeTop.Add(NTUPLEDIR + ss + ".root")
+        
+        # Sum all background MC
+        treeMC.Add(treeVjet)
+        treeMC.Add(treeVV)
+        treeMC.Add(treeTop)
+    
+    if CACHE:
+        # Single pass per input: evaluate baseCut (and the variable ranges applied by RooDataSet) once, then assign each event to its J_mass region with one lookup
+        regions = [("LSB", (LOWMIN, LOWMAX)), ("VR", (LOWMAX, SIGMIN)), ("SR", (SIGMIN, SIGMAX)), ("HSB", (HIGMIN, HIGMAX))]
+        storeCut = baseCut + " && " + rangeCut(variables)
+        
+        # Event stores sorted as LSB, HSB, VR, SR: the regions are views on the same arrays, and only the datasets that are fitted are created
+        storeData = EventStore(colData, weight.GetName(), *partition(colData, storeCut, J_mass.GetName(), regions), regions=regions, order=["LSB", "HSB", "VR", "SR"])
+        storeVjet = EventStore(colVjet, weight.GetName(), *partition(colVjet, storeCut, J_mass.GetName(), regions), regions=regions, order=["LSB", "HSB", "VR", "SR"])
+        storeVV = EventStore(colVV, weight.GetName(), *partition(colVV, storeCut, J_mass.GetName(), regions), regions=regions, order=["LSB", "HSB", "VR", "SR"])
+        storeTop = EventStore(colTop, weight.GetName(), *partition(colTop, storeCut, J_mass.GetName(), regions), regions=regions, order=["LSB", "HSB", "VR", "SR"])
+        
+        setDataSB = storeData.dataSet("setDataSB", variables, weight, ["LSB", "HSB"])
+        setVjet = storeVjet.dataSet("setVjet", variables, weight)
+        setVV = storeVV.dataSet("setVV", variables, weight)
+        setTop = storeTop.dataSet("setTop", variables, weight)
+    
+    else:
+        # create a dataset to host data in sideband (using this dataset we are automatically blind in the SR!)
+        setDataSB = RooDataSet("setDataSB", "setDataSB", variables, RooFit.Cut(SBcut), RooFit.WeightVar(weight), RooFit.Import(treeData))
+        setDataLSB = RooDataSet("setDataLSB", "setDataLSB", variables, RooFit.Import(setDataSB), RooFit.Cut(LSBcut), RooFit.WeightVar(weight))
+        setDataHSB = RooDataSet("setDataHSB", "setDataHSB", variables, RooFit.Import(setDataSB), RooFit.Cut(HSBcut), RooFit.WeightVar(weight))
+    
+        # Observed data (WARNING, BLIND!)
+        setDataSR = RooDataSet("setDataSR", "setDataSR", variables, RooFit.Cut(SRcut), RooFit.WeightVar(weight), RooFit.Import(treeData))
+        setDataVR = RooDataSet("setDataVR", "setDataVR", variables, RooFit.Cut(VRcut), RooFit.WeightVar(weight), RooFit.Import(treeData)) # Observed in the VV mass, just for plotting purposes
+    
+        # same for the bkg datasets from MC, where we just apply the base selections (not blind)
+        setVjet = RooDataSet("setVjet", "setVjet", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeVjet))
+        setVjetSB = RooDataSet("setVjetSB", "setVjetSB", variables, RooFit.Import(setVjet), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
+        setVjetSR = RooDataSet("setVjetSR", "setVjetSR", variables, RooFit.Import(setVjet), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
+        setVV = RooDataSet("setVV", "setVV", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeVV))
+        setVVSB = RooDataSet("setVVSB", "setVVSB", variables, RooFit.Import(setVV), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
+        setVVSR = RooDataSet("setVVSR", "setVVSR", variables, RooFit.Import(setVV), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
+        setTop = RooDataSet("setTop", "setTop", variables, RooFit.Cut(baseCut), RooFit.WeightVar(weight), RooFit.Import(treeTop))
+        setTopSB = RooDataSet("setTopSB", "setTopSB", variables, RooFit.Import(setTop), RooFit.Cut(SBcut), RooFit.WeightVar(weight))
+        setTopSR = RooDataSet("setTopSR", "setTopSR", variables, RooFit.Import(setTop), RooFit.Cut(SRcut), RooFit.WeightVar(weight))
+        storeData = storeVjet = storeVV = storeTop = None
     
     print "  Data events SB: %.2f" % setDataSB.sumEntries()
     print "  V+jets entries: %.2f" % setVjet.sumEntries()
@@ -272,13 +381,13 @@ def alpha(channel):
     entryVV = RooRealVar("entryVV",  "VV normalization", setVV.sumEntries(), 0., 1.e6)
     entryTop = RooRealVar("entryTop",  "Top normalization", setTop.sumEntries(), 0., 1.e6)
     
-    entrySB = RooRealVar("entrySB",  "Data SB normalization", setDataSB.sumEntries(SBcut), 0., 1.e6)
+    entrySB = RooRealVar("entrySB",  "Data SB normalization", regionEntries(setDataSB, storeData, SBcut, ["LSB", "HSB"]), 0., 1.e6)
     entrySB.setError(math.sqrt(entrySB.getVal()))
     
-    entryLSB = RooRealVar("entryLSB",  "Data LSB normalization", setDataSB.sumEntries(LSBcut), 0., 1.e6)
+    entryLSB = RooRealVar("entryLSB",  "Data LSB normalization", regionEntries(setDataSB, storeData, LSBcut, ["LSB"]), 0., 1.e6)
     entryLSB.setError(math.sqrt(entryLSB.getVal()))
 
-    entryHSB = RooRealVar("entryHSB",  "Data HSB normalization", setDataSB.sumEntries(HSBcut), 0., 1.e6)
+    entryHSB = RooRealVar("entryHSB",  "Data HSB normalization", regionEntries(setDataSB, storeData, HSBcut, ["HSB"]), 0., 1.e6)
     entryHSB.setError(math.sqrt(entryHSB.getVal()))
     
     #*******************************************************#
@@ -320,20 +429,20 @@ def alpha(channel):
         exit()
     
     # fit to main bkg in MC (whole range)
-    frVjet = modelVjet.fitTo(setVjet, RooFit.SumW2Error(True), RooFit.Range("h_reasonable_range"), RooFit.Strategy(2), RooFit.Minimizer("Minuit2"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
+    frVjet = fitTemplate(modelVjet, "Vjet", J_mass, setVjet, storeVjet, fitFuncVjet, [constVjet, offsetVjet, widthVjet] if fitFuncVjet == "ERFEXP" else [constVjet], channel)
     
-    # integrals and number of events
+    # integrals and number of events: the RooFit integrals enter the extrapolation formulas below (and their propagated errors),
+    # the fractions of the fit come from the closed forms
     iSBVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
     iLSBVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange"))
     iHSBVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("HSBrange"))
     iSRVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
     iVRVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("VRrange"))
-    # Do not remove the following lines, integrals are computed here
-    iALVjet = modelVjet.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg))
-    nSBVjet = iSBVjet.getVal()/iALVjet.getVal()*setVjet.sumEntries(SBcut)
-    nLSBVjet = iLSBVjet.getVal()/iALVjet.getVal()*setVjet.sumEntries(LSBcut)
-    nHSBVjet = iHSBVjet.getVal()/iALVjet.getVal()*setVjet.sumEntries(HSBcut)
-    nSRVjet = iSRVjet.getVal()/iALVjet.getVal()*setVjet.sumEntries(SRcut)
+    fVjet = rangeIntegrals(modelVjet, J_mass, ["LSBrange,HSBrange", "LSBrange", "HSBrange", "SRrange"], fitFuncVjet, [constVjet, offsetVjet, widthVjet] if fitFuncVjet == "ERFEXP" else [constVjet])
+    nSBVjet = fVjet["LSBrange,HSBrange"]*regionEntries(setVjet, storeVjet, SBcut, ["LSB", "HSB"])
+    nLSBVjet = fVjet["LSBrange"]*regionEntries(setVjet, storeVjet, LSBcut, ["LSB"])
+    nHSBVjet = fVjet["HSBrange"]*regionEntries(setVjet, storeVjet, HSBcut, ["HSB"])
+    nSRVjet = fVjet["SRrange"]*regionEntries(setVjet, storeVjet, SRcut, ["SR"])
     
     drawPlot("JetMass_Vjet", channel, J_mass, modelVjet, setVjet, binsJmass, frVjet)
 
@@ -373,7 +482,7 @@ def alpha(channel):
         exit()
     
     # fit to secondary bkg in MC (whole range)
-    frVV = modelVV.fitTo(setVV, RooFit.SumW2Error(True), RooFit.Range("h_reasonable_range"), RooFit.Strategy(2), RooFit.Minimizer("Minuit2"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
+    frVV = fitTemplate(modelVV, "VV", J_mass, setVV, storeVV, fitFuncVV, [], channel)
     
     # integrals and number of events
     iSBVV = modelVV.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
@@ -381,12 +490,11 @@ def alpha(channel):
     iHSBVV = modelVV.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("HSBrange"))
     iSRVV = modelVV.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
     iVRVV = modelVV.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("VRrange"))
-    # Do not remove the following lines, integrals are computed here
-    iALVV = modelVV.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg))
-    nSBVV = iSBVV.getVal()/iALVV.getVal()*setVV.sumEntries(SBcut)
-    nLSBVV = iLSBVV.getVal()/iALVV.getVal()*setVV.sumEntries(LSBcut)
-    nHSBVV = iHSBVV.getVal()/iALVV.getVal()*setVV.sumEntries(HSBcut)
-    nSRVV = iSRVV.getVal()/iALVV.getVal()*setVV.sumEntries(SRcut)
+    fVV = rangeIntegrals(modelVV, J_mass, ["LSBrange,HSBrange", "LSBrange", "HSBrange", "SRrange"])
+    nSBVV = fVV["LSBrange,HSBrange"]*regionEntries(setVV, storeVV, SBcut, ["LSB", "HSB"])
+    nLSBVV = fVV["LSBrange"]*regionEntries(setVV, storeVV, LSBcut, ["LSB"])
+    nHSBVV = fVV["HSBrange"]*regionEntries(setVV, storeVV, HSBcut, ["HSB"])
+    nSRVV = fVV["SRrange"]*regionEntries(setVV, storeVV, SRcut, ["SR"])
     rSBSRVV = nSRVV/nSBVV
     
     drawPlot("JetMass_VV", channel, J_mass, modelVV, setVV, binsJmass, frVV)
@@ -428,7 +536,7 @@ def alpha(channel):
         exit()
     
     # fit to secondary bkg in MC (whole range)
-    frTop = modelTop.fitTo(setTop, RooFit.SumW2Error(True), RooFit.Range("h_reasonable_range"), RooFit.Strategy(2), RooFit.Minimizer("Minuit2"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
+    frTop = fitTemplate(modelTop, "Top", J_mass, setTop, storeTop, fitFuncTop, [offsetTop, widthTop], channel)
     
     # integrals and number of events
     iSBTop = modelTop.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
@@ -436,12 +544,11 @@ def alpha(channel):
     iHSBTop = modelTop.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("HSBrange"))
     iSRTop = modelTop.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
     iVRTop = modelTop.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("VRrange"))
-    # Do not remove the following lines, integrals are computed here
-    iALTop = modelTop.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg))
-    nSBTop = iSBTop.getVal()/iALTop.getVal()*setTop.sumEntries(SBcut)
-    nLSBTop = iLSBTop.getVal()/iALTop.getVal()*setTop.sumEntries(LSBcut)
-    nHSBTop = iHSBTop.getVal()/iALTop.getVal()*setTop.sumEntries(HSBcut)
-    nSRTop = iSRTop.getVal()/iALTop.getVal()*setTop.sumEntries(SRcut)
+    fTop = rangeIntegrals(modelTop, J_mass, ["LSBrange,HSBrange", "LSBrange", "HSBrange", "SRrange"], fitFuncTop, [offsetTop, widthTop])
+    nSBTop = fTop["LSBrange,HSBrange"]*regionEntries(setTop, storeTop, SBcut, ["LSB", "HSB"])
+    nLSBTop = fTop["LSBrange"]*regionEntries(setTop, storeTop, LSBcut, ["LSB"])
+    nHSBTop = fTop["HSBrange"]*regionEntries(setTop, storeTop, HSBcut, ["HSB"])
+    nSRTop = fTop["SRrange"]*regionEntries(setTop, storeTop, SRcut, ["SR"])
     
     drawPlot("JetMass_Top", channel, J_mass, modelTop, setTop, binsJmass, frTop)
     
@@ -526,7 +633,7 @@ def alpha(channel):
     drawPlot("JetMass", channel, J_mass, model, setDataSB, binsJmass, None, None, "", bkgNorm, True)
 
     
-    print channel, "normalization = %.3f +/- %.3f, observed = %.0f" % (bkgYield, bkgYield_error, setDataSR.sumEntries() if not BLIND else -1)
+    print channel, "normalization = %.3f +/- %.3f, observed = %.0f" % (bkgYield, bkgYield_error, regionEntries(setDataSR if storeData is None else None, storeData, SRcut, ["SR"]) if not BLIND else -1) # no setDataSR with --cache
     if VERBOSE: raw_input("Press Enter to continue...")
     
     #exit()
@@ -687,8 +794,10 @@ def drawAlpha(name, channel, variable, alpha, bkgSB, bkgSR, fitRes, alpha2=None,
 jobs = []
 
 if options.all:
+    # With the cache, the files are read once here and the workers only get their own preselected columns
+    inputs = readChannels(channelList) if CACHE else {}
     for c in channelList:
-        p = multiprocessing.Process(target=alpha, args=(c,))
+        p = multiprocessing.Process(target=alpha, args=(c, inputs.get(c)))
         jobs.append(p)
         p.start()
 
@@ -16,6 +16,7 @@ from ROOT import RooFormulaVar, RooGenericPdf, RooGaussian, RooExponential, RooP
 from ROOT import PdfDiagonalizer, RooAlphaExp, RooErfExpPdf, Roo2ExpPdf, RooAlpha42ExpPdf, RooExpNPdf, RooAlpha4ExpNPdf, RooExpTailPdf, RooAlpha4ExpTailPdf, RooAlpha
 
 from tools.utils import *
+from tools.metadata import getCounter
 
 import optparse
 usage = "usage: %prog [options]"
@@ -249,10 +250,7 @@ def alpha(channel):
     for i, m in enumerate(massPoints):
         for j, ss in enumerate(sample["%s_M%d" % (signName, m)]['files']):
             treeSign[m].Add(NTUPLEDIR + ss + ".root")
-            sfile = TFile(NTUPLEDIR + ss + ".root", "READ")
-            shist = sfile.Get("Counters/Counter")
-            nevtSign[m] = shist.GetBinContent(1)
-            sfile.Close()
+            nevtSign[m] = getCounter(ss, "Counter", 1, NTUPLEDIR)
     
     # Sum all background MC
     treeMC.Add(treeVjet)
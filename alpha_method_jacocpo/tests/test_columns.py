@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+
+import os, sys, shutil, tempfile, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.columns import cacheColumns, loadColumns, fileStamp
+
+
+##################
+# COLUMNAR CACHE #
+##################
+
+# The cache is filled by hand, as root_numpy would, next to empty ntuples that only provide the stamps
+class ColumnCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ntupledir = os.path.join(self.dir, "ntuples") + "/"
+        self.cachedir = os.path.join(self.dir, "cache")
+        os.makedirs(self.ntupledir)
+        for name, n in [("a", 5), ("b", 7)]:
+            open(self.ntupledir + name + ".root", "w").close()
+            dst = os.path.join(self.cachedir, "tree", name, fileStamp(self.ntupledir + name + ".root").replace(" ", "_"))
+            os.makedirs(dst)
+            np.save(os.path.join(dst, "x.npy"), np.arange(n, dtype=np.float64))
+            np.save(os.path.join(dst, "w.npy"), np.full(n, 0.5))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_single_file_is_memory_mapped(self):
+        cols = loadColumns(["a"], "tree", ["x", "w"], self.ntupledir, self.cachedir)
+        self.assertTrue(isinstance(cols["x"], np.memmap))
+        self.assertTrue(np.array_equal(cols["x"], np.arange(5)))
+
+    def test_selection_over_files(self):
+        cols = loadColumns(["a", "b"], "tree", ["x", "w"], self.ntupledir, self.cachedir, "x>2")
+        self.assertTrue(np.array_equal(cols["x"], [3., 4., 3., 4., 5., 6.]))
+        self.assertEqual(len(cols["w"]), 6)
+        cols = loadColumns(["a", "b"], "tree", ["x"], self.ntupledir, self.cachedir)
+        self.assertEqual(len(cols["x"]), 12)
+
+    def test_stale_stamp_is_dropped(self):
+        stale = os.path.join(self.cachedir, "tree", "a", "0_0")
+        os.makedirs(stale)
+        dst = cacheColumns("a", "tree", ["x"], self.ntupledir, self.cachedir)
+        self.assertFalse(os.path.exists(stale))
+        self.assertEqual(sorted(os.listdir(dst)), ["w.npy", "x.npy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
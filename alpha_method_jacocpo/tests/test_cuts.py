@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+
+import os, sys, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.cuts import toPython, evalCut, CutCompiler
+
+
+################
+# CUT COMPILER #
+################
+
+def columns(n=1000, seed=1):
+    r = np.random.RandomState(seed)
+    return {
+        'x' : r.uniform(0., 3., n),
+        'y' : r.uniform(-1., 1., n),
+        'k' : r.randint(0, 3, n).astype(np.float64),
+        'fatjet1_CSVR1' : r.uniform(0., 1., n),
+        'fatjet1_CSVR2' : r.uniform(0., 1., n),
+    }
+
+
+class CutCompilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cols = columns()
+
+    def test_operators(self):
+        x, y, k = self.cols['x'], self.cols['y'], self.cols['k']
+        self.assertTrue(np.array_equal(evalCut("x>1 && y<0.5", self.cols), (x > 1) & (y < 0.5)))
+        self.assertTrue(np.array_equal(evalCut("x>1 || !(k==0)", self.cols), (x > 1) | (k != 0)))
+        self.assertTrue(np.array_equal(evalCut("k!=1 && abs(y)<=0.2", self.cols), (k != 1) & (np.abs(y) <= 0.2)))
+        self.assertTrue(np.array_equal(evalCut("x*2-1>y/0.5", self.cols), x*2-1 > y/0.5))
+
+    # the negation applies to its operand only, as in TTreeFormula
+    def test_not_precedence(self):
+        x, k = self.cols['x'], self.cols['k']
+        self.assertEqual(toPython("!k==0"), "(not k)==0")
+        self.assertTrue(np.array_equal(evalCut("!k==0", self.cols), np.logical_not(k) == 0))
+        self.assertTrue(np.array_equal(evalCut("!!(x>1) && !(k!=2)", self.cols), (x > 1) & (k == 2)))
+        self.assertTrue(np.array_equal(evalCut("! abs(x-1)>0.5", self.cols), (np.abs(x-1) == 0) > 0.5))
+
+    def test_ternary(self):
+        x, y = self.cols['x'], self.cols['y']
+        self.assertTrue(np.array_equal(evalCut("(x>1 ? y : -y)>0", self.cols), np.where(x > 1, y, -y) > 0))
+
+    def test_empty(self):
+        self.assertEqual(toPython(""), "1==1")
+        self.assertTrue(evalCut("", self.cols).all())
+
+    def test_selection_names(self):
+        c1, c2 = self.cols['fatjet1_CSVR1'], self.cols['fatjet1_CSVR2']
+        oneBtag = ((c1 > 0.605) & (c2 < 0.605)) | ((c1 < 0.605) & (c2 > 0.605))
+        self.assertTrue(np.array_equal(evalCut("1Btag && x>1", self.cols), oneBtag & (self.cols['x'] > 1)))
+        self.assertEqual(CutCompiler().branches("1Btag && x>1"), set(['fatjet1_CSVR1', 'fatjet1_CSVR2', 'x']))
+
+    def test_blocks(self):
+        cuts = ["x>1 && y<0", "x>1 && y<0 && k==2", "1Btag || k==0"]
+        whole = CutCompiler().masks(cuts, self.cols)
+        blocks = CutCompiler().masks(cuts, self.cols, chunk=77)
+        for c in cuts: self.assertTrue(np.array_equal(whole[c], blocks[c]), msg=c)
+
+    def test_missing_branch(self):
+        self.assertRaises(KeyError, evalCut, "z>1", self.cols)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+
+import os, sys, math, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools import integrals
+
+XMIN, XMAX = 30., 250.
+
+
+#########################
+# CLOSED-FORM INTEGRALS #
+#########################
+
+def trapezoid(f, a, b, points=400001):
+    x = np.linspace(a, b, points)
+    return np.trapz(f(x), x)
+
+erf = np.vectorize(math.erf)
+
+
+class ClosedFormTest(unittest.TestCase):
+
+    # Fraction in [a, b] of the full range, as rangeIntegrals computes it
+    def fraction(self, kind, a, b, *pars):
+        shift = integrals.exponents[kind](XMIN, XMAX, *pars)
+        return integrals.closedForms[kind](a, b, *pars, shift=shift)/integrals.closedForms[kind](XMIN, XMAX, *pars, shift=shift)
+
+    def test_exp(self):
+        for c in [-0.05, -0.001, 0., 0.02]:
+            f = lambda x: np.exp(c*x)
+            self.assertAlmostEqual(self.fraction("EXP", 105., 135., c), trapezoid(f, 105., 135.)/trapezoid(f, XMIN, XMAX), places=7)
+
+    def test_gaus(self):
+        f = lambda x: np.exp(-0.5*((x-90.)/12.)**2)
+        self.assertAlmostEqual(self.fraction("GAUS", 65., 105., 90., 12.), trapezoid(f, 65., 105.)/trapezoid(f, XMIN, XMAX), places=7)
+
+    def test_erfexp(self):
+        for c, offset, width in [(-0.02, 60., 30.), (0.01, 200., 10.), (-0.2, 60., 5.), (0.05, 100., 60.), (-0.03, 80., 0.001)]:
+            # the same clamp of the width as RooErfExpPdf
+            f = lambda x: np.exp(c*x - max(c*XMIN, c*XMAX))*(1. + erf((x-offset)/max(width, 1.e-2)))/2.
+            for a, b in [(30., 65.), (105., 135.), (150., 250.)]:
+                expected = trapezoid(f, a, b)/trapezoid(f, XMIN, XMAX)
+                if expected > 1.e-10: self.assertAlmostEqual(self.fraction("ERFEXP", a, b, c, offset, width)/expected, 1., places=5, msg=(c, offset, width, a, b))
+                else: self.assertAlmostEqual(self.fraction("ERFEXP", a, b, c, offset, width), expected, places=12, msg=(c, offset, width, a, b))
+
+    # Terms that overflow a double if the exponentials are not factored out
+    def test_large_exponents(self):
+        for c, offset, width in [(-3., 50., 20.), (5., 40., 10.), (-8., 100., 40.)]:
+            x = self.fraction("ERFEXP", 30., 65., c, offset, width)
+            self.assertTrue(0. <= x <= 1. and not math.isnan(x), msg=(c, offset, width))
+        self.assertAlmostEqual(self.fraction("EXP", 30., 65., -5.), 1., places=9)
+        self.assertAlmostEqual(self.fraction("EXP", 135., 250., 5.), 1., places=9)
+
+    def test_erfcx(self):
+        for x in [0., 0.5, 5., 19.9, 20., 30., 100.]:
+            expected = math.exp(x*x)*math.erfc(x) if x < 26. else 1./(x*math.sqrt(math.pi))*(1. - 1./(2.*x*x) + 3./(4.*x**4))
+            self.assertAlmostEqual(integrals.erfcx(x)/expected, 1., places=7, msg=x)
+
+    def test_memo_is_bounded(self):
+        memo = integrals.OrderedDict()
+        for k in range(integrals.MAXCACHE + 10): integrals.remember(memo, k, k)
+        self.assertEqual(len(memo), integrals.MAXCACHE)
+        self.assertFalse(0 in memo)
+        self.assertTrue(integrals.MAXCACHE + 9 in memo)
+
+
+if __name__ == "__main__":
+    unittest.main()
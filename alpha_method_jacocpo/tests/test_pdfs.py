@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+
+import os, sys, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+try:
+    from ROOT import gSystem, RooRealVar
+    import ROOT
+except ImportError:
+    ROOT = None
+
+if ROOT is not None: from tools.pdfs import shapes, normalization, density, nll, checkPdf
+
+PDFLIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "PDFs", "HWWLVJRooPdfs_cxx.so")
+XMIN, XMAX = 30., 250.
+
+
+################
+# NUMPY SHAPES #
+################
+
+# Every shape of tools/pdfs.py with the compiled class it reproduces and a set of parameters, in the order of the constructor.
+# The last 'doubles' parameters are plain numbers in the constructor (xmin and xmax of the alpha ratios)
+compiled = {
+    'ERFEXP' : ("RooErfExpPdf", [-0.02, 60., 30.], 0),
+    'EXP' : ("RooExponential", [-0.02], 0),
+    'EXPN' : ("RooExpNPdf", [-0.02, 500.], 0),
+    'EXPTAIL' : ("RooExpTailPdf", [50., 0.1], 0),
+    '2EXP' : ("Roo2ExpPdf", [-0.02, -0.05, 0.3], 0),
+    'GAUS' : ("RooGaussian", [90., 10.], 0),
+    'ALPHA' : ("RooAlpha", [-0.02, 60., 30., -0.03, 50., 25., XMIN, XMAX], 2),
+    'ALPHAEXP' : ("RooAlphaExp", [-0.02, -0.03, XMIN, XMAX], 2),
+    'ALPHAEXPN' : ("RooAlpha4ExpNPdf", [-0.02, 500., -0.03, 300.], 0),
+    'ALPHAEXPTAIL' : ("RooAlpha4ExpTailPdf", [50., 0.1, 60., 0.05], 0),
+    'ALPHA2EXP' : ("RooAlpha42ExpPdf", [-0.02, -0.05, 0.3, -0.03, -0.06, 0.2], 0),
+}
+
+
+def trapezoid(shape, pars, points=200001):
+    x = np.linspace(XMIN, XMAX, points)
+    return np.trapz(shapes[shape](x, *pars), x)
+
+
+@unittest.skipIf(ROOT is None, "PyROOT is not available")
+class NumpyShapesTest(unittest.TestCase):
+
+    def test_table(self):
+        self.assertEqual(sorted(compiled.keys()), sorted(shapes.keys()))
+
+    def test_normalization(self):
+        for shape, (cls, pars, doubles) in sorted(compiled.items()):
+            self.assertAlmostEqual(normalization(shape, pars, XMIN, XMAX)/trapezoid(shape, pars), 1., places=6, msg=shape)
+
+    def test_gaus_closed_form(self):
+        self.assertAlmostEqual(normalization("GAUS", [140., 10.], -1.e3, 1.e3), np.sqrt(2.*np.pi)*10., places=9)
+        self.assertAlmostEqual(normalization("GAUS", [90., 10.], 90., 1.e3), np.sqrt(2.*np.pi)*10./2., places=9)
+
+    def test_density_and_nll(self):
+        x, w = np.array([40., 90., 200.]), np.array([1., 2., 0.5])
+        p = density("EXP", x, [-0.02], XMIN, XMAX)
+        self.assertAlmostEqual(nll("EXP", x, [-0.02], XMIN, XMAX, w), -float(np.sum(w*np.log(p))))
+
+
+# The numpy densities against the compiled pdfs of PDFs/HWWLVJRooPdfs.cxx, normalized by RooFit on the same range
+@unittest.skipIf(ROOT is None, "PyROOT is not available")
+class CompiledPdfTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if gSystem.Load(PDFLIB) < 0: raise unittest.SkipTest("cannot load " + PDFLIB)
+
+    def test_compiled(self):
+        x = RooRealVar("x", "x", XMIN, XMAX)
+        for shape, (cls, pars, doubles) in sorted(compiled.items()):
+            vars = [RooRealVar("p%d" % i, "", v) for i, v in enumerate(pars[:len(pars)-doubles])]
+            pdf = getattr(ROOT, cls)("pdf_" + cls, "", x, *(vars + pars[len(pars)-doubles:]))
+            self.assertLess(checkPdf(pdf, x, shape, pars), 1.e-5, msg=shape)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+#! /usr/bin/env python
+
+import os, sys, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.regions import partition, regionMask
+
+REGIONS = [("LSB", (30, 65)), ("VR", (65, 105)), ("SR", (105, 135)), ("HSB", (135, 300))]
+
+
+####################
+# JET MASS REGIONS #
+####################
+
+class PartitionTest(unittest.TestCase):
+
+    def setUp(self):
+        r = np.random.RandomState(2)
+        # random masses, plus every region boundary and values out of all the regions
+        m = np.concatenate([r.uniform(0., 350., 2000), [30., 65., 105., 135., 300., 10., 320.]])
+        self.cols = {'fatjet1_prunedMassCorr' : m, 'w' : r.uniform(-1., 1., len(m))}
+
+    # Same as the "%s>%d && %s<%d" cut strings of alpha()
+    def test_cut_strings(self):
+        m = self.cols['fatjet1_prunedMassCorr']
+        base, region = partition(self.cols, "w>-0.5", "fatjet1_prunedMassCorr", REGIONS)
+        self.assertTrue(np.array_equal(base, self.cols['w'] > -0.5))
+        for k, (name, (lo, hi)) in enumerate(REGIONS):
+            self.assertTrue(np.array_equal(region == k, base & (m > lo) & (m < hi)), msg=name)
+        inside = np.zeros(len(m), dtype=bool)
+        for name, (lo, hi) in REGIONS: inside |= (m > lo) & (m < hi)
+        self.assertTrue(np.all(region[~(base & inside)] == -1))
+
+    def test_region_mask(self):
+        m = self.cols['fatjet1_prunedMassCorr']
+        base, region = partition(self.cols, "", "fatjet1_prunedMassCorr", REGIONS)
+        sb = regionMask(region, REGIONS, ["LSB", "HSB"])
+        self.assertTrue(np.array_equal(sb, ((m > 30) & (m < 65)) | ((m > 135) & (m < 300))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+#! /usr/bin/env python
+
+import os, errno, shutil
+import numpy as np
+from array import array
+
+from samples import sample
+from cuts import evalCut
+
+# root_numpy fills the cache and turns columns back into trees in one go, without it the events are read and filled one by one
+try:
+    from root_numpy import root2array, array2tree
+except ImportError:
+    root2array, array2tree = None, None
+
+CACHEDIR = "ntuples/cache/"
+
+
+##################
+# COLUMNAR CACHE #
+##################
+
+# The cache is laid out as CACHEDIR/<tree>/<file>/<stamp>/<branch>.npy, one plain numpy file per branch, the stamp being
+# the size and modification time of the ntuple it was made from. Files are only ever added, under a temporary name renamed
+# into place, so several processes can fill the same cache at the same time: a stale stamp directory is just removed.
+
+def sampleFiles(samples, pd=[]):
+    files = []
+    for i, s in enumerate(samples):
+        for j, ss in enumerate(sample[s]['files']):
+            if not 'data' in s or len(pd)==0 or ss in pd: files.append(ss)
+    return files
+
+
+def fileStamp(path):
+    st = os.stat(path)
+    return "%d %d" % (st.st_size, int(st.st_mtime))
+
+
+def makeDirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST: raise
+
+
+def cacheColumns(filename, treeName, branches, ntupledir, cachedir=CACHEDIR):
+    src = ntupledir + filename + ".root"
+    stamp = fileStamp(src).replace(" ", "_")
+    top = os.path.join(cachedir, treeName, filename)
+    dst = os.path.join(top, stamp)
+    makeDirs(dst)
+    # Drop the columns of older versions of the ntuple
+    for d in os.listdir(top):
+        if d != stamp and os.path.isdir(os.path.join(top, d)): shutil.rmtree(os.path.join(top, d), ignore_errors=True)
+    missing = [b for b in branches if not os.path.exists(os.path.join(dst, b + ".npy"))]
+    if len(missing) > 0:
+        arr = root2array(src, treeName, branches=missing) if root2array is not None else readBranches(src, treeName, missing)
+        for b in missing:
+            tmp = os.path.join(dst, b + ".npy.tmp%d" % os.getpid())
+            with open(tmp, "wb") as f: np.save(f, np.ascontiguousarray(arr[b]))
+            os.rename(tmp, os.path.join(dst, b + ".npy"))
+    return dst
+
+
+# Branches of a tree read entry by entry, when root_numpy is not available
+def readBranches(src, treeName, branches):
+    from ROOT import TFile
+    f = TFile(src, "READ")
+    t = f.Get(treeName)
+    t.SetBranchStatus("*", 0)
+    for b in branches: t.SetBranchStatus(b, 1)
+    arr = dict([(b, np.empty(t.GetEntries(), dtype=np.float64)) for b in branches])
+    for i in range(t.GetEntries()):
+        t.GetEntry(i)
+        for b in branches: arr[b][i] = getattr(t, b)
+    f.Close()
+    return arr
+
+
+# Memory-mapped cached branches of each file of a list (converting them first if needed), one dict of views per file
+def fileColumns(files, treeName, branches, ntupledir, cachedir=CACHEDIR):
+    parts = []
+    for i, f in enumerate(files):
+        dst = cacheColumns(f, treeName, branches, ntupledir, cachedir)
+        parts.append(dict([(b, np.load(os.path.join(dst, b + ".npy"), mmap_mode='r')) for b in branches]))
+    return parts
+
+
+# Columns of the events of several files that pass a cut: the cut is evaluated file by file on the memory maps, and only
+# the selected events are copied into memory. Without a cut a single file stays a memory map
+def selectFiles(parts, branches, cut=None):
+    if len(parts) == 1 and cut is None: return dict(parts[0])
+    cols = dict([(b, []) for b in branches])
+    for p in parts:
+        mask = evalCut(cut, p) if cut is not None else slice(None)
+        for b in branches: cols[b].append(p[b][mask])
+    return dict([(b, np.concatenate(cols[b]) if len(cols[b]) > 0 else np.zeros(0)) for b in branches])
+
+
+def loadColumns(files, treeName, branches, ntupledir, cachedir=CACHEDIR, cut=None):
+    return selectFiles(fileColumns(files, treeName, branches, ntupledir, cachedir), branches, cut)
+
+
+# Build a memory-resident TTree out of columns, so that RooDataSet(..., RooFit.Import(tree)) and TTreeFormula cuts keep working
+def columnsToTree(cols, name="tree", mask=None):
+    from ROOT import gROOT, TTree
+    names = sorted(cols.keys())
+    n = len(cols[names[0]]) if mask is None else int(np.count_nonzero(mask))
+    rec = np.empty(n, dtype=[(b, np.float64) for b in names])
+    for b in names: rec[b] = cols[b] if mask is None else cols[b][mask]
+    gROOT.cd()
+    if array2tree is not None: return array2tree(rec, name=name)
+    tree = TTree(name, name)
+    buffers = dict([(b, array('d', [0.])) for b in names])
+    for b in names: tree.Branch(b, buffers[b], b + "/D")
+    for i in range(n):
+        for b in names: buffers[b][0] = rec[b][i]
+        tree.Fill()
+    tree.ResetBranchAddresses()
+    return tree
+
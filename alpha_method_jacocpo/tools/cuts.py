@@ -0,0 +1,190 @@
+#! /usr/bin/env python
+
+import ast, re
+import numpy as np
+
+from selections import selection
+
+
+##################
+#  CUT STRINGS   #
+##################
+
+# Cut strings are written for TTreeFormula: && || ! ?: and the C comparison operators.
+# They are translated into python syntax, parsed once, and then evaluated column-wise with numpy.
+# Names defined in the selection dict are expanded to their own cut strings, so that "triggerEle && doubleEle && Zcut && 1Btag && SRcut" works as well.
+
+PREFIX = "sel__"
+
+def toPython(cut, names=[]):
+    expr = cut.replace("&&", " and ").replace("||", " or ")
+    expr = notToCall(expr)
+    # Selection names may start with a digit (1Btag), so they are renamed before parsing
+    if len(names) > 0:
+        expr = re.sub(r"(?<![\w.])(\w+)", lambda m: PREFIX + m.group(1) if m.group(1) in names else m.group(1), expr)
+    expr = ternaryToCall(expr)
+    return expr.strip() if len(expr.strip()) > 0 else "1==1"
+
+
+# Rewrite '!a' as '(not a)': in C the negation applies to the operand only, while python's 'not' binds looser than the comparisons.
+# The operand is a parenthesized group, a name or number (possibly a function call), or another negation,
+# so the rightmost '!' is rewritten first.
+def notToCall(expr):
+    nots = [m.start() for m in re.finditer(r"!(?!=)", expr)]
+    for n in reversed(nots):
+        i = n+1
+        while i < len(expr) and expr[i] == ' ': i += 1
+        m = re.match(r"[\w.]*", expr[i:])
+        end = i + m.end()
+        if end < len(expr) and expr[end] == '(':
+            depth = 0
+            for j in range(end, len(expr)):
+                if expr[j] == '(': depth += 1
+                elif expr[j] == ')': depth -= 1
+                if depth == 0: break
+            end = j+1
+        expr = expr[:n] + "(not " + expr[i:end] + ")" + expr[end:]
+    return expr
+
+
+# Rewrite 'a ? b : c' as 'where(a, b, c)', the condition and the alternatives extend up to the enclosing parentheses
+def ternaryToCall(expr):
+    while '?' in expr:
+        q = expr.index('?')
+        depth, start = 0, 0
+        for i in range(q-1, -1, -1):
+            if expr[i] == ')': depth += 1
+            elif expr[i] == '(':
+                if depth == 0:
+                    start = i+1
+                    break
+                depth -= 1
+        depth, colon, end = 0, -1, len(expr)
+        for i in range(q+1, len(expr)):
+            if expr[i] == '(': depth += 1
+            elif expr[i] == ')':
+                if depth == 0:
+                    end = i
+                    break
+                depth -= 1
+            elif expr[i] == ':' and depth == 0 and colon < 0: colon = i
+        if colon < 0: raise ValueError("Missing ':' in conditional expression: %s" % expr)
+        expr = expr[:start] + " where(%s, %s, %s) " % (expr[start:q], expr[q+1:colon], expr[colon+1:end]) + expr[end:]
+    return expr
+
+
+def parseCut(cut, names=[]):
+    return ast.parse(toPython(cut, names), mode='eval').body
+
+
+# Compiles the selection strings and evaluates them on blocks of columns.
+# Every parsed cut and every selection name is compiled only once, and inside a block the mask of each
+# named selection and of each '&&' / '||' prefix is computed only once, whichever cut it appears in
+class CutCompiler:
+
+    def __init__(self, definitions=selection):
+        self.definitions = definitions
+        self.parsed = {}
+        self.cache = {}
+
+    def compile(self, cut):
+        if not cut in self.parsed: self.parsed[cut] = parseCut(cut, self.definitions)
+        return self.parsed[cut]
+
+    # Branches needed to evaluate a cut, with the selection names expanded
+    def branches(self, cut):
+        names, todo = set(), [self.compile(cut)]
+        while len(todo) > 0:
+            for node in ast.walk(todo.pop()):
+                if isinstance(node, ast.Name) and node.id.startswith(PREFIX): todo.append(self.compile(self.definitions[node.id[len(PREFIX):]]))
+                elif isinstance(node, ast.Name) and not node.id in functions: names.add(node.id)
+        return names
+
+    # Values of several expressions (cuts, variables or weights) on one block of columns, sharing the cache of the block
+    def evaluate(self, exprs, block):
+        self.cache = {}
+        values = dict([(e, self.evalNode(self.compile(e), block)) for e in exprs])
+        self.cache = {}
+        return values
+
+    # Masks of several cuts on the same columns, evaluated block by block
+    def masks(self, cuts, cols, chunk=1000000):
+        n = len(cols.values()[0]) if len(cols) > 0 else 0
+        result = dict([(c, np.zeros(n, dtype=bool)) for c in cuts])
+        for first in range(0, n, chunk):
+            block = dict([(b, v[first:first+chunk]) for b, v in cols.iteritems()])
+            m = len(block.values()[0])
+            for c, v in self.evaluate(cuts, block).iteritems(): result[c][first:first+m] = np.broadcast_to(np.asarray(v, dtype=bool), (m,))
+        return result
+
+    def evalNode(self, node, cols):
+        if isinstance(node, ast.BoolOp):
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            value, key = None, type(node.op).__name__
+            for v in node.values:
+                key += "|" + ast.dump(v)
+                if key in self.cache: value = self.cache[key]
+                else:
+                    value = self.evalNode(v, cols) if value is None else op(value, self.evalNode(v, cols))
+                    self.cache[key] = value
+            return value
+        if isinstance(node, ast.UnaryOp):
+            value = self.evalNode(node.operand, cols)
+            if isinstance(node.op, ast.Not): return np.logical_not(value)
+            if isinstance(node.op, ast.USub): return -value
+            return value
+        if isinstance(node, ast.Compare):
+            left = self.evalNode(node.left, cols)
+            result = None
+            for op, comp in zip(node.ops, node.comparators):
+                right = self.evalNode(comp, cols)
+                test = compareOps[type(op)](left, right)
+                result = test if result is None else np.logical_and(result, test)
+                left = right
+            return result
+        if isinstance(node, ast.BinOp):
+            return binaryOps[type(node.op)](self.evalNode(node.left, cols), self.evalNode(node.right, cols))
+        if isinstance(node, ast.Call):
+            return functions[node.func.id](*[self.evalNode(a, cols) for a in node.args])
+        if isinstance(node, ast.Name):
+            if node.id in cols: return np.asarray(cols[node.id])
+            if node.id.startswith(PREFIX):
+                if not node.id in self.cache: self.cache[node.id] = self.evalNode(self.compile(self.definitions[node.id[len(PREFIX):]]), cols)
+                return self.cache[node.id]
+            raise KeyError("Branch or selection '%s' not available" % node.id)
+        if isinstance(node, ast.Num):
+            return node.n
+        raise ValueError("Unsupported expression in cut: %s" % ast.dump(node))
+
+
+compiler = CutCompiler()
+
+# Evaluate a cut string on a dict of columns, returning a boolean mask
+def evalCut(cut, cols):
+    return compiler.masks([cut], cols)[cut]
+
+
+compareOps = {
+    ast.Gt : np.greater,
+    ast.GtE : np.greater_equal,
+    ast.Lt : np.less,
+    ast.LtE : np.less_equal,
+    ast.Eq : np.equal,
+    ast.NotEq : np.not_equal,
+}
+
+binaryOps = {
+    ast.Add : np.add,
+    ast.Sub : np.subtract,
+    ast.Mult : np.multiply,
+    ast.Div : np.true_divide,
+}
+
+functions = {
+    'abs' : np.abs,
+    'fabs' : np.abs,
+    'sqrt' : np.sqrt,
+    'log' : np.log,
+    'exp' : np.exp,
+    'where' : np.where,
+}
@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+
+import numpy as np
+from ROOT import RooFit, RooDataSet, RooDataHist, RooArgSet
+
+from columns import columnsToTree
+
+
+###############
+# EVENT STORE #
+###############
+
+# Weighted events of one input, one float array per observable, holding only the events that pass the base selection.
+# The events are sorted by jet mass region, in the given order, so that every region and every group of adjacent regions
+# (e.g. LSB+HSB) is a contiguous slice: the arrays returned for a region are views, not copies.
+class EventStore:
+
+    def __init__(self, cols, weight, base, region, regions, order=None):
+        names = [n for n, r in regions]
+        order = order if order is not None else names
+        rank = np.array([order.index(n) if n in order else len(order) for n in names] + [len(order)+1], dtype=np.int16)
+        idx = np.flatnonzero(base)
+        key = rank[region[idx]] # region -1 (no region) takes the last rank
+        idx = idx[np.argsort(key, kind='mergesort')]
+        key = np.sort(key, kind='mergesort')
+        self.arrays = dict([(b, np.ascontiguousarray(v[idx], dtype=np.float64)) for b, v in cols.iteritems()])
+        self.weight = weight
+        self.order = order
+        self.start = np.searchsorted(key, np.arange(len(order)), side='left')
+        self.stop = np.searchsorted(key, np.arange(len(order)), side='right')
+
+    def __len__(self):
+        return len(self.arrays[self.weight])
+
+    # Slice over the events of a group of regions (all the events if names is None), or a boolean mask if they are not adjacent
+    def select(self, names=None):
+        if names is None: return slice(0, len(self))
+        pos = sorted([self.order.index(n) for n in names])
+        if pos == range(pos[0], pos[-1]+1): return slice(self.start[pos[0]], self.stop[pos[-1]])
+        mask = np.zeros(len(self), dtype=bool)
+        for p in pos: mask[self.start[p]:self.stop[p]] = True
+        return mask
+
+    def get(self, var, names=None):
+        return self.arrays[var][self.select(names)]
+
+    def weights(self, names=None):
+        return self.get(self.weight, names)
+
+    def sumWeights(self, names=None):
+        return float(np.sum(self.weights(names)))
+
+    # Sum of weights and of squared weights in the bins of a variable (without under/overflow)
+    def histogram(self, var, edges, names=None):
+        w = self.weights(names)
+        sumw, e = np.histogram(self.get(var, names), bins=edges, weights=w)
+        sumw2, e = np.histogram(self.get(var, names), bins=edges, weights=w*w)
+        return sumw, sumw2
+
+    # RooDataSet of a group of regions, for the fits
+    def dataSet(self, name, variables, weight, names=None):
+        cols = dict([(b, self.get(b, names)) for b in self.arrays.keys()])
+        return RooDataSet(name, name, variables, RooFit.WeightVar(weight), RooFit.Import(columnsToTree(cols, "tree_"+name)))
+
+    # RooDataHist in the bins of var (as set with setBins), holding the sum of weights and of squared weights of each bin
+    def dataHist(self, name, var, names=None):
+        binning = var.getBinning()
+        edges = [binning.binLow(i) for i in range(binning.numBins())] + [binning.binHigh(binning.numBins()-1)]
+        sumw, sumw2 = self.histogram(var.GetName(), edges, names)
+        hist = RooDataHist(name, name, RooArgSet(var))
+        old = var.getVal()
+        for i in range(binning.numBins()):
+            var.setVal(binning.binCenter(i))
+            hist.add(RooArgSet(var), sumw[i], sumw2[i])
+        var.setVal(old)
+        return hist
@@ -0,0 +1,78 @@
+#! /usr/bin/env python
+
+import os, hashlib
+import numpy as np
+from ROOT import gROOT, TFile, RooArgSet
+
+FITCACHE = "ntuples/cache/fits/"
+
+
+####################
+# FIT RESULT CACHE #
+####################
+
+# The RooFitResult of a fit (parameter values, covariance, status and minimum NLL) is stored in FITCACHE under a hash of
+# the events in the dataset, the name of the fit function, the ranges and initial values of the parameters and the fit range.
+# A fit with the same key is not repeated, the parameters of the model are set to the stored values instead.
+# Only converged fits (status 0 and an accurate or forced positive definite covariance) are stored.
+
+# Hash of the events in a dataset: from the arrays of the event store if there is one, otherwise reading the dataset
+def dataHash(data, store=None):
+    h = hashlib.md5("%s %d" % (data.ClassName(), data.numEntries()))
+    if store is not None:
+        for b in sorted(store.arrays.keys()): h.update(np.ascontiguousarray(store.arrays[b]).view(np.uint8))
+        return h.hexdigest()
+    for i in range(data.numEntries()):
+        row = data.get(i)
+        it = row.createIterator()
+        v = it.Next()
+        while v:
+            h.update("%s=%.17g;" % (v.GetName(), v.getVal()))
+            v = it.Next()
+        h.update("w=%.17g\n" % data.weight())
+    return h.hexdigest()
+
+
+def fitKey(model, data, var, rangeName, name, store=None):
+    h = hashlib.md5(dataHash(data, store))
+    h.update("%s %s %s %.17g %.17g %d" % (model.GetName(), name, rangeName, var.getMin(rangeName), var.getMax(rangeName), var.getBins()))
+    params = model.getParameters(RooArgSet(var))
+    it = params.createIterator()
+    p = it.Next()
+    names = []
+    while p:
+        names.append("%s %.17g %.17g %.17g %d" % (p.GetName(), p.getVal(), p.getMin(), p.getMax(), p.isConstant()))
+        p = it.Next()
+    h.update(";".join(sorted(names)))
+    return "fit_" + h.hexdigest()
+
+
+# Result of fit() (e.g. model.fitTo(data, ..., RooFit.Save())), unless an identical fit is already in the cache.
+# Every result is a file of its own, written under a temporary name and renamed, since the channels run in parallel processes.
+def cachedFit(fit, model, data, var, rangeName, name, store=None):
+    key = fitKey(model, data, var, rangeName, name, store)
+    path = FITCACHE + key + ".root"
+    if os.path.exists(path):
+        f = TFile(path, "READ")
+        result = f.Get("fitResult").Clone(key)
+        f.Close()
+        gROOT.cd()
+        params = model.getParameters(RooArgSet(var))
+        it = result.floatParsFinal().createIterator()
+        p = it.Next()
+        while p:
+            params.find(p.GetName()).setVal(p.getVal())
+            params.find(p.GetName()).setError(p.getError())
+            p = it.Next()
+        return result
+    result = fit()
+    # a failed fit is redone next time, rather than served from the cache
+    if result.status() != 0 or result.covQual() < 2: return result
+    if not os.path.exists(FITCACHE): os.makedirs(FITCACHE)
+    tmp = path + ".tmp%d" % os.getpid()
+    f = TFile(tmp, "RECREATE")
+    result.Write("fitResult")
+    f.Close()
+    gROOT.cd()
+    os.rename(tmp, path)
+    return result
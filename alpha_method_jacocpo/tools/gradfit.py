@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+
+import math
+import numpy as np
+from ROOT import RooFit, RooArgSet, RooMinimizer, TMatrixDSym
+
+from pdfs import nodes, weights
+
+# scipy provides the bounded quasi-Newton minimizer, without it the fits are left to Minuit
+try:
+    from scipy.optimize import minimize
+    from scipy.special import erf, erfcx
+except ImportError:
+    minimize = None
+
+
+##########################
+# ANALYTIC GRADIENT FITS #
+##########################
+
+# Weighted unbinned fit of the shapes with simple derivatives (EXP, EXPN, GAUS, ERFEXP, parameters in the same order as in
+# the constructor): the NLL and its gradient are computed in numpy and minimized with L-BFGS-B, instead of Minuit with
+# numeric derivatives. The covariance comes from the differences of the analytic gradient, with the same SumW2 correction
+# as fitTo, and is given to a RooMinimizer on the RooFit NLL so that the RooFitResult works with getPropagatedError
+# and VisualizeError as usual.
+
+# Log of the unnormalized shapes and their derivatives with respect to the parameters (one row per parameter)
+
+def logErfExp(x, c, offset, width):
+    width = max(width, 1.e-2)
+    if c == 0: c = -1.e-7
+    u = (x-offset)/width
+    # 1+erf(u) = erfc(-u) = erfcx(-u)*exp(-u^2), without underflow for large negative u
+    return c*x + np.where(u < 0., np.log(erfcx(-np.minimum(u, 0.))) - u*u, np.log1p(erf(np.maximum(u, 0.)))) - math.log(2.)
+
+def dErfExp(x, c, offset, width):
+    width = max(width, 1.e-2)
+    u = (x-offset)/width
+    g = np.where(u < 0., 1./erfcx(-np.minimum(u, 0.)), np.exp(-u*u)/(1. + erf(np.maximum(u, 0.))))*2./math.sqrt(math.pi)
+    return np.array([x, -g/width, -g*u/width])
+
+def logExp(x, c):
+    return c*x
+
+def dExp(x, c):
+    return np.array([x])
+
+def logExpN(x, c, n):
+    return c*x + n/x
+
+def dExpN(x, c, n):
+    return np.array([x, 1./x])
+
+def logGaus(x, mean, sigma):
+    return -0.5*((x-mean)/sigma)**2
+
+def dGaus(x, mean, sigma):
+    return np.array([(x-mean)/sigma**2, (x-mean)**2/sigma**3])
+
+
+gradients = {
+    'ERFEXP' : (logErfExp, dErfExp),
+    'EXP' : (logExp, dExp),
+    'EXPN' : (logExpN, dExpN),
+    'GAUS' : (logGaus, dGaus),
+}
+
+
+# Weighted NLL of the events x and its gradient, the shape being normalized with Gauss-Legendre on the points xq (weights wq)
+def nllGrad(kind, pars, x, w, xq, wq):
+    logf, dlogf = gradients[kind]
+    fq = np.exp(logf(xq, *pars))
+    norm = np.sum(wq*fq)
+    dnorm = np.sum(wq*fq*dlogf(xq, *pars), axis=1)/norm
+    nll = -np.sum(w*logf(x, *pars)) + np.sum(w)*math.log(norm)
+    grad = -np.sum(w*dlogf(x, *pars), axis=1) + np.sum(w)*dnorm
+    return nll, grad
+
+
+# Hessian of the NLL from central differences of the analytic gradient, on the free parameters
+def hessian(kind, pars, free, x, w, xq, wq):
+    H = np.zeros((len(free), len(free)))
+    for j, i in enumerate(free):
+        h = 1.e-5*max(abs(pars[i]), 1.)
+        up, down = list(pars), list(pars)
+        up[i] += h
+        down[i] -= h
+        H[:, j] = (nllGrad(kind, up, x, w, xq, wq)[1] - nllGrad(kind, down, x, w, xq, wq)[1])[free]/(2.*h)
+    return (H + H.T)/2.
+
+
+# Jet mass values and weights of a dataset, from the event store if there is one
+def dataArrays(data, var, store=None):
+    if store is not None: return store.get(var.GetName()), store.weights()
+    x, w = np.zeros(data.numEntries()), np.zeros(data.numEntries())
+    for i in range(data.numEntries()):
+        x[i] = data.get(i).getRealValue(var.GetName())
+        w[i] = data.weight()
+    return x, w
+
+
+# Same as model.fitTo(data, *options) with RooFit.SumW2Error(True) in rangeName; shapes without gradients, or fits that do
+# not converge, are done by fitTo
+def gradientFit(model, data, var, rangeName, kind, pars, store=None, options=[], panels=16):
+    if minimize is None or not kind in gradients or data.ClassName() == "RooDataHist": return model.fitTo(data, *options)
+    xmin, xmax = var.getMin(rangeName), var.getMax(rangeName)
+    x, w = dataArrays(data, var, store)
+    inRange = (x >= xmin) & (x <= xmax)
+    x, w = x[inRange], w[inRange]
+    edges = np.linspace(xmin, xmax, panels+1)
+    half = (edges[1:] - edges[:-1])/2.
+    xq = (((edges[1:] + edges[:-1])/2.)[:, np.newaxis] + half[:, np.newaxis]*nodes[np.newaxis, :]).ravel()
+    wq = (half[:, np.newaxis]*weights[np.newaxis, :]).ravel()
+
+    start = [p.getVal() for p in pars]
+    free = [i for i, p in enumerate(pars) if not p.isConstant()]
+    def fcn(v):
+        values = list(start)
+        for i, vi in zip(free, v): values[i] = vi
+        nll, grad = nllGrad(kind, values, x, w, xq, wq)
+        return nll, grad[free]
+    bounds = [(pars[i].getMin(), pars[i].getMax()) for i in free]
+    result = minimize(fcn, [start[i] for i in free], jac=True, method="L-BFGS-B", bounds=bounds)
+    if not result.success or not np.isfinite(result.fun): return model.fitTo(data, *options)
+    # a parameter stopped at its limit has no meaningful Hessian error, Minuit handles it with its bound transformation
+    if any([v <= lo + 1.e-6*(hi-lo) or v >= hi - 1.e-6*(hi-lo) for v, (lo, hi) in zip(result.x, bounds)]): return model.fitTo(data, *options)
+    values = list(start)
+    for i, vi in zip(free, result.x): values[i] = float(vi)
+
+    # Covariance V = H^-1 C H^-1, C being the Hessian of the NLL with squared weights (as in fitTo with SumW2Error);
+    # a singular, ill-conditioned or not positive definite Hessian is left to fitTo as well
+    H = hessian(kind, values, free, x, w, xq, wq)
+    if not np.all(np.isfinite(H)) or np.linalg.cond(H) > 1.e12 or np.min(np.linalg.eigvalsh(H)) <= 0.: return model.fitTo(data, *options)
+    try:
+        Hinv = np.linalg.inv(H)
+    except np.linalg.LinAlgError:
+        return model.fitTo(data, *options)
+    V = Hinv.dot(hessian(kind, values, free, x, w*w, xq, wq)).dot(Hinv)
+    for i, p in enumerate(pars): p.setVal(values[i])
+
+    # Minuit only runs Hesse at the minimum, to fill status and covariance quality, then takes the corrected covariance.
+    # The status, covQual and minNll of the result are therefore those of Hesse at the L-BFGS-B minimum: the minimization
+    # itself converged, or fitTo would have been used
+    nll = model.createNLL(data, RooFit.Range(rangeName))
+    m = RooMinimizer(nll)
+    m.setPrintLevel(-1)
+    m.hesse()
+    floating = m.save().floatParsFinal()
+    order = [[p.GetName() for p in pars].index(floating.at(k).GetName()) for k in range(floating.getSize())]
+    cov = TMatrixDSym(len(order))
+    for a, i in enumerate(order):
+        for b, j in enumerate(order): cov[a][b] = V[free.index(i), free.index(j)]
+    m.applyCovarianceMatrix(cov)
+    return m.save("fitresult_"+model.GetName(), "Result of gradient fit of p.d.f. "+model.GetName())
@@ -0,0 +1,132 @@
+#! /usr/bin/env python
+
+import os, ast, hashlib
+import numpy as np
+from array import array
+from ROOT import TH1F
+
+from samples import sample
+from variables import variable
+from cuts import CutCompiler, binaryOps, functions
+from columns import cacheColumns, fileStamp, CACHEDIR
+from utils import sampleCut
+
+
+###################
+# BATCHED FILLING #
+###################
+
+# Same job as project(), but for many variables and cuts at once: every file of every sample is read once
+# from the columnar cache and all the requested histograms are filled from the same blocks of events.
+# The result is indexed as hist[var][cut][sample], each hist[var][cut] being the dict that draw() and saveHist() expect.
+# Files already filled for the same variable, cut and weight are not read again, e.g. when new data runs are added to samples.py.
+
+def projectMany(varList, cuts, reg, weight, samples, pd, ntupledir, cachedir=CACHEDIR, chunk=1000000):
+    compiler = CutCompiler()
+    for v in varList: checkVariable(compiler, v)
+    hist = dict([(v, dict([(c, {}) for c in cuts])) for v in varList])
+
+    for i, s in enumerate(samples):
+        scuts = dict([(c, sampleCut(s, c)) for c in cuts])
+        edges = dict([(v, binEdges(v)) for v in varList])
+        sumw = dict([((v, c), np.zeros(len(edges[v])+1)) for v in varList for c in cuts])
+        sumw2 = dict([((v, c), np.zeros(len(edges[v])+1)) for v in varList for c in cuts])
+        entries = dict([((v, c), 0) for v in varList for c in cuts])
+        nevents = 0
+
+        # Partial sums of each file are kept next to its columns, so that adding files only costs their own I/O
+        for j, ss in enumerate(sample[s]['files']):
+            if 'data' in s and not ss in pd: continue
+            part = fillFile(compiler, ss, reg, weight, varList, scuts, edges, ntupledir, cachedir, chunk)
+            for k in sumw.keys():
+                sumw[k] += part[k]['sumw']
+                sumw2[k] += part[k]['sumw2']
+                entries[k] += int(part[k]['entries'])
+            nevents += int(part.values()[0]['nevents']) if len(part) > 0 else 0
+
+        for v in varList:
+            for c in cuts:
+                h = newHist(s, v)
+                for k in range(len(edges[v])+1):
+                    h.SetBinContent(k, sumw[(v, c)][k])
+                    h.SetBinError(k, np.sqrt(sumw2[(v, c)][k]))
+                h.SetEntries(entries[(v, c)])
+                h.SetOption("%s" % nevents)
+                h.Scale(sample[s]['weight'] if h.Integral() >= 0 else 0)
+                h.SetFillColor(sample[s]['fillcolor'])
+                h.SetFillStyle(sample[s]['fillstyle'])
+                h.SetLineColor(sample[s]['linecolor'])
+                h.SetLineStyle(sample[s]['linestyle'])
+                hist[v][c][s] = h
+
+    return hist
+
+
+# Sums of weights, of squared weights and entries of one file for every (variable, cut) pair.
+# Each pair is stored as hist_<hash>.npz in the cache directory of the file, with the stamp of the ntuple it was filled from;
+# only the pairs that are missing or stale are filled, reading the columns once for all of them
+def fillFile(compiler, ss, reg, weight, varList, scuts, edges, ntupledir, cachedir, chunk):
+    stamp = fileStamp(ntupledir + ss + ".root")
+    dst = os.path.join(cachedir, reg, ss)
+    part, todo = {}, []
+    for v in varList:
+        for c in scuts.keys():
+            name = os.path.join(dst, "hist_%s.npz" % hashlib.md5(repr((v, scuts[c], weight, list(edges[v])))).hexdigest())
+            if os.path.exists(name):
+                f = np.load(name)
+                if str(f['stamp']) == stamp: part[(v, c)] = dict([(x, f[x]) for x in f.files])
+            if not (v, c) in part: todo.append(((v, c), name))
+    if len(todo) == 0: return part
+
+    vs = sorted(set([v for (v, c), name in todo]))
+    cs = sorted(set([c for (v, c), name in todo]))
+    exprs = vs + [weight] + [scuts[c] for c in cs if len(scuts[c]) > 0]
+    branches = sorted(set.union(*[compiler.branches(x) for x in exprs]))
+    if len(branches) == 0: raise ValueError("Cannot count the events of %s: the variables %s, the weight '%s' and the cuts read no branch" % (ss, vs, weight))
+    dst = cacheColumns(ss, reg, branches, ntupledir, cachedir)
+    cols = dict([(b, np.load(os.path.join(dst, b + ".npy"), mmap_mode='r')) for b in branches])
+    n = len(cols[branches[0]]) if len(branches) > 0 else 0
+    for (v, c), name in todo: part[(v, c)] = {'sumw' : np.zeros(len(edges[v])+1), 'sumw2' : np.zeros(len(edges[v])+1), 'entries' : 0, 'nevents' : n}
+    for first in range(0, n, chunk):
+        block = dict([(b, x[first:first+chunk]) for b, x in cols.iteritems()])
+        m = len(block[branches[0]])
+        values = compiler.evaluate(exprs, block)
+        w = np.broadcast_to(np.asarray(values[weight], dtype=np.float64), (m,))
+        for c in cs:
+            sel = np.broadcast_to(np.asarray(values[scuts[c]], dtype=bool), (m,)) if len(scuts[c]) > 0 else np.ones(m, dtype=bool)
+            ws = w[sel]
+            for (v, cc), name in todo:
+                if cc != c: continue
+                # TH1 convention: bin 0 is the underflow, the upper edge of each bin is excluded, the last index is the overflow
+                idx = np.searchsorted(edges[v], np.broadcast_to(values[v], (m,))[sel], side='right')
+                part[(v, c)]['sumw'] += np.bincount(idx, weights=ws, minlength=len(edges[v])+1)
+                part[(v, c)]['sumw2'] += np.bincount(idx, weights=ws*ws, minlength=len(edges[v])+1)
+                part[(v, c)]['entries'] += len(idx)
+    for (v, c), name in todo: np.savez(name, stamp=stamp, **part[(v, c)])
+    return part
+
+
+# Variables are evaluated with the numpy operators and functions of the cut compiler; the ones that call the
+# C++ helpers of the analysis (transverseMass, deltaPhi, ...) or use other operators can only be drawn with project()
+def checkVariable(compiler, var):
+    try:
+        tree = compiler.compile(var)
+    except SyntaxError:
+        raise ValueError("Variable '%s' is not a branch or an expression that projectMany can evaluate, use project() instead" % var)
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in functions)) or (isinstance(node, ast.BinOp) and not type(node.op) in binaryOps):
+            raise ValueError("Variable '%s' uses '%s', that projectMany cannot evaluate, use project() instead" % (var, node.func.id if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) else type(node.op).__name__))
+
+
+def binEdges(var):
+    if variable[var]['nbins']>0: return np.linspace(variable[var]['min'], variable[var]['max'], variable[var]['nbins']+1)
+    return np.array(variable[var]['bins'], dtype=np.float32).astype(np.float64) # TH1F keeps the variable bin edges as floats
+
+
+# Empty histogram with the same name and binning as in project(), detached from the current directory
+def newHist(s, var):
+    if variable[var]['nbins']>0: h = TH1F(s, ";"+variable[var]['title'], variable[var]['nbins'], variable[var]['min'], variable[var]['max'])
+    else: h = TH1F(s, ";"+variable[var]['title'], len(variable[var]['bins'])-1, array('f', variable[var]['bins']))
+    h.SetDirectory(0)
+    h.Sumw2()
+    return h
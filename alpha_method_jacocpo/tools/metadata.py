@@ -0,0 +1,100 @@
+#! /usr/bin/env python
+
+import os, json, fcntl
+from ROOT import TFile, TTree, TH1, TH1D, TDirectory
+
+from samples import sample
+from columns import fileStamp
+
+NTUPLEDIR = "ntuples/"
+METAFILE = "ntuples/metadata.json"
+
+
+##################
+# METADATA INDEX #
+##################
+
+# For every ntuple the index keeps the number of entries and the branches of each tree, the sum of the generator weights
+# and the content of the histograms in the Counters directory. Files are identified by path, size and modification time,
+# and only the ones that changed are opened again.
+
+index = {}
+
+def loadIndex(indexfile=METAFILE):
+    global index
+    if len(index) == 0 and os.path.exists(indexfile):
+        with open(indexfile) as f: index = json.load(f)
+    return index
+
+
+# The index on disk may have been updated by another process since it was loaded (e.g. parallel project() calls): under a
+# lock, it is read again and only the entries refreshed here (all if refreshed is None) replace the ones on disk
+def saveIndex(indexfile=METAFILE, refreshed=None):
+    with open(indexfile + ".lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(indexfile):
+            with open(indexfile) as f: disk = json.load(f)
+            for path in disk.keys():
+                if not path in index or (refreshed is not None and not path in refreshed): index[path] = disk[path]
+        tmp = indexfile + ".tmp%d" % os.getpid()
+        with open(tmp, "w") as f: json.dump(index, f, indent=1, sort_keys=True)
+        os.rename(tmp, indexfile)
+
+
+def readInfo(path):
+    info = {'stamp' : fileStamp(path), 'trees' : {}, 'counters' : {}}
+    f = TFile(path, "READ")
+    for key in f.GetListOfKeys():
+        obj = key.ReadObj()
+        if isinstance(obj, TTree) and not key.GetName() in info['trees']:
+            branches = [b.GetName() for b in obj.GetListOfBranches()]
+            sumw = obj.GetEntries()
+            if "genWeight" in branches:
+                # Project looks the histogram up by name in the file, so the name must not clash with its objects
+                name = "sumGenWeight_%s_%d" % (key.GetName(), os.getpid())
+                h = TH1D(name, "", 1, -1., 1.)
+                obj.Project(name, "0.", "genWeight")
+                sumw = h.GetBinContent(1) + h.GetBinContent(0) + h.GetBinContent(2)
+                h.SetDirectory(0)
+            info['trees'][key.GetName()] = {'entries' : obj.GetEntriesFast(), 'branches' : branches, 'sumGenWeight' : sumw}
+        elif isinstance(obj, TDirectory) and key.GetName() == "Counters":
+            for ckey in obj.GetListOfKeys():
+                h = ckey.ReadObj()
+                if isinstance(h, TH1): info['counters'][ckey.GetName()] = [h.GetBinContent(b) for b in range(h.GetNbinsX()+2)]
+    f.Close()
+    return info
+
+
+# Metadata of a list of files (names as in samples.py), refreshing the entries of the files that changed
+def getInfo(files, ntupledir=NTUPLEDIR, indexfile=METAFILE):
+    loadIndex(indexfile)
+    refreshed = []
+    for ss in files:
+        path = ntupledir + ss + ".root"
+        if not path in index or index[path]['stamp'] != fileStamp(path):
+            index[path] = readInfo(path)
+            refreshed.append(path)
+    if len(refreshed) > 0: saveIndex(indexfile, refreshed)
+    return [index[ntupledir + ss + ".root"] for ss in files]
+
+
+# Number of entries of a tree
+def getEntries(filename, treeName, ntupledir=NTUPLEDIR):
+    return getInfo([filename], ntupledir)[0]['trees'][treeName]['entries']
+
+
+# Content of a bin of a counter histogram, e.g. the number of generated events in bin 1 of Counters/Counter
+def getCounter(filename, name="Counter", bin=1, ntupledir=NTUPLEDIR):
+    return getInfo([filename], ntupledir)[0]['counters'][name][bin]
+
+
+# Refresh the index for all the samples
+def updateIndex(ntupledir=NTUPLEDIR, indexfile=METAFILE):
+    files = []
+    for s in sorted(sample.keys()):
+        files += [ss for ss in sample[s]['files'] if os.path.exists(ntupledir + ss + ".root") and not ss in files]
+    return getInfo(files, ntupledir, indexfile)
+
+
+if __name__ == "__main__":
+    print "Metadata of %d files in %s" % (len(updateIndex()), METAFILE)
@@ -0,0 +1,113 @@
+#! /usr/bin/env python
+
+import math
+import numpy as np
+from ROOT import RooArgSet
+
+from integrals import intExp, intGaus, intErfExp
+
+# scipy has a vectorized erf, otherwise math.erf is mapped over the array
+try:
+    from scipy.special import erf
+except ImportError:
+    erf = lambda u: np.frompyfunc(math.erf, 1, 1)(u).astype(np.float64)
+
+
+#######################
+# NUMPY JET MASS PDFS #
+#######################
+
+# Batch versions of the shapes in PDFs/HWWLVJRooPdfs.cxx, evaluated on whole arrays of jet mass values.
+# The parameters are given in the same order as in the constructors of the compiled pdfs, e.g.
+# RooErfExpPdf(name, title, x, c, offset, width) -> shape "ERFEXP" with pars [c, offset, width].
+
+def erfExp(x, c, offset, width):
+    width = max(float(width), 1.e-2)
+    if c == 0: c = -1.e-7
+    return np.exp(c*x)*(1. + erf((x-offset)/width))/2.
+
+def expo(x, c):
+    return np.exp(c*x)
+
+def expN(x, c, n):
+    return np.exp(c*x + n/x)
+
+def expTail(x, s, a):
+    return np.exp(-x/(s + a*x))
+
+def twoExp(x, c0, c1, frac):
+    frac = min(max(frac, 0.), 1.)
+    return np.exp(x*c0) + frac*np.exp(x*c1)
+
+def gaus(x, mean, sigma):
+    return np.exp(-0.5*((x-mean)/sigma)**2)
+
+# Ratios of the RooAlpha* pdfs
+def alphaErfExp(x, c, offset, width, ca, offseta, widtha, xmin, xmax):
+    return erfExp(x, c, offset, width)/normalization("ERFEXP", [c, offset, width], xmin, xmax) / (erfExp(x, ca, offseta, widtha)/normalization("ERFEXP", [ca, offseta, widtha], xmin, xmax))
+
+def alphaExp(x, c, ca, xmin, xmax):
+    return expo(x, c)/normalization("EXP", [c], xmin, xmax) / (expo(x, ca)/normalization("EXP", [ca], xmin, xmax))
+
+def alpha4ExpN(x, c0, n0, c1, n1):
+    return expN(x, c0-c1, n0-n1)
+
+def alpha4ExpTail(x, s0, a0, s1, a1):
+    return expTail(x, s0, a0)/expTail(x, s1, a1)
+
+def alpha42Exp(x, c00, c01, frac0, c10, c11, frac1):
+    return twoExp(x, c00, c01, frac0)/twoExp(x, c10, c11, frac1)
+
+
+shapes = {
+    'ERFEXP' : erfExp,
+    'EXP' : expo,
+    'EXPN' : expN,
+    'EXPTAIL' : expTail,
+    '2EXP' : twoExp,
+    'GAUS' : gaus,
+    'ALPHA' : alphaErfExp,
+    'ALPHAEXP' : alphaExp,
+    'ALPHAEXPN' : alpha4ExpN,
+    'ALPHAEXPTAIL' : alpha4ExpTail,
+    'ALPHA2EXP' : alpha42Exp,
+}
+
+
+# Gauss-Legendre nodes and weights, used for the shapes without a closed-form integral
+nodes, weights = np.polynomial.legendre.leggauss(64)
+
+def normalization(shape, pars, xmin, xmax, panels=16):
+    if shape == "EXP": return intExp(xmin, xmax, *pars)
+    if shape == "ERFEXP": return intErfExp(xmin, xmax, *pars)
+    if shape == "GAUS": return math.sqrt(2.*math.pi)*pars[1]*intGaus(xmin, xmax, *pars)
+    edges = np.linspace(xmin, xmax, panels+1)
+    half = (edges[1:] - edges[:-1])/2.
+    x = ((edges[1:] + edges[:-1])/2.)[:, np.newaxis] + half[:, np.newaxis]*nodes[np.newaxis, :]
+    return float(np.sum(half[:, np.newaxis]*weights[np.newaxis, :]*shapes[shape](x.ravel(), *pars).reshape(x.shape)))
+
+
+# Normalized density over [xmin, xmax]
+def density(shape, x, pars, xmin, xmax):
+    return shapes[shape](np.asarray(x, dtype=np.float64), *pars)/normalization(shape, pars, xmin, xmax)
+
+
+# Weighted negative log-likelihood of the events x (with weights w) for the normalized shape
+def nll(shape, x, pars, xmin, xmax, w=None):
+    logp = np.log(density(shape, x, pars, xmin, xmax))
+    return -float(np.sum(logp if w is None else w*logp))
+
+
+# Largest relative difference between the numpy density and the compiled pdf normalized on the same variable,
+# on n points of its range; the parameters of the pdf have to be set to pars beforehand
+def checkPdf(pdf, var, shape, pars, n=50):
+    xmin, xmax = var.getMin(), var.getMax()
+    points = np.linspace(xmin, xmax, n+2)[1:-1]
+    mine = density(shape, points, pars, xmin, xmax)
+    theirs = np.zeros(n)
+    old = var.getVal()
+    for i, p in enumerate(points):
+        var.setVal(p)
+        theirs[i] = pdf.getVal(RooArgSet(var))
+    var.setVal(old)
+    return float(np.max(np.abs(mine - theirs)/np.maximum(np.abs(theirs), 1.e-300)))
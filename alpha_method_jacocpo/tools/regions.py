@@ -0,0 +1,57 @@
+#! /usr/bin/env python
+
+import numpy as np
+
+from cuts import evalCut
+from columns import columnsToTree
+
+
+####################
+# JET MASS REGIONS #
+####################
+
+# Split the selected events in the jet mass regions in a single pass:
+# the base selection is evaluated once, then every event gets the index of its region
+# from one lookup on the sorted region boundaries (-1 if it fails the selection or falls in no region).
+# Boundaries are exclusive, as in the "%s>%d && %s<%d" cut strings.
+def partition(cols, baseCut, jetMass, regions):
+    base = evalCut(baseCut, cols)
+    x = np.asarray(cols[jetMass])
+    edges = sorted(set([lo for n, (lo, hi) in regions] + [hi for n, (lo, hi) in regions]))
+    lookup = np.full(len(edges)+1, -1, dtype=np.int8)
+    for k, (n, (lo, hi)) in enumerate(regions):
+        if hi > lo: lookup[edges.index(lo)+1 : edges.index(hi)+1] = k
+    i = np.searchsorted(edges, x, side='left')
+    onEdge = np.take(np.append(edges, np.inf), i) == x
+    region = lookup[i]
+    region[onEdge | ~base] = -1
+    return base, region
+
+
+# Boolean mask for a group of regions, e.g. regionMask(region, regions, ["LSB", "HSB"])
+def regionMask(region, regions, names):
+    codes = [k for k, (n, r) in enumerate(regions) if n in names]
+    return np.in1d(region, codes)
+
+
+# Create a weighted RooDataSet holding only the events in the mask
+def maskedDataSet(name, variables, weight, cols, mask):
+    from ROOT import RooFit, RooDataSet
+    tree = columnsToTree(cols, "tree_"+name, mask)
+    return RooDataSet(name, name, variables, RooFit.WeightVar(weight), RooFit.Import(tree))
+
+
+# Copy of the columns restricted to the events in the mask
+def selectColumns(cols, mask):
+    return dict([(b, np.ascontiguousarray(v[mask])) for b, v in cols.iteritems()])
+
+
+# Cut string with the ranges of the variables of a RooArgSet, that RooDataSet applies when importing a tree
+def rangeCut(variables):
+    cut = []
+    it = variables.createIterator()
+    v = it.Next()
+    while v:
+        cut.append("%s>=%.10g && %s<=%.10g" % (v.GetName(), v.getMin(), v.GetName(), v.getMax()))
+        v = it.Next()
+    return " && ".join(cut)
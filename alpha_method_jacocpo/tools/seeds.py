@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+
+import os, json
+from ROOT import RooArgSet
+
+SEEDDIR = "ntuples/cache/seeds/"
+
+
+#############
+# FIT SEEDS #
+#############
+
+# Converged parameters of the fits, stored per channel, component (Vjet, VV, Top) and function, so that the next fit of the
+# same model starts from the last solution instead of the hard-coded initial values. A channel without a seed takes the one
+# of the nearest channel (same number of leptons first, then same number of b-tags, then same flavour).
+# Every channel has its own file, since the channels run in parallel processes.
+
+def parameterList(model, var):
+    params = model.getParameters(RooArgSet(var))
+    it = params.createIterator()
+    p, pars = it.Next(), []
+    while p:
+        pars.append(p)
+        p = it.Next()
+    return pars
+
+
+def channelDistance(a, b):
+    return 4*abs(a.count('e') + a.count('m') - b.count('e') - b.count('m')) + 2*abs(a.count('b') - b.count('b')) + ((a.count('e') > 0) != (b.count('e') > 0))
+
+
+def loadSeeds(channel, seeddir=SEEDDIR):
+    path = seeddir + channel + ".json"
+    if not os.path.exists(path): return {}
+    with open(path) as f: return json.load(f)
+
+
+# Parameter values of the nearest channel with a converged fit of the same component and function
+def getSeed(channel, component, func, channels, seeddir=SEEDDIR):
+    for c in sorted(set(channels + [channel]), key=lambda c: (channelDistance(channel, c), c != channel, channels.index(c) if c in channels else 0)):
+        seeds = loadSeeds(c, seeddir)
+        if component + "/" + func in seeds: return seeds[component + "/" + func]
+    return {}
+
+
+# Set the floating parameters of the model to the seed, when inside their range
+def applySeed(model, var, seed):
+    for p in parameterList(model, var):
+        v = seed.get(p.GetName())
+        if v is not None and not p.isConstant() and p.getMin() <= v <= p.getMax(): p.setVal(v)
+
+
+def saveSeed(channel, component, func, model, var, seeddir=SEEDDIR):
+    seeds = loadSeeds(channel, seeddir)
+    seeds[component + "/" + func] = dict([(p.GetName(), p.getVal()) for p in parameterList(model, var) if not p.isConstant()])
+    if not os.path.exists(seeddir): os.makedirs(seeddir)
+    path = seeddir + channel + ".json"
+    tmp = path + ".tmp%d" % os.getpid()
+    with open(tmp, "w") as f: json.dump(seeds, f, indent=1, sort_keys=True)
+    os.rename(tmp, path)
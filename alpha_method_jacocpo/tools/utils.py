@@ -3,7 +3,7 @@ import copy
 import math
 from array import array
 from ROOT import ROOT, gROOT, gStyle, gRandom, TSystemDirectory
-from ROOT import TFile, TChain, TTree, TCut, TH1F, TH2F, THStack, TGraph
+from ROOT import TFile, TChain, TTree, TCut, TH1F, TH1D, TH2F, THStack, TGraph
 from ROOT import TStyle, TCanvas, TPad
 from ROOT import TLegend, TLatex, TText, TLine
 
@@ -11,6 +11,7 @@ from samples import *
 from variables import *
 from selections import *
 from xSections import xsections
+from metadata import getEntries
 
 #triggerSF = {'HLT_BIT_HLT_Mu45_eta2p1_v' : 0.94, 'HLT_BIT_HLT_Mu50_v' : 0.94, 'HLT_BIT_HLT_IsoMu27_v' : 1.002, 'HLT_BIT_HLT_Ele27_WP85_Gsf_v' : 0.9995, 'HLT_BIT_HLT_Ele105_CaloIdVT_GsfTrkIdT_v' : 0.97, 'HLT_BIT_HLT_PFMET170_NoiseCleaned_v' : 0.9697}
 
@@ -19,35 +20,55 @@ from xSections import xsections
 # ANALYSIS UTILS #
 ##################
 
-def project(var, cut, reg, weight, samples, pd, ntupledir):
+def project(var, cut, reg, weight, samples, pd, ntupledir, jobs=0):
     # Create dict
     file = {}
     tree = {}
     hist = {}
     
+    # With jobs > 0 every file is projected separately by a pool of processes
+    if jobs > 0:
+        shards = [(s, ss) for s in samples for ss in sample[s]['files'] if not 'data' in s or ss in pd]
+        pool = multiprocessing.Pool(jobs)
+        partial = pool.map(projectFile, [(var, sampleCut(s, cut), reg, weight, ntupledir + ss + ".root") for s, ss in shards])
+        pool.close()
+        pool.join()
+    
     ### Create and fill MC histograms ###
     for i, s in enumerate(samples):
         if "HIST" in cut: # Histogram written to file
             tmphist = file[ss].Get(var)
+        elif jobs > 0: # Merge the partial histograms, always in the order of the files in samples.py
+            if variable[var]['nbins']>0: hist[s] = TH1F(s, ";"+variable[var]['title'], variable[var]['nbins'], variable[var]['min'], variable[var]['max']) # Init histogram
+            else: hist[s] = TH1F(s, ";"+variable[var]['title'], len(variable[var]['bins'])-1, array('f', variable[var]['bins']))
+            hist[s].Sumw2()
+            sumw, sumw2, entries, nevents = [0.]*(hist[s].GetNbinsX()+2), [0.]*(hist[s].GetNbinsX()+2), 0., 0
+            for k, (ks, kss) in enumerate(shards):
+                if ks != s: continue
+                sumw = [a+b for a, b in zip(sumw, partial[k][0])]
+                sumw2 = [a+b for a, b in zip(sumw2, partial[k][1])]
+                entries += partial[k][2]
+                nevents += partial[k][3]
+            for b in range(hist[s].GetNbinsX()+2):
+                hist[s].SetBinContent(b, sumw[b])
+                hist[s].SetBinError(b, math.sqrt(sumw2[b]))
+            hist[s].SetEntries(entries)
+            hist[s].SetOption("%s" % nevents)
+            hist[s].Scale(sample[s]['weight'] if hist[s].Integral() >= 0 else 0)
         else: # Project from tree
             tree[s] = TChain(reg)
+            last = None
             for j, ss in enumerate(sample[s]['files']):
                 if not 'data' in s or ('data' in s and ss in pd):
                     tree[s].Add(ntupledir + ss + ".root")
+                    last = ss
             if variable[var]['nbins']>0: hist[s] = TH1F(s, ";"+variable[var]['title'], variable[var]['nbins'], variable[var]['min'], variable[var]['max']) # Init histogram
             else: hist[s] = TH1F(s, ";"+variable[var]['title'], len(variable[var]['bins'])-1, array('f', variable[var]['bins']))
             hist[s].Sumw2()
-            tmpcut = cut
-            if not 'data' in s:
-                if s.endswith('_0b'): tmpcut += " && nBJets==0"
-                elif s.endswith('_1b'): tmpcut += " && nBJets==1"
-                elif s.endswith('_2b'): tmpcut += " && nBJets>=2"
-                if s.endswith('_0l'): tmpcut += " && genNl==0"
-                elif s.endswith('_1l'): tmpcut += " && genNl==1"
-                elif s.endswith('_2l'): tmpcut += " && genNl>=2"
+            tmpcut = sampleCut(s, cut)
             cutstring = "("+weight+")" + ("*("+tmpcut+")" if len(tmpcut)>0 else "")
             tree[s].Project(s, var, cutstring)
-            hist[s].SetOption("%s" % tree[s].GetTree().GetEntriesFast())
+            hist[s].SetOption("%s" % (getEntries(last, reg, ntupledir) if last is not None else 0)) # entries of the last tree of the chain, from the metadata index
             hist[s].Scale(sample[s]['weight'] if hist[s].Integral() >= 0 else 0)
 
         hist[s].SetFillColor(sample[s]['fillcolor'])
@@ -58,6 +79,35 @@ def project(var, cut, reg, weight, samples, pd, ntupledir):
     return hist
 
 
+# Project one file in a separate process into the same TH1F as the serial path, returning the sum of weights and of squared weights in each bin (with under/overflow)
+def projectFile(args):
+    var, cut, reg, weight, filename = args
+    f = TFile(filename, "READ")
+    t = f.Get(reg)
+    if variable[var]['nbins']>0: h = TH1F("partial", "", variable[var]['nbins'], variable[var]['min'], variable[var]['max'])
+    else: h = TH1F("partial", "", len(variable[var]['bins'])-1, array('f', variable[var]['bins']))
+    h.Sumw2()
+    cutstring = "("+weight+")" + ("*("+cut+")" if len(cut)>0 else "")
+    t.Project("partial", var, cutstring)
+    result = ([h.GetBinContent(b) for b in range(h.GetNbinsX()+2)], [h.GetBinError(b)**2 for b in range(h.GetNbinsX()+2)], h.GetEntries(), t.GetEntriesFast())
+    f.Close()
+    return result
+
+
+# Add the b-jet and generator-lepton splitting of the _0b/_1b/_2b and _0l/_1l/_2l sub-samples to the cut
+def sampleCut(s, cut):
+    extra = []
+    if not 'data' in s:
+        if s.endswith('_0b'): extra.append("nBJets==0")
+        elif s.endswith('_1b'): extra.append("nBJets==1")
+        elif s.endswith('_2b'): extra.append("nBJets>=2")
+        if s.endswith('_0l'): extra.append("genNl==0")
+        elif s.endswith('_1l'): extra.append("genNl==1")
+        elif s.endswith('_2l'): extra.append("genNl>=2")
+    if len(extra) == 0: return cut
+    return " && ".join((["("+cut+")"] if len(cut.strip()) > 0 else []) + extra)
+
+
 def draw(hist, channel, data, back, sign, snorm=1, lumi=-1, ratio=0, log=False):
     # If not present, create BkgSum
     if not 'BkgSum' in hist.keys():
@@ -16,6 +16,9 @@ from ROOT import RooFormulaVar, RooGenericPdf, RooGaussian, RooExponential, RooP
 from ROOT import PdfDiagonalizer, RooAlphaExp, RooErfExpPdf, Roo2ExpPdf, RooAlpha42ExpPdf, RooExpNPdf, RooAlpha4ExpNPdf, RooExpTailPdf, RooAlpha4ExpTailPdf, RooAlpha
 
 from tools.utils import *
+from tools.propagation import propagatedError
+from tools.families import scanFamilies, printFamilies
+from tools.likelihood import likelihoodScan, scanGrid, scanInterval
 
 import optparse
 usage = "usage: %prog [options]"
@@ -25,6 +28,8 @@ parser.add_option("-b", "--bash", action="store_true", default=False, dest="bash
 parser.add_option("-c", "--channel", action="store", type="string", dest="channel", default="")
 parser.add_option("-d", "--different", action="store_true", default=False, dest="different")
 parser.add_option("-e", "--extrapolate", action="store_true", default=False, dest="extrapolate")
+parser.add_option("-f", "--families", action="store_true", default=False, dest="families")
+parser.add_option("-j", "--jobs", action="store", type="int", default=1, dest="jobs")
 parser.add_option("-s", "--scan", action="store_true", default=False, dest="scan")
 parser.add_option("-v", "--verbose", action="store_true", default=False, dest="verbose")
 (options, args) = parser.parse_args()
@@ -39,6 +44,7 @@ gStyle.SetPadRightMargin(0.05)
 
 ALTERNATIVE = options.different
 EXTRAPOLATE = options.extrapolate
+FAMILIES    = options.families
 SCAN        = options.scan
 NTUPLEDIR   = "../jacopo_codes/ntuples/"
 PLOTDIR     = "plotsAlpha/"
@@ -48,6 +54,7 @@ BLIND       = False#True if not EXTRAPOLATE else False
 LUMISILVER  = 2460.
 LUMIGOLDEN  = 2110.
 VERBOSE     = options.verbose
+NCPU        = options.jobs
 
 channelList = ['XZhnnb', 'XZhnnbb', 'XWhenb', 'XWhenbb', 'XWhmnb', 'XWhmnbb', 'XZheeb', 'XZhmmb', 'XZheebb', 'XZhmmbb']
 massPoints = [600, 800, 1000, 1200, 1400, 1600, 1800, 2000, 2500, 3000, 3500, 4000, 4500]
@@ -76,6 +83,15 @@ topSFErr = [[1, 0.062, 0.126], [1, 0.032, 0.073], [1, 1, 1]]
 ########## ######## ##########
 
 
+# Extended fit to data in SB. With -j/--jobs the likelihood is computed by NCPU processes, each on a contiguous block of
+# events (RooFit.NumCPU(NCPU, 0)); the partial sums are always added in the order of the blocks, so the result does not
+# depend on which process finishes first. NumCPU is only added with -j, so the options are collected in a list first.
+def sidebandFit(model, data):
+    args = [RooFit.SumW2Error(True), RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"), RooFit.Strategy(2), RooFit.Minimizer("Minuit"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1)]
+    if NCPU > 1: args.append(RooFit.NumCPU(NCPU, 0))
+    return model.fitTo(data, *args)
+
+
 def alpha(channel):
 
     nElec = channel.count('e')
@@ -286,6 +302,13 @@ def alpha(channel):
     print "  VV, VH entries: %.2f" % setVV.sumEntries()
     print "  Top,ST entries: %.2f" % setTop.sumEntries()
     
+    # Fit all the functions of each background to the same dataset and rank them, instead of the fits with the functions chosen above
+    if FAMILIES:
+        for bkg, dataset in [("Vjet", setVjet), ("VV", setVV), ("Top", setTop)]:
+            results, syst = scanFamilies(bkg, J_mass, dataset, channel, jobs=NCPU if NCPU > 1 else 0)
+            printFamilies(bkg, channel, results, syst)
+        return
+    
     nVV   = RooRealVar("nVV",  "VV normalization",   setVV.sumEntries(SBcut),   0., 2*setVV.sumEntries(SBcut))
     nTop  = RooRealVar("nTop", "Top normalization",  setTop.sumEntries(SBcut),  0., 2*setTop.sumEntries(SBcut))
     nVjet = RooRealVar("nVjet","Vjet normalization", setDataSB.sumEntries(), 0., 2*setDataSB.sumEntries(SBcut))
@@ -518,14 +541,11 @@ def alpha(channel):
     BkgMass2.fixAddCoefRange("h_reasonable_range")
     
     # Extended fit model to data in SB
-    frMass = BkgMass.fitTo(setDataSB, RooFit.SumW2Error(True), RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"), RooFit.Strategy(2), RooFit.Minimizer("Minuit"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1)) #, RooFit.NumCPU(10)
+    frMass = sidebandFit(BkgMass, setDataSB)
     if VERBOSE: print "********** Fit result [JET MASS DATA] **"+"*"*40, "\n", frMass.Print(), "\n", "*"*80
-    frMass2 = BkgMass2.fitTo(setDataSB, RooFit.SumW2Error(True), RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"), RooFit.Strategy(2), RooFit.Minimizer("Minuit"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
+    frMass2 = sidebandFit(BkgMass2, setDataSB)
     if VERBOSE: print "********** Fit result [JET MASS DATA] **"+"*"*40, "\n", frMass2.Print(), "\n", "*"*80
     
-    #if SCAN:
-    #    likelihoodScan(VjetMass, setVjet, [constVjet, offsetVjet, widthVjet])
-    
     # Fix normalization and parameters of V+jets after the fit to data
     nVjet.setConstant(True)
     nVjet2.setConstant(True)
@@ -572,14 +592,27 @@ def alpha(channel):
     # final normalization values
     bkgYield            = SRyield.getVal()
     bkgYield2           = (VjetMass2.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))).getVal()*nVjet2.getVal() + iSRVV.getVal()*nVV.getVal() + iSRTop.getVal()*nTop.getVal()
-    bkgYield_syst       = math.sqrt(SRyield.getPropagatedError(frVV)**2 + SRyield.getPropagatedError(frTop)**2)
-    bkgYield_stat       = math.sqrt(SRyield.getPropagatedError(frMass)**2)
+    bkgYield_syst       = propagatedError(SRyield, [frVV, frTop])
+    bkgYield_stat       = propagatedError(SRyield, frMass)
     bkgYield_alte       = abs(bkgYield - bkgYield2) #/bkgYield
     bkgYield_eig_norm   = RooRealVar("predSR_eig_norm", "expected yield in SR", bkgYield, 0., 1.e6)   
     
     print "Events in channel", channel, ": V+jets %.3f (%.1f%%),   VV %.3f (%.1f%%),   Top %.3f (%.1f%%)" % (iSRVjet.getVal()*nVjet.getVal(), fSRVjet.getVal()*100, iSRVV.getVal()*nVV.getVal(), fSRVV.getVal()*100, iSRTop.getVal()*nTop.getVal(), fSRTop.getVal()*100)
     print "Events in channel", channel, ": Integral = $%.3f$ & $\pm %.3f$ & $\pm %.3f$ & $\pm %.3f$, observed = %.0f" % (bkgYield, bkgYield_stat, bkgYield_syst, bkgYield_alte, setDataSR.sumEntries() if not False else -1)
     
+    # Profile likelihood of the fit to data in SB, in the V+jets normalization and in the SR yield (non-parabolic errors)
+    if SCAN:
+        floating = [BkgMass.getVariables().find(frMass.floatParsFinal().at(i).GetName()) for i in range(frMass.floatParsFinal().getSize())]
+        for p in floating:
+            p.setVal(frMass.floatParsFinal().find(p.GetName()).getVal())
+            p.setConstant(False)
+        nll = BkgMass.createNLL(setDataSB, RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"))
+        for v, e in [(nVjet, nVjet.getError()), (SRyield, bkgYield_stat)]:
+            scan = likelihoodScan(nll, [v], [scanGrid(v, e)], jobs=NCPU if NCPU > 1 else 0, tag=channel+"_"+v.GetName())
+            lo, hi = scanInterval(scan)
+            print "Profile likelihood in channel", channel, ":", v.GetName(), "= %.3f -%.3f +%.3f (parabolic +-%.3f)" % (v.getVal(), v.getVal() - lo, hi - v.getVal(), e)
+        for p in floating: p.setConstant(True)
+    
     # ====== CONTROL VALUE ======
 
 
@@ -1,7 +1,8 @@
 #! /usr/bin/env python
 
-import os, sys, getopt, multiprocessing
+import os, sys, getopt, multiprocessing, glob
 import copy, math
+import numpy as np
 from array import array
 from ROOT import gROOT, gSystem, gStyle, gRandom
 from ROOT import TFile, TChain, TTree, TCut, TH1F, TH2F, THStack, TGraph, TGaxis
@@ -16,15 +17,30 @@ from ROOT import RooFormulaVar, RooGenericPdf, RooGaussian, RooExponential, RooP
 from ROOT import PdfDiagonalizer, RooAlphaExp, RooErfExpPdf, Roo2ExpPdf, RooAlpha42ExpPdf, RooExpNPdf, RooAlpha4ExpNPdf, RooExpTailPdf, RooAlpha4ExpTailPdf, RooAlpha
 
 from tools.utils import *
+from tools.propagation import propagatedError
+from tools.models import Model
+from tools.toys import runToys, replayToy, readResults
+from tools.stats import ToyMonitor
+from tools.generator import InverseCDF, BinnedToys, arrayDataSet
 
 import optparse
 usage = "usage: %prog [options]"
 parser = optparse.OptionParser(usage)
 parser.add_option("-a", "--all", action="store_true", default=False, dest="all")
 parser.add_option("-b", "--bash", action="store_true", default=False, dest="bash")
+parser.add_option("-B", "--binned", action="store_true", default=False, dest="binned")
 parser.add_option("-c", "--channel", action="store", type="string", dest="channel", default="")
 parser.add_option("-d", "--different", action="store_true", default=False, dest="different")
 parser.add_option("-e", "--extrapolate", action="store_true", default=False, dest="extrapolate")
+parser.add_option("-E", "--error", action="store", type="float", default=0., dest="error")
+parser.add_option("-F", "--failures", action="store", type="float", default=1., dest="failures")
+parser.add_option("-i", "--first", action="store", type="int", default=0, dest="first")
+parser.add_option("-j", "--jobs", action="store", type="int", default=0, dest="jobs")
+parser.add_option("-n", "--toys", action="store", type="int", default=1000, dest="toys")
+parser.add_option("-O", "--overwrite", action="store_true", default=False, dest="overwrite")
+parser.add_option("-r", "--replay", action="store", type="int", default=-1, dest="replay")
+parser.add_option("-R", "--resume", action="store_true", default=False, dest="resume")
+parser.add_option("-S", "--summary", action="store_true", default=False, dest="summary")
 parser.add_option("-s", "--scan", action="store_true", default=False, dest="scan")
 parser.add_option("-v", "--verbose", action="store_true", default=False, dest="verbose")
 (options, args) = parser.parse_args()
@@ -48,6 +64,16 @@ BLIND       = False#True if not EXTRAPOLATE else False
 LUMISILVER  = 2460.
 LUMIGOLDEN  = 2110.
 VERBOSE     = options.verbose
+NCPU        = options.jobs
+BINNED      = options.binned
+REPLAY      = options.replay
+TOYS        = options.toys
+FIRST       = options.first
+RESUME      = options.resume
+OVERWRITE   = options.overwrite
+SUMMARY     = options.summary
+TARGET      = options.error
+MAXFAIL     = options.failures
 
 channelList = ['XZhnnb', 'XZhnnbb', 'XWhenb', 'XWhenbb', 'XWhmnb', 'XWhmnbb', 'XZheeb', 'XZhmmb', 'XZheebb', 'XZhmmbb']
 massPoints = [600, 800, 1000, 1200, 1400, 1600, 1800, 2000, 2500, 3000, 3500, 4000, 4500]
@@ -144,6 +170,18 @@ def alpha(channel):
 
     list_function_name = [["fitFuncVjet",fitFuncVjet],["fitFuncVV",fitFuncVV],["fitFuncTop",fitFuncTop]]
 
+    Save_Dir = "/afs/cern.ch/user/y/yuchang/www/jacopo_plotsAlpha/yu_hsiang_bias_study_new"
+    Save_Dir = Save_Dir +"/"+ channel 
+
+    # with -S the results of the toys are only read back, without the datasets and the template fits
+    study = toyStudy(channel, list_function_name)
+    if SUMMARY:
+        Bias_and_Pull_Summary(study, Save_Dir)
+        return
+    if REPLAY < 0 and not RESUME and not OVERWRITE and os.path.exists(toyResults(study, Save_Dir)):
+        print "  ERROR! Results file", toyResults(study, Save_Dir), "already exists, resume the study with -R or overwrite it with -O"
+        exit()
+
     # -----------------------------------------
 
     btagCut = selection["2Btag"] if nBtag == 2 else selection["1Btag"]
@@ -558,9 +596,6 @@ def alpha(channel):
     # -------------------------------------------
     # bias study
 
-    Save_Dir = "/afs/cern.ch/user/y/yuchang/www/jacopo_plotsAlpha/yu_hsiang_bias_study_new"
-    Save_Dir = Save_Dir +"/"+ channel 
-    
     Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_pars, list_Top_pars, list_of_set, Save_Dir  )
 
 
@@ -634,8 +669,8 @@ def alpha(channel):
     # final normalization values
     bkgYield            = SRyield.getVal()
     bkgYield2           = (VjetMass2.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))).getVal()*nVjet2.getVal() + iSRVV.getVal()*nVV.getVal() + iSRTop.getVal()*nTop.getVal()
-    bkgYield_syst       = math.sqrt(SRyield.getPropagatedError(frVV)**2 + SRyield.getPropagatedError(frTop)**2)
-    bkgYield_stat       = math.sqrt(SRyield.getPropagatedError(frMass)**2)
+    bkgYield_syst       = propagatedError(SRyield, [frVV, frTop])
+    bkgYield_stat       = propagatedError(SRyield, frMass)
     bkgYield_alte       = abs(bkgYield - bkgYield2) #/bkgYield
     bkgYield_eig_norm   = RooRealVar("predSR_eig_norm", "expected yield in SR", bkgYield, 0., 1.e6)   
     
@@ -704,24 +739,8 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     setVjet = list_of_set[1][0][1] 
     setVjet.plotOn(plot_MC_fit_Vjet_frame) 
 
-    constVjet_   = RooRealVar("constVjet_" , "slope of the exp" ,  list_Vjet_pars[0][1],  -1.,   0.)
-    offsetVjet_  = RooRealVar("offsetVjet_", "offset of the erf",  list_Vjet_pars[1][1], -50., 400.)
-    widthVjet_   = RooRealVar("widthVjet_" , "width of the erf" ,  list_Vjet_pars[2][1],   1., 200.) #0, 400
-    a0Vjet_      = RooRealVar("a0Vjet_"    , "width of the erf" ,  list_Vjet_pars[3][1],  -5 ,   0 )
-    a1Vjet_      = RooRealVar("a1Vjet_"    , "width of the erf" ,  list_Vjet_pars[4][1],   0 ,   5 )
-    a2Vjet_      = RooRealVar("a2Vjet_"    , "width of the erf" ,  list_Vjet_pars[5][1],  -1 ,   1 )
-
-    if channel=="XZhnnb":
-        offsetVjet_  = RooRealVar("offsetVjet_",  "offset of the erf",    list_Vjet_pars[1][1],   200., 1000.)
-    if channel=="XZhnnbb":
-        offsetVjet_  = RooRealVar("offsetVjet_",  "offset of the erf",    list_Vjet_pars[1][1],   200., 500.)
-
-    fitFuncVjet = list_function_name[0][1] 
-    if fitFuncVjet == "ERFEXP": VjetMass_ = RooErfExpPdf("VjetMass_"  , fitFuncVjet, J_mass, constVjet_, offsetVjet_, widthVjet_)
-    elif fitFuncVjet == "EXP" : VjetMass_ = RooExponential("VjetMass_", fitFuncVjet, J_mass, constVjet_)
-    elif fitFuncVjet == "GAUS": VjetMass_ = RooGaussian("VjetMass_"   , fitFuncVjet, J_mass, offsetVjet_, widthVjet_)
-    elif fitFuncVjet == "POL" : VjetMass_ = RooChebychev("VjetMass_"  , fitFuncVjet, J_mass, RooArgList(a0Vjet_, a1Vjet_, a2Vjet_))
-    elif fitFuncVjet == "POW" : VjetMass_ = RooGenericPdf("VjetMass_" , fitFuncVjet, "@0^@1", RooArgList(J_mass, a0Vjet_))
+    modelVjet_ = Model("Vjet", list_function_name[0][1], J_mass, [v for n, v in list_Vjet_pars], channel, "_")
+    VjetMass_ = modelVjet_.pdf
 
 
     VjetMass_.plotOn(plot_MC_fit_Vjet_frame, RooFit.Normalization(setVjet.sumEntries() ,RooAbsReal.NumEvent))
@@ -733,27 +752,8 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     setVV = list_of_set[2][0][1]
     setVV.plotOn(plot_MC_fit_VV_frame)
 
-    constVV_  = RooRealVar("constVV_",  "slope of the exp",                list_VV_pars[0][1] ,   -0.1,   0.)
-    offsetVV_ = RooRealVar("offsetVV_", "offset of the erf",               list_VV_pars[1][1] ,     1., 300.)
-    widthVV_  = RooRealVar("widthVV_",  "width of the erf",                list_VV_pars[2][1] ,     1., 100.)
-    erfrVV_   = RooErfExpPdf("baseVV_", "error function for VV jet mass", J_mass, constVV_, offsetVV_, widthVV_)
-    expoVV_   = RooExponential("baseVV_", "error function for VV jet mass", J_mass, constVV_)
-
-    meanVV_   = RooRealVar("meanVV_",   "mean of the gaussian",            list_VV_pars[3][1] ,    60., 100.)
-    sigmaVV_  = RooRealVar("sigmaVV_",  "sigma of the gaussian",           list_VV_pars[4][1] ,     6.,  30.)
-    fracVV_   = RooRealVar("fracVV_",   "fraction of gaussian wrt erfexp", list_VV_pars[5][1] ,     0.,   1.)
-    gausVV_   = RooGaussian("gausVV_",  "gaus for VV jet mass", J_mass, meanVV_, sigmaVV_)
-
-    meanVH_   = RooRealVar("meanVH_",   "mean of the gaussian",            list_VV_pars[6][1] ,   100., 150.)
-    sigmaVH_  = RooRealVar("sigmaVH_",  "sigma of the gaussian",           list_VV_pars[7][1] ,     5.,  50.)
-    fracVH_   = RooRealVar("fracVH_",   "fraction of gaussian wrt erfexp", list_VV_pars[8][1] ,     0.,   1.)
-    gausVH_   = RooGaussian("gausVH_",  "gaus for VH jet mass", J_mass, meanVH_, sigmaVH_)
-
-    fitFuncVV = list_function_name[1][1]
-    if fitFuncVV   == "ERFEXPGAUS" : VVMass_ = RooAddPdf("VVMass_",fitFuncVV , RooArgList(gausVV_, erfrVV_), RooArgList(fracVV_))
-    elif fitFuncVV == "ERFEXPGAUS2": VVMass_ = RooAddPdf("VVMass_",fitFuncVV , RooArgList(gausVH_, gausVV_, erfrVV_), RooArgList(fracVH_, fracVV_))
-    elif fitFuncVV == "EXPGAUS"    : VVMass_ = RooAddPdf("VVMass_",fitFuncVV , RooArgList(gausVV_, expoVV_), RooArgList(fracVV_))
-    elif fitFuncVV == "EXPGAUS2"   : VVMass_ = RooAddPdf("VVMass_",fitFuncVV , RooArgList(gausVH_, gausVV_, expoVV_), RooArgList(fracVH_, fracVV_))
+    modelVV_ = Model("VV", list_function_name[1][1], J_mass, [v for n, v in list_VV_pars], channel, "_")
+    VVMass_ = modelVV_.pdf
 
 
     VVMass_.plotOn(plot_MC_fit_VV_frame, RooFit.Normalization(setVV.sumEntries() ,RooAbsReal.NumEvent))
@@ -765,32 +765,8 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     setTop = list_of_set[3][0][1]
     setTop.plotOn(plot_MC_fit_Top_frame)
 
-    constTop_  = RooRealVar("constTop_",  "slope of the exp",                list_Top_pars[0][1] ,   -1.,   0.)
-    offsetTop_ = RooRealVar("offsetTop_", "offset of the erf",               list_Top_pars[1][1] ,   50., 250.)
-    widthTop_  = RooRealVar("widthTop_",  "width of the erf",                list_Top_pars[2][1] ,    1., 300.)
-    gausTop_   = RooGaussian("baseTop_",  "gaus for Top jet mass", J_mass, offsetTop_, widthTop_)
-    erfrTop_   = RooErfExpPdf("baseTop_", "error function for Top jet mass", J_mass, constTop_, offsetTop_, widthTop_)
-
-    meanW_     = RooRealVar("meanW_",     "mean of the gaussian",            list_Top_pars[3][1] , 70., 90.)
-    sigmaW_    = RooRealVar("sigmaW_",    "sigma of the gaussian",           list_Top_pars[4][1] ,  2., 20.)
-    fracW_     = RooRealVar("fracW_",     "fraction of gaussian wrt erfexp", list_Top_pars[5][1] , 0.,  1.)
-    gausW_     = RooGaussian("gausW_",    "gaus for W jet mass", J_mass, meanW_, sigmaW_)
-
-    meanT_     = RooRealVar("meanT_",     "mean of the gaussian",            list_Top_pars[6][1] , 150., 200.)
-    sigmaT_    = RooRealVar("sigmaT_",    "sigma of the gaussian",           list_Top_pars[7][1] ,   5.,  30.)
-    fracT_     = RooRealVar("fracT_",     "fraction of gaussian wrt erfexp", list_Top_pars[8][1] ,  0.,   1.)
-    gausT_     = RooGaussian("gausT_",    "gaus for T jet mass", J_mass, meanT_, sigmaT_)
-
-    if channel=="XZheeb" or channel=="XZheebb" or channel=="XZhmmb" or channel=="XZhmmbb":
-        offsetTop_ = RooRealVar("offsetTop_", "offset of the erf", list_Top_pars[1][1],   -50., 450.)
-        widthTop_  = RooRealVar("widthTop_",  "width of the erf" , list_Top_pars[2][1],    1., 1000.)
-
-    fitFuncTop = list_function_name[2][1]
-    if fitFuncTop == "ERFEXPGAUS2" : TopMass_ = RooAddPdf("TopMass_"  , fitFuncTop, RooArgList(gausW_, gausT_, erfrTop_), RooArgList(fracW_, fracT_))
-    elif fitFuncTop == "ERFEXPGAUS": TopMass_ = RooAddPdf("TopMass_"  , fitFuncTop, RooArgList(gausT_, erfrTop_)        , RooArgList(fracT_))
-    elif fitFuncTop == "GAUS3"     : TopMass_ = RooAddPdf("TopMass_"  , fitFuncTop, RooArgList(gausW_, gausT_, gausTop_), RooArgList(fracW_, fracT_))
-    elif fitFuncTop == "GAUS2"     : TopMass_ = RooAddPdf("TopMass_"  , fitFuncTop, RooArgList(gausT_, gausTop_)        , RooArgList(fracT_))
-    elif fitFuncTop == "GAUS"      : TopMass_ = RooGaussian("TopMass_", fitFuncTop, J_mass, offsetTop_, widthTop_)
+    modelTop_ = Model("Top", list_function_name[2][1], J_mass, [v for n, v in list_Top_pars], channel, "_")
+    TopMass_ = modelTop_.pdf
 
 
     TopMass_.plotOn(plot_MC_fit_Top_frame, RooFit.Normalization(setTop.sumEntries() ,RooAbsReal.NumEvent))
@@ -815,32 +791,9 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     # ------ 2. use the shape and number from MC to generate toy MC ----------
 
 
-    constVjet_ .setConstant(True)
-    offsetVjet_.setConstant(True)
-    widthVjet_ .setConstant(True)
-    a0Vjet_    .setConstant(True)
-    a1Vjet_    .setConstant(True)
-    a2Vjet_    .setConstant(True)
-    
-    constVV_   .setConstant(True)
-    offsetVV_  .setConstant(True)
-    widthVV_   .setConstant(True)
-    meanVV_    .setConstant(True)
-    sigmaVV_   .setConstant(True)
-    fracVV_    .setConstant(True)
-    meanVH_    .setConstant(True)
-    sigmaVH_   .setConstant(True)
-    fracVH_    .setConstant(True)
-    
-    constTop_  .setConstant(True)
-    offsetTop_ .setConstant(True)
-    widthTop_  .setConstant(True)
-    meanW_     .setConstant(True)
-    sigmaW_    .setConstant(True)
-    fracW_     .setConstant(True)
-    meanT_     .setConstant(True)
-    sigmaT_    .setConstant(True)
-    fracT_     .setConstant(True)
+    modelVjet_.setConstant(True)
+    modelVV_.setConstant(True)
+    modelTop_.setConstant(True)
 
     nTotal_MC = setVjet.sumEntries() + setVV.sumEntries()+  setTop.sumEntries() 
 
@@ -867,6 +820,10 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     # use this PDF of three backgrounds to generate toy MC 
     Bkg_Mass_MC = RooAddPdf("Bkg_Mass_MC","Vjet + VV + Top", RooArgList( VjetMass_ , VVMass_ , TopMass_ ), RooArgList(frac_Vjet_MC ,frac_VV_MC ))
 
+    # its cumulative is tabulated once, the events of the toys are drawn from it (or the contents of the J_mass bins, with -B)
+    toyGenerator = InverseCDF(Bkg_Mass_MC, J_mass)
+    if BINNED: toyGenerator = BinnedToys(toyGenerator, J_mass)
+
     
     Save_name1 = Save_Dir + "/" + "plot_toy_MC.pdf"
     c2 = TCanvas("c2","",800,600)
@@ -881,62 +838,61 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     list_frame2 = []
     list_frame3 = []
 
-    h_Bias = TH1D("h_Bias","h_Bias ",40,-1,1)
-    h_Pull = TH1D("h_Pull","h_Pull ",40,-8,8)
-
-    h_Bias_converged = TH1D("h_Bias_converged","h_Bias ",40,-1,1)
-    h_Pull_converged = TH1D("h_Pull_converged","h_Pull ",40,-8,8)
-
     # starts loop
 
-    times_max = 1000
-
-    counter_all = 0
-    counter_converged =0
-    counter_bias_deno_zero = 0
+    times_max = TOYS
 
     nTotal_MC = nTotal_MC*10
-#    nTotal_MC = nTotal_MC*100
+#    nTotal_MC = nTotal_MC*100 # affordable with the binned toys (-B)
     print "the # used to generate pesudo-data: ", nTotal_MC
 
+    # the PDFs fitted to the toys are built only once, and reset before every toy
+    fitModel = Bias_and_Pull_Model(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_pars, list_Top_pars)
+
+    # one toy: generate, fit, bias and pull. The toys run in parallel, each with the seed given by the study and its index
+    # (tools/toys.py), so the toys of the plots are replayed afterwards with the same pseudo data
+    study = toyStudy(channel, list_function_name)
+
+    def toy(index, plot=False):
+        plot_toy_MC_frame, fit_toy_MC_frame, fit_toy_MC_component_frame,  Bias, Pull, fit_status = Bias_and_Pull_Box(J_mass, fitModel, nTotal_MC, Bkg_Mass_MC, toyGenerator, list_frac_Vjet_VV_Top, plot)
+        record = {"bias" : Bias, "pull" : Pull, "status" : fit_status, "parameters" : dict([(n, v.getVal()) for n, v in fitModel["Vjet"].vars.iteritems()] + [("nVjet_fit", fitModel["nVjet_fit"].getVal())])}
+        if plot: record["frames"] = [plot_toy_MC_frame, fit_toy_MC_frame, fit_toy_MC_component_frame]
+        return record
+
+    if REPLAY >= 0:
+        record = replayToy(lambda i: toy(i, True), study, REPLAY)
+        print "toy", REPLAY, "of study", study, "( seed", record["seed"], "): Bias", record["bias"], " Pull", record["pull"], " fit status", record["status"]
+        print "parameters:", record["parameters"]
+        c2.cd()
+        record["frames"][0].Draw()
+        c2.Print(Save_Dir + "/" + "plot_toy_MC_%d.pdf" % REPLAY)
+        c3.cd()
+        record["frames"][1].Draw()
+        c3.Print(Save_Dir + "/" + "plot_fit_toy_MC_%d.pdf" % REPLAY)
+        c4.cd()
+        record["frames"][2].Draw()
+        c4.Print(Save_Dir + "/" + "plot_fit_toy_MC_with_component_%d.pdf" % REPLAY)
+        return
+
     print ""
     print "starting loop"
-    for times in range(0,times_max):  
-
-	print "times:", times
-
-	if times % 50 == 0 :
-		print "Processing times:", times+1 ,"of", times_max
-
-        plot_toy_MC_frame, fit_toy_MC_frame, fit_toy_MC_component_frame,  Bias, Pull, fit_status = Bias_and_Pull_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_pars, list_Top_pars, list_of_set ,Save_Dir, nTotal_MC, Bkg_Mass_MC, list_frac_Vjet_VV_Top )
-
-        # to avoid to save too many plot in list
-	if times < 20 : 
-		list_frame1.append( plot_toy_MC_frame  )
-                list_frame2.append( fit_toy_MC_frame  )
-                list_frame3.append( fit_toy_MC_component_frame  )
-
-	counter_all = counter_all+1
-
-	if fit_status ==0: counter_converged = counter_converged+1
-
-        if fit_status ==0 and Bias != 999 : 
-		h_Bias_converged.Fill( Bias ) 
-		h_Pull_converged.Fill( Pull )
-
-	if Bias != 999:
-        	h_Bias.Fill( Bias )
-        	h_Pull.Fill( Pull )
-
-	if Bias == 999: counter_bias_deno_zero = counter_bias_deno_zero+1
-
-
-    # end loop
-
-    converged_rate = float(counter_converged)/counter_all
-
-    print "counter_all: ", counter_all, " counter_converged: ", counter_converged, " converged rate: ", converged_rate 
-    print "counter_bias_deno_zero: ", counter_bias_deno_zero
+    # every toy is appended to the results file when done; with -R the toys already there are not run again
+    results = toyResults(study, Save_Dir)
+    known = set([r["index"] for r in readResults([results])]) if RESUME and os.path.exists(results) else set()
+    # the study stops before times_max toys once the errors on the pull mean and width are below -E, or when the rate of
+    # failed fits is above -F
+    monitor = ToyMonitor(TARGET, MAXFAIL)
+    records = runToys(toy, study, range(FIRST,FIRST+times_max), NCPU, results, RESUME, monitor.update, OVERWRITE)
+    monitor.printSummary(study)
+
+    # to avoid to save too many plot in list, only the first 20 toys are plotted, replayed from their seeds;
+    # a resumed study where no toy ran keeps the plots of the previous run
+    replayed = [r["index"] for r in records if r["index"] < FIRST + 20] if any([not r["index"] in known for r in records]) else []
+    for times in replayed:
+        frames = replayToy(lambda i: toy(i, True), study, times)["frames"]
+        list_frame1.append( frames[0] )
+        list_frame2.append( frames[1] )
+        list_frame3.append( frames[2] )
 
     # plot loop
     for i in range(0, len(list_frame1)  ):
@@ -987,6 +943,72 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
 
     # end plot loop
 
+    Bias_and_Pull_Histograms(records, Save_Dir)
+
+    # ------
+    print ""
+    print " End Yu_Hsiang_Box"
+    print ""
+
+
+    # end Yu_Hsiang_Box
+    # -------------------------------------------
+
+
+# Name of a bias study, and its results file for the toys from -i on
+def toyStudy(channel, list_function_name):
+    return channel + "_" + "_".join([f for n, f in list_function_name]) + ("_binned" if BINNED else "")
+
+def toyResults(study, Save_Dir):
+    return Save_Dir + "/" + "toys_" + study + "_%d.txt" % FIRST
+
+
+# Results files of all the jobs of a study read back, without running any toy
+def Bias_and_Pull_Summary(study, Save_Dir):
+    monitor = ToyMonitor()
+    records = readResults(glob.glob(Save_Dir + "/" + "toys_" + study + "_[0-9]*.txt"))
+    for record in records: monitor.update(record)
+    monitor.printSummary(study)
+    Bias_and_Pull_Histograms(records, Save_Dir)
+
+
+def Bias_and_Pull_Histograms(records, Save_Dir):
+
+    h_Bias = TH1D("h_Bias","h_Bias ",40,-1,1)
+    h_Pull = TH1D("h_Pull","h_Pull ",40,-8,8)
+
+    h_Bias_converged = TH1D("h_Bias_converged","h_Bias ",40,-1,1)
+    h_Pull_converged = TH1D("h_Pull_converged","h_Pull ",40,-8,8)
+
+    counter_all = 0
+    counter_converged =0
+    counter_bias_deno_zero = 0
+
+    for record in records:
+
+        Bias, Pull, fit_status = record["bias"], record["pull"], record["status"]
+
+        counter_all = counter_all+1
+
+        if fit_status ==0: counter_converged = counter_converged+1
+
+        if fit_status ==0 and Bias != 999 : 
+            h_Bias_converged.Fill( Bias ) 
+            h_Pull_converged.Fill( Pull )
+
+        if Bias != 999:
+            h_Bias.Fill( Bias )
+            h_Pull.Fill( Pull )
+
+        if Bias == 999: counter_bias_deno_zero = counter_bias_deno_zero+1
+
+    # end loop
+
+    converged_rate = float(counter_converged)/max(counter_all, 1)
+
+    print "counter_all: ", counter_all, " counter_converged: ", counter_converged, " converged rate: ", converged_rate 
+    print "counter_bias_deno_zero: ", counter_bias_deno_zero
+
     Save_name = Save_Dir + "/" + "Bias_and_Pull.pdf"
     c_1 = TCanvas("c_1","",800,400)
     c_1.Divide(2)
@@ -1010,190 +1032,142 @@ def Yu_Hsiang_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_p
     h_Pull_converged.Draw()
     c_2.SaveAs(Save_name)
 
-        
 
-    # ------
-    print ""
-    print " End Yu_Hsiang_Box"
-    print ""
 
 
-    # end Yu_Hsiang_Box
-    # -------------------------------------------
 
+def Bias_and_Pull_Model(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_pars, list_Top_pars):
 
+    fitModel = {}
 
+    # build another three PDF for 3 backgrounds, with the shape of the two secondary backgrounds fixed
 
+    fitModel["Vjet"] = Model("Vjet", list_function_name[0][1], J_mass, [v for n, v in list_Vjet_pars], channel, "_fit")
+    fitModel["VV"]   = Model("VV"  , list_function_name[1][1], J_mass, [v for n, v in list_VV_pars]  , channel, "_fit")
+    fitModel["Top"]  = Model("Top" , list_function_name[2][1], J_mass, [v for n, v in list_Top_pars] , channel, "_fit")
 
-def Bias_and_Pull_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_VV_pars, list_Top_pars, list_of_set ,Save_Dir, nTotal_MC, Bkg_Mass_MC , list_frac_Vjet_VV_Top ):
+    fitModel["VV"].setConstant(True)
+    fitModel["Top"].setConstant(True)
 
-#    print ""
-#    print "start Bias_and_Pull_Box"
-#    print ""
+    VjetMass_fit = fitModel["Vjet"].pdf
+    VVMass_fit   = fitModel["VV"].pdf
+    TopMass_fit  = fitModel["Top"].pdf
 
-    plot_toy_MC_frame = J_mass.frame(RooFit.Title("plot toy MC"))
-
-    setVjet = list_of_set[1][0][1] 
-    setVV = list_of_set[2][0][1]
-    setTop = list_of_set[3][0][1]
-
-    # generate toy MC
-
-    nPseudo_data_fluc = gRandom.Poisson( nTotal_MC )
-
-    pseudo_data_fluc = Bkg_Mass_MC.generate(RooArgSet(J_mass), nPseudo_data_fluc  ) 
-
-    pseudo_data_SB_fluc = RooDataSet("pseudo_data_SB_fluc", "pseudo_data_SB_fluc", RooArgSet(J_mass), RooFit.Import(pseudo_data_fluc), RooFit.Cut("fatjet1_prunedMassCorr<65 || fatjet1_prunedMassCorr>135") )
+    # extended PDF, the normalizations are set for every toy --------------------
 
-    pseudo_data_SR_fluc = RooDataSet("pseudo_data_SR_fluc", "pseudo_data_SR_fluc", RooArgSet(J_mass), RooFit.Import(pseudo_data_fluc), RooFit.Cut("fatjet1_prunedMassCorr>105 && fatjet1_prunedMassCorr<135") )
+    nVjet_fit = RooRealVar("nVjet_fit","", 1., 0., 2. )
+    nVV_fit   = RooRealVar("nVV_fit"  ,"", 1., 0., 2. )
+    nTop_fit  = RooRealVar("nTop_fit" ,"", 1., 0., 2. )
 
-    pseudo_data_VR_fluc = RooDataSet("pseudo_data_VR_fluc", "pseudo_data_VR_fluc", RooArgSet(J_mass), RooFit.Import(pseudo_data_fluc), RooFit.Cut("fatjet1_prunedMassCorr>65 && fatjet1_prunedMassCorr<105") )
-
-
-    color1 = 8
-    Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
-    color1 = 6
-    Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.Components("VVMass_,TopMass_"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
-    color1 = 7
-    Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.Components("TopMass_"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
-    pseudo_data_SB_fluc.plotOn(plot_toy_MC_frame)
+    nVV_fit.setConstant(True)
+    nTop_fit.setConstant(True)
 
-    Bkg_Mass_MC.plotOn( plot_toy_MC_frame , RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
+    VjetMass_ext_fit = RooExtendPdf("VjetMass_ext_fit",  "", VjetMass_fit,  nVjet_fit)
+    VVMass_ext_fit = RooExtendPdf("VVMass_ext_fit",  "", VVMass_fit,  nVV_fit)
+    TopMass_ext_fit = RooExtendPdf("TopMass_ext_fit",  "", TopMass_fit,  nTop_fit)
 
+    BkgMass_fit = RooAddPdf("BkgMass_fit", "", RooArgList(VjetMass_ext_fit , VVMass_ext_fit, TopMass_ext_fit), RooArgList(nVjet_fit, nVV_fit, nTop_fit)) 
 
-    # ------ 3. fit the toy MC with ext PDF of background, fixed two secondary backgrounds' shape and normalization ----------
+    BkgMass_fit.fixAddCoefRange("h_reasonable_range")
 
-    fit_toy_MC_frame = J_mass.frame(RooFit.Title("fit toy MC"))
-    fit_toy_MC_component_frame = J_mass.frame(RooFit.Title("fit toy MC with component"))
+    # integrals in SB and SR, and the Signal region yield
 
-    # build another three PDF for 3 backgrounds
+    jetMassArg = RooArgSet(J_mass)
+    iSBVjet_fit = VjetMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
+    iSBVV_fit = VVMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
+    iSBTop_fit = TopMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
 
-    # Vjet --------------------
+    iSRVjet_fit = VjetMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
+    iSRVV_fit = VVMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
+    iSRTop_fit = TopMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
 
-    constVjet_fit   = RooRealVar("constVjet_fit" , "slope of the exp" ,  list_Vjet_pars[0][1],  -1.,   0.)
-    offsetVjet_fit  = RooRealVar("offsetVjet_fit", "offset of the erf",  list_Vjet_pars[1][1], -50., 400.)
-    widthVjet_fit   = RooRealVar("widthVjet_fit" , "width of the erf" ,  list_Vjet_pars[2][1],   1., 200.) #0, 400
-    a0Vjet_fit      = RooRealVar("a0Vjet_fit"    , "width of the erf" ,  list_Vjet_pars[3][1],  -5 ,   0 )
-    a1Vjet_fit      = RooRealVar("a1Vjet_fit"    , "width of the erf" ,  list_Vjet_pars[4][1],   0 ,   5 )
-    a2Vjet_fit      = RooRealVar("a2Vjet_fit"    , "width of the erf" ,  list_Vjet_pars[5][1],  -1 ,   1 )
+    SRyield_fit = RooFormulaVar("SRyield_fit", "extrapolation to SR", "@0*@1 + @2*@3 + @4*@5", RooArgList(iSRVjet_fit, nVjet_fit, iSRVV_fit, nVV_fit, iSRTop_fit, nTop_fit))
 
-    if channel=="XZhnnb":
-        offsetVjet_fit  = RooRealVar("offsetVjet_fit",  "offset of the erf",    list_Vjet_pars[1][1],   200., 1000.)
-    if channel=="XZhnnbb":
-        offsetVjet_fit  = RooRealVar("offsetVjet_fit",  "offset of the erf",    list_Vjet_pars[1][1],   200., 500.)
+    fitModel.update({
+        "nVjet_fit" : nVjet_fit, "nVV_fit" : nVV_fit, "nTop_fit" : nTop_fit,
+        "VjetMass_ext_fit" : VjetMass_ext_fit, "VVMass_ext_fit" : VVMass_ext_fit, "TopMass_ext_fit" : TopMass_ext_fit, "BkgMass_fit" : BkgMass_fit,
+        "iSBVjet_fit" : iSBVjet_fit, "iSBVV_fit" : iSBVV_fit, "iSBTop_fit" : iSBTop_fit,
+        "iSRVjet_fit" : iSRVjet_fit, "iSRVV_fit" : iSRVV_fit, "iSRTop_fit" : iSRTop_fit, "SRyield_fit" : SRyield_fit,
+    })
 
-    fitFuncVjet = list_function_name[0][1]
-    if fitFuncVjet == "ERFEXP": VjetMass_fit = RooErfExpPdf("VjetMass_fit"  , fitFuncVjet, J_mass,  constVjet_fit, offsetVjet_fit, widthVjet_fit)
-    elif fitFuncVjet == "EXP" : VjetMass_fit = RooExponential("VjetMass_fit", fitFuncVjet, J_mass,  constVjet_fit)
-    elif fitFuncVjet == "GAUS": VjetMass_fit = RooGaussian("VjetMass_fit"   , fitFuncVjet, J_mass,  offsetVjet_fit, widthVjet_fit)
-    elif fitFuncVjet == "POL" : VjetMass_fit = RooChebychev("VjetMass_fit"  , fitFuncVjet, J_mass,  RooArgList(a0Vjet_fit, a1Vjet_fit, a2Vjet_fit))
-    elif fitFuncVjet == "POW" : VjetMass_fit = RooGenericPdf("VjetMass_fit" , fitFuncVjet, "@0^@1", RooArgList(J_mass, a0Vjet_fit))
+    return fitModel
 
 
-    # VV --------------------
 
+def Bias_and_Pull_Box(J_mass, fitModel, nTotal_MC, Bkg_Mass_MC , toyGenerator, list_frac_Vjet_VV_Top, plot=True ):
 
-    constVV_fit  = RooRealVar("constVV_fit",  "slope of the exp",                list_VV_pars[0][1] ,   -0.1,   0.)
-    offsetVV_fit = RooRealVar("offsetVV_fit", "offset of the erf",               list_VV_pars[1][1] ,     1., 300.)
-    widthVV_fit  = RooRealVar("widthVV_fit",  "width of the erf",                list_VV_pars[2][1] ,     1., 100.)
-    erfrVV_fit   = RooErfExpPdf("baseVV_fit", "error function for VV jet mass", J_mass, constVV_fit, offsetVV_fit, widthVV_fit)
-    expoVV_fit   = RooExponential("baseVV_fit", "error function for VV jet mass", J_mass, constVV_fit)
+#    print ""
+#    print "start Bias_and_Pull_Box"
+#    print ""
 
-    meanVV_fit   = RooRealVar("meanVV_fit",   "mean of the gaussian",            list_VV_pars[3][1] ,    60., 100.)
-    sigmaVV_fit  = RooRealVar("sigmaVV_fit",  "sigma of the gaussian",           list_VV_pars[4][1] ,     6.,  30.)
-    fracVV_fit   = RooRealVar("fracVV_fit",   "fraction of gaussian wrt erfexp", list_VV_pars[5][1] ,     0.,   1.)
-    gausVV_fit   = RooGaussian("gausVV_fit",  "gaus for VV jet mass", J_mass, meanVV_fit, sigmaVV_fit)
+    plot_toy_MC_frame = J_mass.frame(RooFit.Title("plot toy MC"))
 
-    meanVH_fit   = RooRealVar("meanVH_fit",   "mean of the gaussian",            list_VV_pars[6][1] ,   100., 150.)
-    sigmaVH_fit  = RooRealVar("sigmaVH_fit",  "sigma of the gaussian",           list_VV_pars[7][1] ,     5.,  50.)
-    fracVH_fit   = RooRealVar("fracVH_fit",   "fraction of gaussian wrt erfexp", list_VV_pars[8][1] ,     0.,   1.)
-    gausVH_fit   = RooGaussian("gausVH_fit",  "gaus for VH jet mass", J_mass, meanVH_fit, sigmaVH_fit)
+    # generate toy MC
 
-    fitFuncVV = list_function_name[1][1]
-    if fitFuncVV   == "ERFEXPGAUS" : VVMass_fit = RooAddPdf("VVMass_fit",fitFuncVV , RooArgList(gausVV_fit, erfrVV_fit), RooArgList(fracVV_fit))
-    elif fitFuncVV == "ERFEXPGAUS2": VVMass_fit = RooAddPdf("VVMass_fit",fitFuncVV , RooArgList(gausVH_fit, gausVV_fit, erfrVV_fit), RooArgList(fracVH_fit, fracVV_fit))
-    elif fitFuncVV == "EXPGAUS"    : VVMass_fit = RooAddPdf("VVMass_fit",fitFuncVV , RooArgList(gausVV_fit, expoVV_fit), RooArgList(fracVV_fit))
-    elif fitFuncVV == "EXPGAUS2"   : VVMass_fit = RooAddPdf("VVMass_fit",fitFuncVV , RooArgList(gausVH_fit, gausVV_fit, expoVV_fit), RooArgList(fracVH_fit, fracVV_fit))
+    if BINNED:
+        # Poisson fluctuation of the expected content of each J_mass bin, the sideband bins are fitted
+        pseudo_data_fluc = toyGenerator.generate( nTotal_MC )
+        nPseudo_data_fluc = pseudo_data_fluc.sum()
 
+        centers = toyGenerator.centers
+        pseudo_data_SB_fluc = toyGenerator.dataHist("pseudo_data_SB_fluc", pseudo_data_fluc, (centers<65) | (centers>135))
 
-    # Top --------------------
+        nGen_SR_fluc = float(pseudo_data_fluc[(centers>105) & (centers<135)].sum())
 
-    constTop_fit  = RooRealVar("constTop_fit",  "slope of the exp",                list_Top_pars[0][1] ,   -1.,   0.)
-    offsetTop_fit = RooRealVar("offsetTop_fit", "offset of the erf",               list_Top_pars[1][1] ,   50., 250.)
-    widthTop_fit  = RooRealVar("widthTop_fit",  "width of the erf",                list_Top_pars[2][1] ,    1., 300.)
-    gausTop_fit   = RooGaussian("baseTop_fit",  "gaus for Top jet mass", J_mass, offsetTop_fit, widthTop_fit)
-    erfrTop_fit   = RooErfExpPdf("baseTop_fit", "error function for Top jet mass", J_mass, constTop_fit, offsetTop_fit, widthTop_fit)
+    else:
+        nPseudo_data_fluc = gRandom.Poisson( nTotal_MC )
 
-    meanW_fit     = RooRealVar("meanW_fit",     "mean of the gaussian",            list_Top_pars[3][1] , 70., 90.)
-    sigmaW_fit    = RooRealVar("sigmaW_fit",    "sigma of the gaussian",           list_Top_pars[4][1] ,  2., 20.)
-    fracW_fit     = RooRealVar("fracW_fit",     "fraction of gaussian wrt erfexp", list_Top_pars[5][1] , 0.,  1.)
-    gausW_fit     = RooGaussian("gausW_fit",    "gaus for W jet mass", J_mass, meanW_fit, sigmaW_fit)
+        pseudo_data_fluc = toyGenerator.generate( nPseudo_data_fluc )
 
-    meanT_fit     = RooRealVar("meanT_fit",     "mean of the gaussian",            list_Top_pars[6][1] , 150., 200.)
-    sigmaT_fit    = RooRealVar("sigmaT_fit",    "sigma of the gaussian",           list_Top_pars[7][1] ,   5.,  30.)
-    fracT_fit     = RooRealVar("fracT_fit",     "fraction of gaussian wrt erfexp", list_Top_pars[8][1] ,  0.,   1.)
-    gausT_fit     = RooGaussian("gausT_fit",    "gaus for T jet mass", J_mass, meanT_fit, sigmaT_fit)
+        # sideband and signal region by masks on the generated jet mass; only the sideband is needed as a dataset, for the fit
+        pseudo_data_SB_fluc = arrayDataSet("pseudo_data_SB_fluc", J_mass, pseudo_data_fluc[(pseudo_data_fluc<65) | (pseudo_data_fluc>135)])
 
-    if channel=="XZheeb" or channel=="XZheebb" or channel=="XZhmmb" or channel=="XZhmmbb":
-        offsetTop_fit = RooRealVar("offsetTop_fit", "offset of the erf", list_Top_pars[1][1],   -50., 450.)
-        widthTop_fit  = RooRealVar("widthTop_fit",  "width of the erf" , list_Top_pars[2][1],    1., 1000.)
+        nGen_SR_fluc = float(np.count_nonzero((pseudo_data_fluc>105) & (pseudo_data_fluc<135)))
 
-    fitFuncTop = list_function_name[2][1]
-    if fitFuncTop == "ERFEXPGAUS2" : TopMass_fit = RooAddPdf("TopMass_fit"  , fitFuncTop, RooArgList(gausW_fit, gausT_fit, erfrTop_fit), RooArgList(fracW_fit, fracT_fit))
-    elif fitFuncTop == "ERFEXPGAUS": TopMass_fit = RooAddPdf("TopMass_fit"  , fitFuncTop, RooArgList(gausT_fit, erfrTop_fit)        , RooArgList(fracT_fit))
-    elif fitFuncTop == "GAUS3"     : TopMass_fit = RooAddPdf("TopMass_fit"  , fitFuncTop, RooArgList(gausW_fit, gausT_fit, gausTop_fit), RooArgList(fracW_fit, fracT_fit))
-    elif fitFuncTop == "GAUS2"     : TopMass_fit = RooAddPdf("TopMass_fit"  , fitFuncTop, RooArgList(gausT_fit, gausTop_fit)        , RooArgList(fracT_fit))
-    elif fitFuncTop == "GAUS"      : TopMass_fit = RooGaussian("TopMass_fit", fitFuncTop, J_mass, offsetTop_fit, widthTop_fit)
 
+    if plot:
+        color1 = 8
+        Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        color1 = 6
+        Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.Components("VVMass_,TopMass_"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        color1 = 7
+        Bkg_Mass_MC.plotOn(plot_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc ,RooAbsReal.NumEvent),RooFit.Components("TopMass_"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        pseudo_data_SB_fluc.plotOn(plot_toy_MC_frame)
 
-    # extended PDF --------------------
+        Bkg_Mass_MC.plotOn( plot_toy_MC_frame , RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
 
-    N_Vjet = nPseudo_data_fluc * list_frac_Vjet_VV_Top[0] 
-    N_VV   = nPseudo_data_fluc * list_frac_Vjet_VV_Top[1]
-    N_Top  = nPseudo_data_fluc * list_frac_Vjet_VV_Top[2]
 
-    nVjet_fit = RooRealVar("nVjet_fit","", N_Vjet, 0., 2*N_Vjet )
-    nVV_fit   = RooRealVar("nVV_fit"  ,"", N_VV  , 0., 2*N_VV )
-    nTop_fit  = RooRealVar("nTop_fit" ,"", N_Top , 0., 2*N_Top )
+    # ------ 3. fit the toy MC with ext PDF of background, fixed two secondary backgrounds' shape and normalization ----------
 
-    nVV_fit.setConstant(True)
-    nTop_fit.setConstant(True)
+    fit_toy_MC_frame = J_mass.frame(RooFit.Title("fit toy MC"))
+    fit_toy_MC_component_frame = J_mass.frame(RooFit.Title("fit toy MC with component"))
 
-    constVV_fit .setConstant(True)
-    offsetVV_fit.setConstant(True)
-    widthVV_fit .setConstant(True)
-    meanVV_fit  .setConstant(True)
-    sigmaVV_fit .setConstant(True)
-    fracVV_fit  .setConstant(True)
-    meanVH_fit  .setConstant(True)
-    sigmaVH_fit .setConstant(True)
-    fracVH_fit  .setConstant(True)
-    
-    constTop_fit .setConstant(True)
-    offsetTop_fit.setConstant(True)
-    widthTop_fit .setConstant(True)
-    meanW_fit    .setConstant(True)
-    sigmaW_fit   .setConstant(True)
-    fracW_fit    .setConstant(True)
-    meanT_fit    .setConstant(True)
-    sigmaT_fit   .setConstant(True)
-    fracT_fit    .setConstant(True)
+    # reset the PDFs to the initial values, and the normalizations to the number of pseudo data
 
+    fitModel["Vjet"].reset()
+    fitModel["VV"].reset()
+    fitModel["Top"].reset()
 
-    VjetMass_ext_fit = RooExtendPdf("VjetMass_ext_fit",  "", VjetMass_fit,  nVjet_fit)
-    VVMass_ext_fit = RooExtendPdf("VVMass_ext_fit",  "", VVMass_fit,  nVV_fit)
-    TopMass_ext_fit = RooExtendPdf("TopMass_ext_fit",  "", TopMass_fit,  nTop_fit)
+    VjetMass_fit = fitModel["Vjet"].pdf
+    VVMass_fit   = fitModel["VV"].pdf
+    TopMass_fit  = fitModel["Top"].pdf
+    BkgMass_fit  = fitModel["BkgMass_fit"]
 
-    BkgMass_fit = RooAddPdf("BkgMass_fit", "", RooArgList(VjetMass_ext_fit , VVMass_ext_fit, TopMass_ext_fit), RooArgList(nVjet_fit, nVV_fit, nTop_fit)) 
+    nVjet_fit = fitModel["nVjet_fit"]
+    nVV_fit   = fitModel["nVV_fit"]
+    nTop_fit  = fitModel["nTop_fit"]
 
-    BkgMass_fit.fixAddCoefRange("h_reasonable_range")
+    for n, frac in zip([nVjet_fit, nVV_fit, nTop_fit], list_frac_Vjet_VV_Top):
+        n.setRange(0., 2*nPseudo_data_fluc*frac)
+        n.setVal(nPseudo_data_fluc*frac)
 
     # fit pseudo data in SB only
 
 
     VERBOSE = False
 #    VERBOSE = True
-    frMass_fit = BkgMass_fit.fitTo(pseudo_data_SB_fluc, RooFit.SumW2Error(True), RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"), RooFit.Strategy(2), RooFit.Minimizer("Minuit"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
+    # the bin contents of the binned toys are counts, not weights: plain binned likelihood
+    frMass_fit = BkgMass_fit.fitTo(pseudo_data_SB_fluc, RooFit.SumW2Error(not BINNED), RooFit.Extended(True), RooFit.Range("LSBrange,HSBrange"), RooFit.Strategy(2), RooFit.Minimizer("Minuit"), RooFit.Save(1), RooFit.PrintLevel(1 if VERBOSE else -1))
 
     if VERBOSE: print "********** Fit result [JET MASS DATA] **"+"*"*40, "\n", frMass_fit.Print(), "\n", "*"*80
 
@@ -1203,63 +1177,59 @@ def Bias_and_Pull_Box(J_mass, channel, list_function_name, list_Vjet_pars, list_
 
 #    print ""
 
-    jetMassArg = RooArgSet(J_mass)
-    iSBVjet_fit = VjetMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
-    iSBVV_fit = VVMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
-    iSBTop_fit = TopMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("LSBrange,HSBrange"))
+    iSBVjet_fit = fitModel["iSBVjet_fit"]
+    iSBVV_fit = fitModel["iSBVV_fit"]
+    iSBTop_fit = fitModel["iSBTop_fit"]
 
     n_fit_MC_SB = nVjet_fit.getVal()*iSBVjet_fit.getVal() + nVV_fit.getVal()*iSBVV_fit.getVal() + nTop_fit.getVal()*iSBTop_fit.getVal()
 
     # plot
 
-    pseudo_data_SB_fluc.plotOn( fit_toy_MC_frame )
+    if plot:
+        pseudo_data_SB_fluc.plotOn( fit_toy_MC_frame )
 
-    BkgMass_fit.plotOn( fit_toy_MC_frame, RooFit.Normalization(n_fit_MC_SB  ,RooAbsReal.NumEvent),RooFit.VisualizeError(frMass_fit ,1),RooFit.FillColor(5) )
-    BkgMass_fit.plotOn( fit_toy_MC_frame, RooFit.Normalization(n_fit_MC_SB  ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range") ,RooFit.LineColor(2) )
-    Bkg_Mass_MC.plotOn( fit_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
-    pseudo_data_SB_fluc.plotOn( fit_toy_MC_frame )
+        BkgMass_fit.plotOn( fit_toy_MC_frame, RooFit.Normalization(n_fit_MC_SB  ,RooAbsReal.NumEvent),RooFit.VisualizeError(frMass_fit ,1),RooFit.FillColor(5) )
+        BkgMass_fit.plotOn( fit_toy_MC_frame, RooFit.Normalization(n_fit_MC_SB  ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range") ,RooFit.LineColor(2) )
+        Bkg_Mass_MC.plotOn( fit_toy_MC_frame, RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
+        pseudo_data_SB_fluc.plotOn( fit_toy_MC_frame )
 
 
-    # plot with component
+        # plot with component
 
-    pseudo_data_SB_fluc.plotOn( fit_toy_MC_component_frame )
+        pseudo_data_SB_fluc.plotOn( fit_toy_MC_component_frame )
 
-    color1 = 8    
-    BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        color1 = 8    
+        BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
 
-    color1 = 6
-    BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.Components("VVMass_ext_fit,TopMass_ext_fit"), RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        color1 = 6
+        BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.Components("VVMass_ext_fit,TopMass_ext_fit"), RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
 
-    color1 = 7
-    BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.Components("TopMass_ext_fit"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
+        color1 = 7
+        BkgMass_fit.plotOn( fit_toy_MC_component_frame, RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range"), RooFit.Components("TopMass_ext_fit"),RooFit.LineColor(color1),RooFit.DrawOption("F"), RooFit.FillColor(color1), RooFit.FillStyle(1001))
 
-    pseudo_data_SB_fluc.plotOn( fit_toy_MC_component_frame )
-    Bkg_Mass_MC.plotOn( fit_toy_MC_component_frame , RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
+        pseudo_data_SB_fluc.plotOn( fit_toy_MC_component_frame )
+        Bkg_Mass_MC.plotOn( fit_toy_MC_component_frame , RooFit.Normalization(nPseudo_data_fluc  ,RooAbsReal.NumEvent),RooFit.LineColor(4) )
 
-    BkgMass_fit.plotOn( fit_toy_MC_component_frame , RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range") ,RooFit.LineColor(2) )
+        BkgMass_fit.plotOn( fit_toy_MC_component_frame , RooFit.Normalization( n_fit_MC_SB ,RooAbsReal.NumEvent),RooFit.Range("h_reasonable_range") ,RooFit.LineColor(2) )
 
 
     # ------ 4. calculate the Signal region yield, bias and pull ----------
 
-    iSRVjet_fit = VjetMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iSRVV_fit = VVMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iSRTop_fit = TopMass_fit.createIntegral(jetMassArg, RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-
-    SRyield_fit = RooFormulaVar("SRyield_fit", "extrapolation to SR", "@0*@1 + @2*@3 + @4*@5", RooArgList(iSRVjet_fit, nVjet_fit, iSRVV_fit, nVV_fit, iSRTop_fit, nTop_fit))
+    SRyield_fit = fitModel["SRyield_fit"]
 
 
-    SRyield_fit_error = SRyield_fit.getPropagatedError( frMass_fit )
+    SRyield_fit_error = propagatedError( SRyield_fit, frMass_fit )
 
-#    print "pseudo_data_SR_fluc.sumEntries(): ", pseudo_data_SR_fluc.sumEntries()
+#    print "nGen_SR_fluc: ", nGen_SR_fluc
 
-    if pseudo_data_SR_fluc.sumEntries() != 0: Bias = ( SRyield_fit.getVal() - pseudo_data_SR_fluc.sumEntries() )/ pseudo_data_SR_fluc.sumEntries()
-    if pseudo_data_SR_fluc.sumEntries() == 0: Bias = 999
+    if nGen_SR_fluc != 0: Bias = ( SRyield_fit.getVal() - nGen_SR_fluc )/ nGen_SR_fluc
+    if nGen_SR_fluc == 0: Bias = 999
 
 
-    Pull = ( SRyield_fit.getVal() - pseudo_data_SR_fluc.sumEntries() )/ SRyield_fit_error  
+    Pull = ( SRyield_fit.getVal() - nGen_SR_fluc )/ SRyield_fit_error  
 
 #    print "SRyield_fit.getVal(): ", SRyield_fit.getVal() 
-#    print "pseudo_data_SR_fluc.sumEntries(): ", pseudo_data_SR_fluc.sumEntries()
+#    print "nGen_SR_fluc: ", nGen_SR_fluc
 #    print "SRyield_fit_error: ", SRyield_fit_error
 #    print "Bias: ", Bias
 #    print "Pull: ", Pull
@@ -5,7 +5,7 @@ eval `scramv1 runtime -sh`
 
 cd yu_hsiang_modify11_new_method_other_channel
 
-python alpha_Yu_new_bias_study.py -b -c XZhnnb
+python alpha_Yu_new_bias_study.py -b -c XZhnnb "$@"
 
 
 
@@ -0,0 +1,71 @@
+#! /usr/bin/env python
+
+import os, sys, math, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.propagation import propagatedError
+
+
+#####################
+# ERROR PROPAGATION #
+#####################
+
+# Minimal stand-ins for the RooRealVar, RooArgSet/RooArgList and RooFitResult methods that propagatedError uses
+class Par:
+    def __init__(self, name, value, error=0.):
+        self.name, self.value, self.error = name, value, error
+    def GetName(self): return self.name
+    def getVal(self): return self.value
+    def setVal(self, v): self.value = v
+    def getError(self): return self.error
+
+class Pars:
+    def __init__(self, pars): self.pars = pars
+    def getSize(self): return len(self.pars)
+    def at(self, i): return self.pars[i]
+    def find(self, name): return ([p for p in self.pars if p.GetName() == name] + [None])[0]
+
+class Matrix:
+    def __init__(self, m): self.m = m
+    def __call__(self, i, j): return self.m[i][j]
+
+class FitResult:
+    def __init__(self, pars, corr): self.pars, self.corr = pars, corr
+    def floatParsFinal(self): return Pars(self.pars)
+    def correlationMatrix(self): return Matrix(self.corr)
+
+
+class PropagationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.a, self.b, self.c = Par("a", 1., 0.1), Par("b", 2., 0.2), Par("c", 3., 0.3)
+        self.params = Pars([self.a, self.b, self.c])
+        self.f = lambda: self.a.getVal() + 2.*self.b.getVal() - self.c.getVal()
+
+    # sigma^2 = J R J^T for a linear function, with J the derivatives times the errors
+    def test_correlated(self):
+        corr = [[1., 0.5, -0.2], [0.5, 1., 0.1], [-0.2, 0.1, 1.]]
+        fr = FitResult([Par("a", 1., 0.1), Par("b", 2., 0.2), Par("c", 3., 0.3)], corr)
+        J = np.array([0.1, 2.*0.2, -0.3])
+        self.assertAlmostEqual(propagatedError(self.f, fr, self.params), math.sqrt(J.dot(np.array(corr)).dot(J)), places=12)
+        # the parameters are left at their values
+        self.assertEqual((self.a.getVal(), self.b.getVal(), self.c.getVal()), (1., 2., 3.))
+
+    def test_independent_fits(self):
+        fr1 = FitResult([Par("a", 1., 0.1)], [[1.]])
+        fr2 = FitResult([Par("b", 2., 0.2), Par("c", 3., 0.3)], [[1., 0.], [0., 1.]])
+        error, parts = propagatedError(self.f, [fr1, fr2], self.params, contributions=True)
+        self.assertAlmostEqual(parts[0], 0.1, places=12)
+        self.assertAlmostEqual(parts[1], math.sqrt(0.4**2 + 0.3**2), places=12)
+        self.assertAlmostEqual(error, math.sqrt(0.1**2 + 0.4**2 + 0.3**2), places=12)
+
+    # parameters of the fit that the function does not depend on do not count
+    def test_unknown_parameter(self):
+        fr = FitResult([Par("a", 1., 0.1), Par("d", 0., 5.)], [[1., 0.9], [0.9, 1.]])
+        self.assertAlmostEqual(propagatedError(self.f, fr, self.params), 0.1, places=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
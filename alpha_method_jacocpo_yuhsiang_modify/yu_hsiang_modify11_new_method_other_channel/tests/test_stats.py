@@ -0,0 +1,83 @@
+#! /usr/bin/env python
+
+import os, sys, unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.stats import Welford, P2Quantile, ToyMonitor
+
+
+#####################
+# ONLINE STATISTICS #
+#####################
+
+def record(pull, status=0, bias=0.):
+    return {"bias" : bias, "pull" : pull, "status" : status}
+
+
+class OnlineStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.x = np.random.RandomState(3).normal(0.3, 1.7, 5000)
+
+    def test_welford(self):
+        w = Welford()
+        for v in self.x: w.add(v)
+        self.assertEqual(w.n, len(self.x))
+        self.assertAlmostEqual(w.mean, np.mean(self.x), places=10)
+        self.assertAlmostEqual(w.sigma(), np.std(self.x, ddof=1), places=10)
+        self.assertAlmostEqual(w.meanError(), np.std(self.x, ddof=1)/np.sqrt(len(self.x)), places=10)
+        self.assertAlmostEqual(w.sigmaError(), np.std(self.x, ddof=1)/np.sqrt(2.*(len(self.x)-1)), places=10)
+
+    def test_welford_few_values(self):
+        w = Welford()
+        self.assertEqual(w.meanError(), float("inf"))
+        w.add(1.)
+        self.assertEqual(w.sigma(), 0.)
+
+    def test_p2_quantiles(self):
+        for p in [0.16, 0.5, 0.84]:
+            q = P2Quantile(p)
+            for v in self.x: q.add(v)
+            # the P^2 estimate is within a small fraction of the width from the exact quantile
+            self.assertLess(abs(q.value() - np.percentile(self.x, 100.*p)), 0.05*np.std(self.x), msg=p)
+
+    def test_p2_few_values(self):
+        q = P2Quantile(0.5)
+        for v in [3., 1., 2.]: q.add(v)
+        self.assertEqual(q.value(), 2.)
+
+
+class ToyMonitorTest(unittest.TestCase):
+
+    def test_stops_on_target(self):
+        m = ToyMonitor(target=0.1, minToys=10)
+        pulls = np.random.RandomState(4).normal(0., 1., 1000)
+        n = next(i for i, p in enumerate(pulls) if m.update(record(p))) + 1
+        # sigma/sqrt(n) < 0.1 and sigma/sqrt(2(n-1)) < 0.1 for a unit width: about 100 toys
+        self.assertTrue(80 < n < 130, msg=n)
+        self.assertTrue("below" in m.reason)
+
+    def test_stops_on_failures(self):
+        m = ToyMonitor(maxFailures=0.2, minToys=100)
+        stops = [m.update(record(0., status=1 if i % 3 == 0 else 0)) for i in range(100)]
+        self.assertFalse(any(stops[:99]))
+        self.assertTrue(stops[99])
+        self.assertTrue("failure" in m.reason)
+
+    def test_no_stop_by_default(self):
+        m = ToyMonitor()
+        self.assertFalse(any([m.update(record(p)) for p in np.random.RandomState(5).normal(0., 1., 500)]))
+        self.assertEqual(m.reason, "")
+
+    def test_failed_fits_not_in_pulls(self):
+        m = ToyMonitor()
+        m.update(record(5., status=1))
+        m.update(record(7., bias=999))
+        m.update(record(1.))
+        self.assertEqual((m.all, m.converged, m.pull.n), (3, 2, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#! /usr/bin/env python
+
+import os, sys, shutil, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tools.toys import toySeed, resultColumns, writeResult, readResults, runToys
+
+
+###############
+# TOY RESULTS #
+###############
+
+def record(index, pull):
+    return {"index" : index, "seed" : toySeed("study", index), "status" : 0, "bias" : 0.1*index, "pull" : pull, "parameters" : {"b" : 2.5, "a" : -0.01*index}}
+
+
+class ResultsFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "toys_study_0.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, path, records):
+        columns = resultColumns(records[0])
+        with open(path, "w") as f:
+            f.write("\t".join(columns) + "\n")
+            for r in records: writeResult(f, columns, r)
+
+    def test_seeds(self):
+        self.assertEqual(toySeed("study", 7), toySeed("study", 7))
+        self.assertNotEqual(toySeed("study", 7), toySeed("study", 8))
+        self.assertNotEqual(toySeed("study", 7), toySeed("other", 7))
+        self.assertTrue(0 < toySeed("study", 7) < 2**31)
+
+    def test_round_trip(self):
+        records = [record(i, 0.3*i - 1.) for i in range(5)]
+        self.write(self.path, records)
+        self.assertEqual(readResults([self.path]), records)
+
+    # the line of a toy cut by a crash is skipped
+    def test_truncated_line(self):
+        self.write(self.path, [record(i, 0.5) for i in range(3)])
+        with open(self.path, "a") as f: f.write("3\t12345\t0\t0.3")
+        self.assertEqual([r["index"] for r in readResults([self.path])], [0, 1, 2])
+
+    # the files of a study split in several jobs are merged in the order of the indices
+    def test_several_files(self):
+        other = os.path.join(self.dir, "toys_study_3.txt")
+        self.write(other, [record(i, 0.) for i in [4, 3]])
+        self.write(self.path, [record(i, 0.) for i in [0, 2, 1]])
+        self.assertEqual([r["index"] for r in readResults([other, self.path])], [0, 1, 2, 3, 4])
+
+    # a study without resume or overwrite does not replace the toys of a previous run
+    def test_existing_file(self):
+        self.write(self.path, [record(i, 0.) for i in range(3)])
+        self.assertRaises(IOError, runToys, None, "study", range(3), results=self.path)
+        self.assertEqual(len(readResults([self.path])), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+#! /usr/bin/env python
+
+import multiprocessing
+from ROOT import RooFit, RooArgSet, RooArgList, TMath, TH1D
+
+from models import Model, models, parameters, channelRanges, channelFuncs
+
+# Starting values of the jet mass parameters, in the same order as the parameters registry (the defaults of alpha_Yu_new.py)
+initial = {
+    'Vjet' : [-0.020, 30., 100., -0.1, 0.6, -0.1],
+    'VV'   : [-0.030, 90., 50., 90., 10., 0.32, 125., 10., 0.015],
+    'Top'  : [-0.030, 175., 100., 80., 10., 0.1, 175., 12., 0.1],
+}
+
+
+#####################
+# FUNCTION FAMILIES #
+#####################
+
+# All the registered functions of a component are fitted to the same dataset, each in its own process (the dataset is
+# inherited by the forked workers, only the numbers come back), and ranked by AIC = 2k + 2NLL. For each function the
+# chi2/ndf is computed on the binned jet mass in the fit range, and the Fisher F-test is done against the lower-order member
+# of the same family, as it only holds for nested models. The NLL of a SumW2Error fit to weighted MC is not a likelihood,
+# so for weighted datasets the functions are ranked by chi2/ndf instead and the AIC is only indicative.
+# The largest difference of the SR yield from the one of the best function is the alternative-function systematic.
+
+# Lower-order member of the same family of a function, obtained by setting one of its fractions to 0
+lowerOrder = {
+    'Vjet' : {},
+    'VV'   : {'EXPGAUS2' : 'EXPGAUS', 'ERFEXPGAUS2' : 'ERFEXPGAUS'},
+    'Top'  : {'GAUS3' : 'GAUS2', 'GAUS2' : 'GAUS', 'ERFEXPGAUS2' : 'ERFEXPGAUS'},
+}
+
+# Inherited by the workers
+scan = {}
+
+
+def startValues(bkg, func, channel):
+    values = []
+    for (name, title, lo, hi), v in zip(parameters[bkg], initial[bkg]):
+        if func in channelFuncs.get(name, [func]): lo, hi = channelRanges.get(channel, {}).get(name, (lo, hi))
+        values.append(min(max(v, lo), hi))
+    return values
+
+
+def fitFamily(func):
+    x, data, bkg, channel = scan['var'], scan['data'], scan['bkg'], scan['channel']
+    m = Model(bkg, func, x, startValues(bkg, func, channel), channel, "_"+func)
+    fr = m.pdf.fitTo(data, RooFit.SumW2Error(True), RooFit.Range("h_reasonable_range"), RooFit.Strategy(2), RooFit.Minimizer("Minuit2"), RooFit.Save(1), RooFit.PrintLevel(-1))
+    nPars = fr.floatParsFinal().getSize()
+    # chi2 on the bins of the fit range, from the (weighted) events and the integral of the pdf in each bin;
+    # empty bins have no error and do not count in the ndf
+    xArg = RooArgSet(x)
+    lo, hi = x.getMin("h_reasonable_range"), x.getMax("h_reasonable_range")
+    nBins = int(round((hi - lo)/x.getBinning().averageBinWidth()))
+    h = TH1D("chi2_"+func, "", nBins, lo, hi)
+    h.Sumw2()
+    data.fillHistogram(h, RooArgList(x))
+    nData = data.sumEntries("", "h_reasonable_range")
+    iAll = m.pdf.createIntegral(xArg, RooFit.NormSet(xArg), RooFit.Range("h_reasonable_range"))
+    chi2, nFilled = 0., 0
+    for b in range(1, nBins+1):
+        if h.GetBinError(b) <= 0.: continue
+        x.setRange("chi2bin%d" % b, h.GetBinLowEdge(b), h.GetBinLowEdge(b+1))
+        expected = nData*m.pdf.createIntegral(xArg, RooFit.NormSet(xArg), RooFit.Range("chi2bin%d" % b)).getVal()/iAll.getVal()
+        chi2 += ((h.GetBinContent(b) - expected)/h.GetBinError(b))**2
+        nFilled += 1
+    ndf = nFilled - nPars
+    # SR yield, normalized to the events in the fit range
+    iSR = m.pdf.createIntegral(xArg, RooFit.NormSet(xArg), RooFit.Range("SRrange"))
+    SRyield = nData*iSR.getVal()/iAll.getVal()
+    return {"func" : func, "status" : fr.status(), "nll" : fr.minNll(), "npars" : nPars, "chi2" : chi2, "ndf" : ndf, "SRyield" : SRyield, "weighted" : data.isWeighted()}
+
+
+# Fisher F-test of the function b (more parameters) against a: probability that the chi2 improvement is a fluctuation
+def fTest(a, b):
+    dp = b["npars"] - a["npars"]
+    if dp <= 0 or b["ndf"] <= 0 or b["chi2"] <= 0.: return -1., -1.
+    F = max((a["chi2"] - b["chi2"])/dp, 0.)/(b["chi2"]/b["ndf"])
+    return F, 1. - TMath.FDistI(F, dp, b["ndf"])
+
+
+def scanFamilies(bkg, var, data, channel, funcs=[], jobs=0):
+    funcs = funcs or sorted(models[bkg].keys())
+    scan.update({'var' : var, 'data' : data, 'bkg' : bkg, 'channel' : channel})
+    pool = multiprocessing.Pool(min(jobs, len(funcs)) if jobs > 0 else len(funcs))
+    results = pool.map(fitFamily, funcs)
+    pool.close()
+    pool.join()
+
+    byFunc = dict([(r["func"], r) for r in results])
+    for r in results:
+        r["AIC"] = 2.*r["npars"] + 2.*r["nll"]
+        ref = byFunc.get(lowerOrder[bkg].get(r["func"]))
+        r["ref"] = ref["func"] if ref else ""
+        r["F"], r["pF"] = fTest(ref, r) if ref else (-1., -1.)
+    converged = [r for r in results if r["status"] == 0] or results
+    results.sort(key=lambda r: (r["status"] != 0, (r["chi2"]/r["ndf"] if r["ndf"] > 0 else float("inf")) if r["weighted"] else r["AIC"]))
+    best = results[0]
+    syst = max([abs(r["SRyield"] - best["SRyield"]) for r in converged])
+    return results, syst
+
+
+def printFamilies(bkg, channel, results, syst):
+    print "Function families for", bkg, "in channel", channel, ":"
+    print "  %-12s %6s %5s %12s %9s %9s %12s %8s %8s %10s" % ("function", "status", "npars", "NLL", "chi2/ndf", "AIC", "F-test vs", "F", "p(F)", "SR yield")
+    for r in results:
+        print "  %-12s %6d %5d %12.3f %9.3f %9.2f %12s %8.3f %8.3f %10.3f" % (r["func"], r["status"], r["npars"], r["nll"], r["chi2"]/r["ndf"] if r["ndf"] > 0 else -1., r["AIC"], r["ref"], r["F"], r["pF"], r["SRyield"])
+    if results[0]["weighted"]: print "  weighted dataset: ranked by chi2/ndf, the AIC of a SumW2Error fit is not a likelihood AIC"
+    print "  best function:", results[0]["func"], ", alternative-function systematic on the SR yield: %.3f (%.1f%%)" % (syst, 100.*syst/results[0]["SRyield"] if results[0]["SRyield"] != 0 else 0.)
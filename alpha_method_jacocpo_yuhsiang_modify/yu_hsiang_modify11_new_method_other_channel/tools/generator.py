@@ -0,0 +1,87 @@
+#! /usr/bin/env python
+
+import numpy as np
+from ROOT import gRandom, RooFit, RooArgSet, RooDataSet, RooDataHist
+
+# root_numpy turns the generated arrays into a tree in one go, without it the events are added one by one
+try:
+    from root_numpy import array2tree
+except ImportError:
+    array2tree = None
+
+
+##########################
+# INVERSE-CDF GENERATION #
+##########################
+
+# Events of a pdf with fixed parameters, generated by inverting its cumulative distribution instead of the accept-reject
+# of RooAbsPdf.generate: the pdf is tabulated once on a fine grid over the range of the observable, and the events of a toy
+# (or of a batch of toys) are drawn with a single searchsorted on the cumulative, linear between the grid points.
+# The uniform numbers come from gRandom, so the toys follow the seeds of tools/toys.py.
+class InverseCDF:
+
+    def __init__(self, pdf, var, points=20000):
+        self.var = var
+        self.x = np.linspace(var.getMin(), var.getMax(), points+1)
+        old, args = var.getVal(), RooArgSet(var)
+        f = np.zeros(len(self.x))
+        for i, xi in enumerate(self.x):
+            var.setVal(xi)
+            f[i] = pdf.getVal(args)
+        var.setVal(old)
+        cdf = np.concatenate([[0.], np.cumsum((f[1:] + f[:-1])/2.*np.diff(self.x))])
+        self.cdf = cdf/cdf[-1]
+
+    def generate(self, n):
+        u = np.zeros(n)
+        if n > 0: gRandom.RndmArray(n, u)
+        i = np.clip(np.searchsorted(self.cdf, u, side='right'), 1, len(self.cdf)-1)
+        dc = self.cdf[i] - self.cdf[i-1]
+        t = np.where(dc > 0., (u - self.cdf[i-1])/np.where(dc > 0., dc, 1.), 0.5)
+        return self.x[i-1] + t*(self.x[i] - self.x[i-1])
+
+    # Events of several toys drawn at once, split by toy
+    def generateBatch(self, counts):
+        return np.split(self.generate(int(np.sum(counts))), np.cumsum(counts)[:-1])
+
+
+# Binned toys: the expected contents of the bins of var (as set with setBins) are taken from the tabulated cumulative, and
+# every toy is a Poisson fluctuation of each bin, O(bins) instead of O(events); the total is then Poisson too.
+# For binned fits this is equivalent to generating the events and filling the bins.
+class BinnedToys:
+
+    def __init__(self, generator, var):
+        binning = var.getBinning()
+        self.var = var
+        self.edges = np.array([binning.binLow(i) for i in range(binning.numBins())] + [binning.binHigh(binning.numBins()-1)])
+        self.centers = (self.edges[1:] + self.edges[:-1])/2.
+        self.fractions = np.diff(np.interp(self.edges, generator.x, generator.cdf))
+
+    # Bin contents of a toy with n expected events in total
+    def generate(self, n):
+        return np.array([gRandom.Poisson(n*f) for f in self.fractions], dtype=np.float64)
+
+    # RooDataHist with the contents of the bins selected by mask (all if None)
+    def dataHist(self, name, counts, mask=None):
+        hist = RooDataHist(name, name, RooArgSet(self.var))
+        args, old = RooArgSet(self.var), self.var.getVal()
+        for i in (np.flatnonzero(mask) if mask is not None else range(len(counts))):
+            self.var.setVal(self.centers[i])
+            hist.add(args, counts[i])
+        self.var.setVal(old)
+        return hist
+
+
+# Unweighted RooDataSet of the values x of var
+def arrayDataSet(name, var, x):
+    if array2tree is not None:
+        tree = array2tree(np.array(x, dtype=[(var.GetName(), np.float64)]), name="tree_"+name)
+        return RooDataSet(name, name, RooArgSet(var), RooFit.Import(tree))
+    args = RooArgSet(var)
+    data = RooDataSet(name, name, args)
+    old = var.getVal()
+    for xi in x:
+        var.setVal(xi)
+        data.add(args)
+    var.setVal(old)
+    return data
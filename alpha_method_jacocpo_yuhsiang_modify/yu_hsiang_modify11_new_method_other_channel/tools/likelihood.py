@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+
+import os, hashlib, multiprocessing
+import numpy as np
+from ROOT import RooRealVar, RooFormulaVar, RooAddition, RooArgList, RooMinimizer
+
+SCANDIR = "ntuples/cache/scans/"
+
+
+###########################
+# PROFILE LIKELIHOOD SCAN #
+###########################
+
+# Profiled NLL on a 1D or 2D grid of parameters of the likelihood, or of functions of them (e.g. SRyield): a parameter is
+# fixed at each point, while a function is held at the point by a steep quadratic penalty, and the value really reached is
+# stored instead of the point. The other floating parameters are minimized again at every point, starting from the previous
+# point of the same line, so each fit starts next to its minimum. The lines (each side of the best fit, walked outwards
+# from the best-fit state, for the whole grid in 1D and for each row in 2D) are spread over a process pool,
+# which inherits the likelihood.
+# The scan is saved in a compressed numpy file, named after the likelihood value, parameters and grid, and read back
+# instead of scanning again.
+# The parameters of the likelihood have to be at the best fit when calling likelihoodScan.
+
+# Inherited by the workers
+state = {}
+
+
+def scanGrid(var, error, nSigma=3., points=31):
+    lo, hi = var.getVal() - nSigma*error, var.getVal() + nSigma*error
+    if var.InheritsFrom("RooRealVar"): lo, hi = max(lo, var.getMin()), min(hi, var.getMax())
+    return np.linspace(lo, hi, points)
+
+
+def floatingParameters(nll, scanned):
+    variables = nll.getVariables()
+    it = variables.createIterator()
+    p, params = it.Next(), []
+    while p:
+        if not p.isConstant() and not p.GetName() in [v.GetName() for v in scanned]: params.append(p)
+        p = it.Next()
+    return params
+
+
+def scanKey(nll, scanned, grids, params, tag):
+    key = hashlib.md5()
+    key.update("%s %r %s" % (tag, nll.getVal(), [v.GetName() for v in scanned]))
+    for g in grids: key.update(np.asarray(g, dtype=float).tostring())
+    for p in params: key.update("%s %r %r %r" % (p.GetName(), p.getVal(), p.getMin(), p.getMax()))
+    return key.hexdigest()
+
+
+# Lines of grid points (tuples of indices): the points below and above the best fit, each ordered outwards, so that every
+# fit starts from its neighbour
+def scanSides(grid, best):
+    return [i for i in range(len(grid)) if grid[i] < best][::-1], [i for i in range(len(grid)) if grid[i] >= best]
+
+
+def scanLines(grids, best):
+    if len(grids) == 1: return [[(i,) for i in side] for side in scanSides(grids[0], best[0]) if len(side) > 0]
+    rows = sorted(range(len(grids[0])), key=lambda i: abs(grids[0][i] - best[0]))
+    return [[(i, j) for j in side] for i in rows for side in scanSides(grids[1], best[1]) if len(side) > 0]
+
+
+def scanLine(line):
+    nll, func, scanned, targets, params, grids = state['nll'], state['func'], state['scanned'], state['targets'], state['params'], state['grids']
+    records = []
+    # every line starts from the best fit
+    for p, v in zip(params, state['start']): p.setVal(v)
+    for index in line:
+        for v, t, g, i in zip(scanned, targets, grids, index):
+            if t is None:
+                v.setVal(g[i])
+                v.setConstant(True)
+            else: t.setVal(g[i])
+        m = RooMinimizer(func)
+        m.setPrintLevel(-1)
+        m.setStrategy(1)
+        status = m.minimize("Minuit2", "migrad")
+        records.append((index, [v.getVal() for v in scanned], nll.getVal(), status, [p.getVal() for p in params]))
+    return records
+
+
+def likelihoodScan(nll, scanned, grids, jobs=0, tag="", scandir=SCANDIR):
+    params = floatingParameters(nll, scanned)
+    path = scandir + (tag + "_" if tag else "") + scanKey(nll, scanned, grids, params, tag) + ".npz"
+    if os.path.exists(path): return dict(np.load(path))
+
+    # Penalty (value - point)^2 / (2 tolerance^2), the tolerance being a tenth of the grid step
+    targets, penalties, keep = [], RooArgList(), []
+    for v, g in zip(scanned, grids):
+        if v.InheritsFrom("RooRealVar"):
+            targets.append(None)
+            continue
+        t = RooRealVar(v.GetName()+"_point", "scan point", v.getVal())
+        s = RooRealVar(v.GetName()+"_strength", "scan penalty", 0.5/(0.1*(g[1] - g[0]))**2)
+        t.setConstant(True)
+        s.setConstant(True)
+        f = RooFormulaVar(v.GetName()+"_penalty", "scan penalty", "@2*(@0-@1)*(@0-@1)", RooArgList(v, t, s))
+        penalties.add(f)
+        targets.append(t)
+        keep += [t, s, f]
+    terms = RooArgList(nll)
+    terms.add(penalties)
+    func = RooAddition("scanNLL", "NLL and scan penalties", terms) if penalties.getSize() > 0 else nll
+    nll0, best = nll.getVal(), [v.getVal() for v in scanned]
+    state.update({'nll' : nll, 'func' : func, 'scanned' : scanned, 'targets' : targets, 'params' : params, 'grids' : grids, 'keep' : keep, 'start' : [p.getVal() for p in params]})
+
+    n = jobs if jobs > 0 else multiprocessing.cpu_count()
+    lines = scanLines(grids, best)
+    pool = multiprocessing.Pool(min(n, len(lines)))
+    lines = pool.map(scanLine, lines)
+    pool.close()
+    pool.join()
+
+    shape = tuple([len(g) for g in grids])
+    values, nlls, status, pars = np.zeros(shape + (len(scanned),)), np.zeros(shape), np.zeros(shape, dtype=int), np.zeros(shape + (len(params),))
+    for line in lines:
+        for index, v, l, s, p in line:
+            values[index], nlls[index], status[index], pars[index] = v, l, s, p
+    scan = {"names" : np.array([v.GetName() for v in scanned]), "values" : values, "dnll" : nlls - min(nll0, nlls.min()), "status" : status, "best" : np.array(best), "parameters" : np.array([p.GetName() for p in params]), "profiled" : pars}
+
+    for d, g in enumerate(grids): scan["grid%d" % d] = np.asarray(g, dtype=float)
+    if not os.path.exists(scandir): os.makedirs(scandir)
+    tmp = path + ".tmp%d" % os.getpid()
+    with open(tmp, "wb") as f: np.savez_compressed(f, **scan)
+    os.rename(tmp, path)
+    return scan
+
+
+# Interval where the 1D profiled NLL is below level (0.5 for 1 sigma), interpolating linearly between the points;
+# (nan, nan) if no point of the scan converged
+def scanInterval(scan, level=0.5):
+    x, y = scan["values"][:, 0], scan["dnll"]
+    ok = scan["status"] == 0
+    if not ok.any(): return float("nan"), float("nan")
+    x, y = x[ok], y[ok]
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    i = np.argmin(y)
+    lo, hi = x[0], x[-1]
+    for k in range(i, 0, -1):
+        if y[k-1] > level:
+            lo = x[k-1] + (level - y[k-1])*(x[k] - x[k-1])/(y[k] - y[k-1])
+            break
+    for k in range(i, len(x)-1):
+        if y[k+1] > level:
+            hi = x[k] + (level - y[k])*(x[k+1] - x[k])/(y[k+1] - y[k])
+            break
+    return lo, hi
@@ -0,0 +1,129 @@
+#! /usr/bin/env python
+
+from ROOT import RooRealVar, RooArgList, RooGaussian, RooExponential, RooChebychev, RooGenericPdf, RooAddPdf, RooErfExpPdf
+
+
+###################
+# JET MASS MODELS #
+###################
+
+# Parameters of the jet mass models of each background, in the same order as list_Vjet_pars, list_VV_pars and list_Top_pars:
+# name, title, range
+parameters = {
+    'Vjet' : [
+        ("constVjet",  "slope of the exp",                 -1.,   0.),
+        ("offsetVjet", "offset of the erf",               -50., 400.),
+        ("widthVjet",  "width of the erf",                  1., 200.),
+        ("a0Vjet",     "width of the erf",                 -5.,   0.),
+        ("a1Vjet",     "width of the erf",                  0.,   5.),
+        ("a2Vjet",     "width of the erf",                 -1.,   1.),
+    ],
+    'VV' : [
+        ("constVV",    "slope of the exp",                 -0.1,  0.),
+        ("offsetVV",   "offset of the erf",                 1., 300.),
+        ("widthVV",    "width of the erf",                  1., 100.),
+        ("meanVV",     "mean of the gaussian",             60., 100.),
+        ("sigmaVV",    "sigma of the gaussian",             6.,  30.),
+        ("fracVV",     "fraction of gaussian wrt erfexp",   0.,   1.),
+        ("meanVH",     "mean of the gaussian",            100., 150.),
+        ("sigmaVH",    "sigma of the gaussian",             5.,  50.),
+        ("fracVH",     "fraction of gaussian wrt erfexp",   0.,   1.),
+    ],
+    'Top' : [
+        ("constTop",   "slope of the exp",                 -1.,   0.),
+        ("offsetTop",  "offset of the erf",                50., 250.),
+        ("widthTop",   "width of the erf",                  1., 300.),
+        ("meanW",      "mean of the gaussian",             70.,  90.),
+        ("sigmaW",     "sigma of the gaussian",             2.,  20.),
+        ("fracW",      "fraction of gaussian wrt erfexp",   0.,   1.),
+        ("meanT",      "mean of the gaussian",            150., 200.),
+        ("sigmaT",     "sigma of the gaussian",             5.,  30.),
+        ("fracT",      "fraction of gaussian wrt erfexp",   0.,   1.),
+    ],
+}
+
+# Ranges that depend on the channel
+channelRanges = {
+    'XZhnnb'  : {"offsetVjet" : (200., 1000.)},
+    'XZhnnbb' : {"offsetVjet" : (200., 500.)},
+    'XZheeb'  : {"offsetTop" : (-50., 450.), "widthTop" : (1., 1000.)},
+    'XZheebb' : {"offsetTop" : (-50., 450.), "widthTop" : (1., 1000.)},
+    'XZhmmb'  : {"offsetTop" : (-50., 450.), "widthTop" : (1., 1000.)},
+    'XZhmmbb' : {"offsetTop" : (-50., 450.), "widthTop" : (1., 1000.)},
+}
+
+# Channel ranges that only apply to some functions: the wider Top erf ranges of the electron and muon channels
+# only ever reached the single gaussian, the composite shapes keep the default ranges
+channelFuncs = {
+    "offsetTop" : ["GAUS"],
+    "widthTop"  : ["GAUS"],
+}
+
+
+# A jet mass model built once from the registry: the pdf, its parameters and their initial values.
+# Between two toys the same model is used again after reset(), instead of creating new RooRealVars and pdfs.
+class Model:
+
+    def __init__(self, bkg, func, x, values, channel, suffix=""):
+        if not func in models[bkg]:
+            print "  ERROR! Pdf", func, "is not implemented for", bkg
+            exit()
+        self.bkg, self.func, self.suffix = bkg, func, suffix
+        self.vars, self.init, self.components = {}, {}, []
+        for (name, title, lo, hi), v in zip(parameters[bkg], values):
+            if func in channelFuncs.get(name, [func]): lo, hi = channelRanges.get(channel, {}).get(name, (lo, hi))
+            self.vars[name] = RooRealVar(name+suffix, title, v, lo, hi)
+            self.init[name] = v
+        self.pdf = models[bkg][func](self, x, bkg+"Mass"+suffix, func)
+
+    def __getitem__(self, name):
+        return self.vars[name]
+
+    # Pdf used inside the model, kept alive together with it
+    def keep(self, pdf):
+        self.components.append(pdf)
+        return pdf
+
+    def reset(self):
+        for name, v in self.init.iteritems():
+            self.vars[name].setVal(v)
+            self.vars[name].setError(0.)
+
+    def setConstant(self, constant=True):
+        for v in self.vars.values(): v.setConstant(constant)
+
+
+# Shapes used by several models
+def erfExp(m, x, name, const, offset, width):
+    return m.keep(RooErfExpPdf(name+m.suffix, "error function for "+m.bkg+" jet mass", x, m[const], m[offset], m[width]))
+
+def expo(m, x, name, const):
+    return m.keep(RooExponential(name+m.suffix, "exponential for "+m.bkg+" jet mass", x, m[const]))
+
+def gaus(m, x, name, mean, sigma):
+    return m.keep(RooGaussian(name+m.suffix, "gaus for "+m.bkg+" jet mass", x, m[mean], m[sigma]))
+
+
+# Factories: model, observable, name and title of the pdf -> pdf
+models = {
+    'Vjet' : {
+        'ERFEXP' : lambda m, x, n, t: RooErfExpPdf(n, t, x, m["constVjet"], m["offsetVjet"], m["widthVjet"]),
+        'EXP' : lambda m, x, n, t: RooExponential(n, t, x, m["constVjet"]),
+        'GAUS' : lambda m, x, n, t: RooGaussian(n, t, x, m["offsetVjet"], m["widthVjet"]),
+        'POL' : lambda m, x, n, t: RooChebychev(n, t, x, RooArgList(m["a0Vjet"], m["a1Vjet"], m["a2Vjet"])),
+        'POW' : lambda m, x, n, t: RooGenericPdf(n, t, "@0^@1", RooArgList(x, m["a0Vjet"])),
+    },
+    'VV' : {
+        'ERFEXPGAUS' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausVV", "meanVV", "sigmaVV"), erfExp(m, x, "baseVV", "constVV", "offsetVV", "widthVV")), RooArgList(m["fracVV"])),
+        'ERFEXPGAUS2' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausVH", "meanVH", "sigmaVH"), gaus(m, x, "gausVV", "meanVV", "sigmaVV"), erfExp(m, x, "baseVV", "constVV", "offsetVV", "widthVV")), RooArgList(m["fracVH"], m["fracVV"])),
+        'EXPGAUS' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausVV", "meanVV", "sigmaVV"), expo(m, x, "baseVV", "constVV")), RooArgList(m["fracVV"])),
+        'EXPGAUS2' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausVH", "meanVH", "sigmaVH"), gaus(m, x, "gausVV", "meanVV", "sigmaVV"), expo(m, x, "baseVV", "constVV")), RooArgList(m["fracVH"], m["fracVV"])),
+    },
+    'Top' : {
+        'ERFEXPGAUS2' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausW", "meanW", "sigmaW"), gaus(m, x, "gausT", "meanT", "sigmaT"), erfExp(m, x, "baseTop", "constTop", "offsetTop", "widthTop")), RooArgList(m["fracW"], m["fracT"])),
+        'ERFEXPGAUS' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausT", "meanT", "sigmaT"), erfExp(m, x, "baseTop", "constTop", "offsetTop", "widthTop")), RooArgList(m["fracT"])),
+        'GAUS3' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausW", "meanW", "sigmaW"), gaus(m, x, "gausT", "meanT", "sigmaT"), gaus(m, x, "baseTop", "offsetTop", "widthTop")), RooArgList(m["fracW"], m["fracT"])),
+        'GAUS2' : lambda m, x, n, t: RooAddPdf(n, t, RooArgList(gaus(m, x, "gausT", "meanT", "sigmaT"), gaus(m, x, "baseTop", "offsetTop", "widthTop")), RooArgList(m["fracT"])),
+        'GAUS' : lambda m, x, n, t: RooGaussian(n, t, x, m["offsetTop"], m["widthTop"]),
+    },
+}
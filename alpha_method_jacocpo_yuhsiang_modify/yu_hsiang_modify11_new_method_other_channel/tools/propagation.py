@@ -0,0 +1,49 @@
+#! /usr/bin/env python
+
+import math
+import numpy as np
+
+
+#####################
+# ERROR PROPAGATION #
+#####################
+
+# Error on a function of the parameters of one or more fits, for any number of parameters: for each fit the function is
+# evaluated at the +-1 sigma points of all its floating parameters in one pass, and sigma^2 = sum over the fits of J R J^T,
+# J being the half differences (the derivatives times the errors, as in RooAbsReal.getPropagatedError) and R the correlation
+# matrix of the fit. The fits are taken as independent.
+# func is a RooAbsReal, or a python function without arguments together with the RooArgSet of the parameters it depends on.
+# With contributions=True the error of each fit is returned too.
+
+def propagatedError(func, results, params=None, contributions=False):
+    if not isinstance(results, (list, tuple)): results = [results]
+    evaluate = func.getVal if hasattr(func, "getVal") else func
+    if params is None: params = func.getVariables()
+    variances = [variance(evaluate, params, fr) for fr in results]
+    error = math.sqrt(sum(variances))
+    if contributions: return error, [math.sqrt(v) for v in variances]
+    return error
+
+
+def variance(evaluate, params, fit_result):
+    floating = fit_result.floatParsFinal()
+    n = floating.getSize()
+    names = [floating.at(i).GetName() for i in range(n)]
+    pars = [params.find(name) for name in names]
+    values = np.array([floating.at(i).getVal() for i in range(n)])
+    errors = np.array([floating.at(i).getError() for i in range(n)])
+    old = [p.getVal() if p else 0. for p in pars]
+
+    points = np.vstack([values + np.diag(errors), values - np.diag(errors)])
+    f = np.zeros(len(points))
+    for k, point in enumerate(points):
+        for p, v in zip(pars, point):
+            if p: p.setVal(v)
+        f[k] = evaluate()
+    for p, v in zip(pars, old):
+        if p: p.setVal(v)
+
+    J = (f[:n] - f[n:])/2.
+    R = fit_result.correlationMatrix()
+    R = np.array([[R(i, j) for j in range(n)] for i in range(n)])
+    return float(J.dot(R).dot(J))
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+
+import math
+
+
+#####################
+# ONLINE STATISTICS #
+#####################
+
+# Mean and variance updated one value at a time (Welford), with the standard errors of the mean and of the width
+class Welford:
+
+    def __init__(self):
+        self.n, self.mean, self.m2 = 0, 0., 0.
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta/self.n
+        self.m2 += delta*(x - self.mean)
+
+    def sigma(self):
+        return math.sqrt(self.m2/(self.n - 1)) if self.n > 1 else 0.
+
+    def meanError(self):
+        return self.sigma()/math.sqrt(self.n) if self.n > 1 else float("inf")
+
+    def sigmaError(self):
+        return self.sigma()/math.sqrt(2.*(self.n - 1)) if self.n > 1 else float("inf")
+
+
+# Quantile p estimated without keeping the values, with the five markers of the P^2 algorithm (Jain and Chlamtac)
+class P2Quantile:
+
+    def __init__(self, p):
+        self.p = p
+        self.q, self.pos = [], [1., 2., 3., 4., 5.]
+        self.want = [1., 1. + 2.*p, 1. + 4.*p, 3. + 2.*p, 5.]
+        self.step = [0., p/2., p, (1. + p)/2., 1.]
+
+    def add(self, x):
+        if len(self.q) < 5:
+            self.q.append(x)
+            self.q.sort()
+            return
+        q, pos = self.q, self.pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else: k = [i for i in range(4) if q[i] <= x < q[i+1]][0]
+        for i in range(k+1, 5): pos[i] += 1.
+        for i in range(5): self.want[i] += self.step[i]
+        for i in range(1, 4):
+            d = self.want[i] - pos[i]
+            if (d >= 1. and pos[i+1] - pos[i] > 1.) or (d <= -1. and pos[i-1] - pos[i] < -1.):
+                d = 1. if d > 0. else -1.
+                # parabolic prediction, linear if it is not between the neighbours
+                qp = q[i] + d/(pos[i+1] - pos[i-1])*((pos[i] - pos[i-1] + d)*(q[i+1] - q[i])/(pos[i+1] - pos[i]) + (pos[i+1] - pos[i] - d)*(q[i] - q[i-1])/(pos[i] - pos[i-1]))
+                if not q[i-1] < qp < q[i+1]: qp = q[i] + d*(q[i+int(d)] - q[i])/(pos[i+int(d)] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    def value(self):
+        if len(self.q) == 5: return self.q[2]
+        if len(self.q) == 0: return 0.
+        return sorted(self.q)[min(int(self.p*len(self.q)), len(self.q)-1)]
+
+
+# Bias and pull of the toys of a study, updated toy by toy: update(record) returns True when the study can stop, either
+# because the standard errors of the pull mean and width are below target, or because the rate of failed fits is above
+# maxFailures (checked after minToys toys, so that a few early failures do not stop the study)
+class ToyMonitor:
+
+    def __init__(self, target=0., maxFailures=1., minToys=100):
+        self.target, self.maxFailures, self.minToys = target, maxFailures, minToys
+        self.bias, self.pull = Welford(), Welford()
+        self.quantiles = dict([(p, P2Quantile(p)) for p in [0.16, 0.5, 0.84]])
+        self.all, self.converged, self.reason = 0, 0, ""
+
+    def update(self, record):
+        self.all += 1
+        if record["status"] == 0: self.converged += 1
+        if record["status"] == 0 and record["bias"] != 999:
+            self.bias.add(record["bias"])
+            self.pull.add(record["pull"])
+            for q in self.quantiles.values(): q.add(record["pull"])
+        if self.all < self.minToys: return False
+        if 1. - float(self.converged)/self.all > self.maxFailures:
+            self.reason = "failure rate %.3f above %.3f" % (1. - float(self.converged)/self.all, self.maxFailures)
+        elif self.target > 0. and self.pull.meanError() < self.target and self.pull.sigmaError() < self.target:
+            self.reason = "errors on the pull mean and width below %.3f" % self.target
+        return self.reason != ""
+
+    def printSummary(self, name):
+        print name, ": toys", self.all, ", converged", self.converged, "(%.1f%%)" % (100.*self.converged/max(self.all, 1))
+        print "  bias mean %.4f +- %.4f, width %.4f +- %.4f" % (self.bias.mean, self.bias.meanError(), self.bias.sigma(), self.bias.sigmaError())
+        print "  pull mean %.4f +- %.4f, width %.4f +- %.4f, quantiles 16%% %.3f, 50%% %.3f, 84%% %.3f" % (self.pull.mean, self.pull.meanError(), self.pull.sigma(), self.pull.sigmaError(), self.quantiles[0.16].value(), self.quantiles[0.5].value(), self.quantiles[0.84].value())
+        if self.reason: print "  stopped early:", self.reason
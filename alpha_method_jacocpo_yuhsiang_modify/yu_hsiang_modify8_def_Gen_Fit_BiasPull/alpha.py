@@ -2,6 +2,7 @@
 
 import os, sys, getopt, multiprocessing
 import copy, math
+import numpy as np
 from array import array
 from ROOT import gROOT, gSystem, gStyle, gRandom, gPad
 from ROOT import TFile, TChain, TTree, TCut, TH1F, TH2F, THStack, TGraph, TGaxis
@@ -22,6 +23,10 @@ from ROOT import PdfDiagonalizer, RooAlphaExp, RooErfExpPdf, Roo2ExpPdf, RooAlph
 
 sys.path.append("../jacopo_codes/tools")
 from tools.utils import *
+from tools.integrals import rangeIntegrals
+from tools.propagation import propagatedError
+from tools.toys import runToys, replayToy
+from tools.generator import InverseCDF, arrayDataSet
 
 import optparse
 usage = "usage: %prog [options]"
@@ -31,6 +36,7 @@ parser.add_option("-b", "--bash", action="store_true", default=False, dest="bash
 parser.add_option("-c", "--channel", action="store", type="string", dest="channel", default="")
 parser.add_option("-d", "--different", action="store_true", default=False, dest="different")
 parser.add_option("-e", "--extrapolate", action="store_true", default=False, dest="extrapolate")
+parser.add_option("-j", "--jobs", action="store", type="int", default=0, dest="jobs")
 parser.add_option("-v", "--verbose", action="store_true", default=False, dest="verbose")
 (options, args) = parser.parse_args()
 if options.bash: gROOT.SetBatch(True)
@@ -69,6 +75,7 @@ BLIND       = True if not EXTRAPOLATE else False
 LUMISILVER  = 2460.
 LUMIGOLDEN  = 2110.
 VERBOSE     = options.verbose
+NCPU        = options.jobs
 
 channelList = ['XZhnnb', 'XZhnnbb', 'XWhenb', 'XWhenbb', 'XWhmnb', 'XWhmnbb', 'XZheeb', 'XZhmmb', 'XZheebb', 'XZhmmbb']
 
@@ -486,10 +493,7 @@ def alpha(channel):
 
 	# use defined function to get sigma of fit
 
-	par1_name = "constVjet_test2"
-	par2_name = "widthVjet_test2"
-
-	N_fit_central, fit_error_by_function = Get_Fit_Sigma( J_mass , nPseudo_data_fluc, modelVjet_test2 , frVjet_test2, constVjet_test2, par1_name , widthVjet_test2, par2_name  )
+	N_fit_central, fit_error_by_function = Get_Fit_Sigma( J_mass , nPseudo_data_fluc, modelVjet_test2 , frVjet_test2 )
 	print ""
 	print "get fit error by def function"
 	print "N_Fit_SR: ",N_fit_central," +/- ", fit_error_by_function
@@ -595,26 +599,25 @@ def alpha(channel):
 	# starts loop
 	print ""
 	print "starting loop"
-	for times in range(0,times_max):  
-
-    		# inside loop
-#		print "times:", times
+	# the toys run in parallel, each with the seed given by the study and its index (tools/toys.py);
+	# the toy of the plot is replayed afterwards with the same pseudo data
+	function_name = "ERFEXP"
+	study = channel + "_" + function_name
 
-		if times % 100 == 0 :
-			print "Processing times:", times+1 ,"of", times_max
- 
-		plot_flag =0
-		if times_to_plot == times: plot_flag = 1   
+	# the cumulative of the fixed modelVjet_test is tabulated once, the events of the toys are drawn from it
+	toyGenerator = InverseCDF(modelVjet_test, J_mass)
 
+	def toy(index, plot_flag=0):
+		bias ,pull, fit_status, pars = Gen_Fit_BiasPull(J_mass, nPseudo_data  , modelVjet_test, toyGenerator, list_of_fit_MC_par_value , function_name ,Jmass_frame4 ,plot_flag )
+		return {"bias" : bias, "pull" : pull, "status" : fit_status, "parameters" : pars}
 
-		# try to use def fn to do Gen,Fit,BiasPull
-		function_name = "ERFEXP"
+	records = runToys(toy, study, range(0,times_max), NCPU)
 
-		bias ,pull = Gen_Fit_BiasPull(J_mass, nPseudo_data  , modelVjet_test, list_of_fit_MC_par_value , function_name ,Jmass_frame4 ,plot_flag )
+	for record in records:
+                h_Bias_case1.Fill( record["bias"] )
+                h_Pull_case1.Fill( record["pull"] )
 
-
-                h_Bias_case1.Fill( bias )
-                h_Pull_case1.Fill( pull )
+	if times_to_plot < times_max: replayToy(lambda i: toy(i, 1), study, times_to_plot)
 
 
         # ------------------------------------------------------------------- 
@@ -1040,27 +1043,24 @@ def drawPlot(name, channel, variable, model, dataset, binning, fitRes=None, reg=
     # ======   END PLOT   ======
 
 
-def Gen_Fit_BiasPull( J_mass, nPseudo_data , modelVjet_fit_MC, list_of_fit_MC_par_value , function_name , Jmass_frame4 ,plot_flag ):
+def Gen_Fit_BiasPull( J_mass, nPseudo_data , modelVjet_fit_MC, toyGenerator, list_of_fit_MC_par_value , function_name , Jmass_frame4 ,plot_flag ):
 
     # --------------------------------
     # generate pseudo-data
 
     nPseudo_data_fluc = gRandom.Poisson( nPseudo_data )
-    pseudo_data_fluc = modelVjet_fit_MC.generate(RooArgSet(J_mass),nPseudo_data_fluc )
+    pseudo_data_fluc = toyGenerator.generate( nPseudo_data_fluc )
 
     # Sideband(SB) dataset                
-    pseudo_data_SB_fluc = RooDataSet("pseudo_data_SB_fluc", "pseudo_data_SB_fluc", RooArgSet(J_mass), RooFit.Import(pseudo_data_fluc), RooFit.Cut("fatjet1_prunedMassCorr<65 || fatjet1_prunedMassCorr>135") )
-
-    # signal region(SR) dataset
-    pseudo_data_SR_fluc = RooDataSet("pseudo_data_SR_fluc", "pseudo_data_SR_fluc", RooArgSet(J_mass), RooFit.Import(pseudo_data_fluc), RooFit.Cut("fatjet1_prunedMassCorr>105 && fatjet1_prunedMassCorr<135") )
+    pseudo_data_SB_fluc = arrayDataSet("pseudo_data_SB_fluc", J_mass, pseudo_data_fluc[(pseudo_data_fluc<65) | (pseudo_data_fluc>135)])
 
-    # number of event in SR      
-    nGen_SR_fluc = pseudo_data_SR_fluc.sumEntries()
+    # number of event in signal region(SR)
+    nGen_SR_fluc = float(np.count_nonzero((pseudo_data_fluc>105) & (pseudo_data_fluc<135)))
 
 
     # Plot
     if plot_flag ==1: 
-	pseudo_data_fluc.plotOn(Jmass_frame4)  
+	arrayDataSet("pseudo_data_fluc", J_mass, pseudo_data_fluc).plotOn(Jmass_frame4)  
 	modelVjet_fit_MC.plotOn(Jmass_frame4,RooFit.LineColor(4))
 	pseudo_data_SB_fluc.plotOn(Jmass_frame4,RooFit.LineColor(3))
 
@@ -1104,7 +1104,7 @@ def Gen_Fit_BiasPull( J_mass, nPseudo_data , modelVjet_fit_MC, list_of_fit_MC_pa
     # Bias & Pull
 
     # get error by def fn
-    N_fit_central, fit_error_by_function = Get_Fit_Sigma( J_mass , nPseudo_data_fluc, modelVjet_fit_data , frVjet_fit_data, constVjet_fit_data, par1_name , widthVjet_fit_data, par2_name  )
+    N_fit_central, fit_error_by_function = Get_Fit_Sigma( J_mass , nPseudo_data_fluc, modelVjet_fit_data , frVjet_fit_data )
 
 #    print " in function"
 #    print "get error by function"
@@ -1143,108 +1143,33 @@ def Gen_Fit_BiasPull( J_mass, nPseudo_data , modelVjet_fit_MC, list_of_fit_MC_pa
     pull = ( N_fit_central - nGen_SR_fluc )/fit_error 
 
     # return
-    return ( bias , pull )
+    return ( bias , pull , frVjet_fit_data.status() , {par1_name : par1_value, par2_name : par2_value} )
 
 
     # ======   END Gen_Fit_BiasPull  ======
 
 
-def Get_Fit_Sigma( J_mass ,N_total_events , model_PDF , fit_result , par1 , par1_name, par2, par2_name): 
-
-    jetMassArg = RooArgSet(J_mass)
-
-    # get parameter
-    par1_fitresult = fit_result.floatParsFinal().find(par1_name)
-    par2_fitresult = fit_result.floatParsFinal().find(par2_name)
-
-    par1_value = par1_fitresult.getVal()
-    par1_error = par1_fitresult.getError()
-
-    par2_value = par2_fitresult.getVal()
-    par2_error = par2_fitresult.getError()
-
-    # par plus, minus
-    par1_plus = par1_value + par1_error
-    par1_minus = par1_value - par1_error  
+def Get_Fit_Sigma( J_mass ,N_total_events , model_PDF , fit_result ): 
 
-    par2_plus = par2_value + par2_error
-    par2_minus = par2_value - par2_error
+    # N_fit in SR as a function of all the floating parameters of the fit,
+    # the RooErfExpPdf models being integrated in closed form
+    def N_fit():
+        iFit = rangeIntegrals(model_PDF, J_mass, ["SRrange", "h_reasonable_range"])
+        return N_total_events * (  iFit["SRrange"] / iFit["h_reasonable_range"] )
 
+    params = model_PDF.getParameters(RooArgSet(J_mass))
 
-    # get correlation matrix
-    cor = fit_result.correlationMatrix() ;
-        
     # get N_fit_central value
 
-    par1.setVal(par1_value )
-    par2.setVal(par2_value )
-
-    iFit_SR_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iFit_All_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("h_reasonable_range"))
-
-    N_fit_central = N_total_events * (  iFit_SR_error.getVal() / iFit_All_error.getVal() )
-
-    # get N_fit_par1_plus value
-
-    par1.setVal(par1_plus )
-    par2.setVal(par2_value )
-
-    iFit_SR_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iFit_All_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("h_reasonable_range"))
-
-    N_fit_par1_plus = N_total_events * (  iFit_SR_error.getVal() / iFit_All_error.getVal() )
-
-    # get N_fit_par1_minus value
-
-    par1.setVal(par1_minus )
-    par2.setVal(par2_value )
-
-    iFit_SR_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iFit_All_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("h_reasonable_range"))
-
-    N_fit_par1_minus = N_total_events * (  iFit_SR_error.getVal() / iFit_All_error.getVal() )
-
-    # get N_fit_par2_plus value
-
-    par1.setVal(par1_value )
-    par2.setVal(par2_plus )
-
-    iFit_SR_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iFit_All_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("h_reasonable_range"))
-
-    N_fit_par2_plus = N_total_events * (  iFit_SR_error.getVal() / iFit_All_error.getVal() )
-
-    # get N_fit_par2_minus value
-
-    par1.setVal(par1_value )
-    par2.setVal(par2_minus )
-
-    iFit_SR_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("SRrange"))
-    iFit_All_error = model_PDF.createIntegral(jetMassArg,RooFit.NormSet(jetMassArg), RooFit.Range("h_reasonable_range"))
-
-    N_fit_par2_minus = N_total_events * (  iFit_SR_error.getVal() / iFit_All_error.getVal() )
-
-    # get shift
-
-    nFit_SR_shift_par1 = max( abs( N_fit_par1_plus - N_fit_central ) , abs( N_fit_central - N_fit_par1_minus) )
-    nFit_SR_shift_par2 = max( abs( N_fit_par2_plus - N_fit_central ) , abs( N_fit_central - N_fit_par2_minus) )
-
-    # row matirx * correlation matrix * column matrix
-
-    rowM = TMatrixD(1,2)
-    rowM[0][0] = nFit_SR_shift_par1
-    rowM[0][1] = nFit_SR_shift_par2
+    floating = fit_result.floatParsFinal()
+    for i in range(floating.getSize()):
+        if params.find(floating.at(i).GetName()): params.find(floating.at(i).GetName()).setVal(floating.at(i).getVal())
 
-    colM = TMatrixD(2,1)
-    colM[0][0] = nFit_SR_shift_par1
-    colM[1][0] = nFit_SR_shift_par2
+    N_fit_central = N_fit()
 
-#    cor.Print()
-#    rowM.Print()
-#    colM.Print()
+    # shift of N_fit for +-1 sigma of each parameter, with the correlation matrix of the fit
 
-    resultM = rowM * ( cor * colM )
-    sigma_Fit = math.sqrt( pow( resultM(0,0) , 2 ) )
+    sigma_Fit = propagatedError(N_fit, fit_result, params)
     return (N_fit_central,sigma_Fit)
 
     # ======   END Get_Fit_Sigma  ======
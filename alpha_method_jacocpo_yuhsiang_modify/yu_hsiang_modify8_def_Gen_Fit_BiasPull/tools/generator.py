@@ -0,0 +1,60 @@
+#! /usr/bin/env python
+
+import numpy as np
+from ROOT import gRandom, RooFit, RooArgSet, RooDataSet
+
+# root_numpy turns the generated arrays into a tree in one go, without it the events are added one by one
+try:
+    from root_numpy import array2tree
+except ImportError:
+    array2tree = None
+
+
+##########################
+# INVERSE-CDF GENERATION #
+##########################
+
+# Events of a pdf with fixed parameters, generated by inverting its cumulative distribution instead of the accept-reject
+# of RooAbsPdf.generate: the pdf is tabulated once on a fine grid over the range of the observable, and the events of a toy
+# (or of a batch of toys) are drawn with a single searchsorted on the cumulative, linear between the grid points.
+# The uniform numbers come from gRandom, so the toys follow the seeds of tools/toys.py.
+class InverseCDF:
+
+    def __init__(self, pdf, var, points=20000):
+        self.var = var
+        self.x = np.linspace(var.getMin(), var.getMax(), points+1)
+        old, args = var.getVal(), RooArgSet(var)
+        f = np.zeros(len(self.x))
+        for i, xi in enumerate(self.x):
+            var.setVal(xi)
+            f[i] = pdf.getVal(args)
+        var.setVal(old)
+        cdf = np.concatenate([[0.], np.cumsum((f[1:] + f[:-1])/2.*np.diff(self.x))])
+        self.cdf = cdf/cdf[-1]
+
+    def generate(self, n):
+        u = np.zeros(n)
+        if n > 0: gRandom.RndmArray(n, u)
+        i = np.clip(np.searchsorted(self.cdf, u, side='right'), 1, len(self.cdf)-1)
+        dc = self.cdf[i] - self.cdf[i-1]
+        t = np.where(dc > 0., (u - self.cdf[i-1])/np.where(dc > 0., dc, 1.), 0.5)
+        return self.x[i-1] + t*(self.x[i] - self.x[i-1])
+
+    # Events of several toys drawn at once, split by toy
+    def generateBatch(self, counts):
+        return np.split(self.generate(int(np.sum(counts))), np.cumsum(counts)[:-1])
+
+
+# Unweighted RooDataSet of the values x of var
+def arrayDataSet(name, var, x):
+    if array2tree is not None:
+        tree = array2tree(np.array(x, dtype=[(var.GetName(), np.float64)]), name="tree_"+name)
+        return RooDataSet(name, name, RooArgSet(var), RooFit.Import(tree))
+    args = RooArgSet(var)
+    data = RooDataSet(name, name, args)
+    old = var.getVal()
+    for xi in x:
+        var.setVal(xi)
+        data.add(args)
+    var.setVal(old)
+    return data
@@ -0,0 +1,126 @@
+#! /usr/bin/env python
+
+import math
+from collections import OrderedDict
+
+
+########################
+# NORMALIZED INTEGRALS #
+########################
+
+# Fraction of a jet mass model in each named range (e.g. "LSBrange,HSBrange", "SRrange"), normalized over the full range
+# of the observable as createIntegral(x, RooFit.NormSet(x), RooFit.Range(r)) does. All the ranges are computed in one call
+# and memoized on the model and the values of its parameters, so that calling again after setVal() to the same point is free.
+# Shapes with a closed form (EXP, GAUS, ERFEXP, given with their parameters in the same order as in the constructor, or
+# recognized from the class of the model) are integrated analytically, the other models through integral objects created
+# only once per model and range. Both memos keep only the MAXCACHE entries used last, so that toys do not fill them up.
+
+MAXCACHE = 1000
+
+cache = OrderedDict()
+integrals = OrderedDict()
+
+def rangeIntegrals(model, x, ranges, kind=None, pars=[]):
+    from ROOT import AddressOf, RooFit, RooArgSet
+    if kind is None: kind, pars = closedForm(model, x)
+    xArg = RooArgSet(x)
+    params = model.getParameters(xArg)
+    it = params.createIterator()
+    p, values = it.Next(), []
+    while p:
+        values.append((p.GetName(), p.getVal()))
+        p = it.Next()
+    key = (model.GetName(), kind, tuple(sorted(values)), tuple([(r, bounds(x, r)) for r in ranges]))
+    if key in cache: return remember(cache, key, cache.pop(key))
+
+    result = {}
+    if kind in closedForms:
+        pv = [v.getVal() for v in pars]
+        # every primitive is divided by the exponential of the largest exponent over the full range, which cancels in the ratio
+        shift = exponents[kind](x.getMin(), x.getMax(), *pv)
+        total = closedForms[kind](x.getMin(), x.getMax(), *pv, shift=shift)
+        for r in ranges: result[r] = sum([closedForms[kind](a, b, *pv, shift=shift) for a, b in bounds(x, r)])/total
+    else:
+        # The model is kept together with its integrals, so that its address cannot be taken by a new model with the same name
+        for r in ranges:
+            ikey = (model.GetName(), AddressOf(model)[0], r)
+            remember(integrals, ikey, integrals.pop(ikey) if ikey in integrals else (model, model.createIntegral(xArg, RooFit.NormSet(xArg), RooFit.Range(r))))
+            result[r] = integrals[ikey][1].getVal()
+    return remember(cache, key, result)
+
+
+def remember(memo, key, value):
+    memo[key] = value
+    while len(memo) > MAXCACHE: memo.popitem(last=False)
+    return value
+
+
+# Closed form of a model from its class, the parameters being the servers after the observable, in constructor order
+def closedForm(model, x):
+    kind = classForms.get(model.ClassName())
+    if kind is None: return None, []
+    it = model.serverIterator()
+    s, pars = it.Next(), []
+    while s:
+        if s.GetName() != x.GetName(): pars.append(s)
+        s = it.Next()
+    return kind, pars
+
+
+# Boundaries of a (comma separated list of) named range(s)
+def bounds(x, r):
+    return tuple([(x.getMin(n), x.getMax(n)) for n in r.split(',')])
+
+
+# Primitive of the shapes, up to a constant factor, between a and b
+
+def intExp(a, b, c, shift=0.):
+    a, b, c = float(a), float(b), float(c)
+    if c == 0: return (b - a)*math.exp(-shift)
+    return (math.exp(c*b - shift) - math.exp(c*a - shift))/c
+
+def intGaus(a, b, mean, sigma, shift=0.):
+    a, b, mean, sigma = float(a), float(b), float(mean), float(sigma)
+    return (math.erf((b-mean)/(math.sqrt(2.)*sigma)) - math.erf((a-mean)/(math.sqrt(2.)*sigma)))/2.*math.exp(-shift)
+
+# exp(c*x)*(1+erf((x-offset)/width))/2, with the same protections as RooErfExpPdf. The term exp(c*offset + c^2*width^2/4)*erf(z)
+# of the primitive is written with erfcx, so that its exponent becomes c*t - u^2: the constant dropped from erf(z) = +-(1 - erfc(+-z))
+# is added back when z changes sign between a and b
+def intErfExp(a, b, c, offset, width, shift=0.):
+    a, b, c, offset, width = float(a), float(b), float(c), float(offset), max(float(width), 1.e-2)
+    if c == 0: c = -1.e-7
+    def F(t):
+        u = (t-offset)/width
+        z = u - c*width/2.
+        e = math.exp(c*t - shift)*math.erfc(-u)
+        if z >= 0: e += math.exp(c*t - u*u - shift)*erfcx(z)
+        else: e -= math.exp(c*t - u*u - shift)*erfcx(-z)
+        return e/(2.*c)
+    za, zb = (a-offset)/width - c*width/2., (b-offset)/width - c*width/2.
+    jump = -math.exp(c*offset + c*c*width*width/4. - shift)/c if za < 0 <= zb else 0.
+    return F(b) - F(a) + jump
+
+# exp(x^2)*erfc(x) for x >= 0, with the asymptotic expansion where erfc underflows
+def erfcx(x):
+    if x < 20.: return math.exp(x*x)*math.erfc(x)
+    return (1. - 1./(2.*x*x) + 3./(4.*x**4) - 15./(8.*x**6))/(x*math.sqrt(math.pi))
+
+
+closedForms = {
+    'EXP' : intExp,
+    'GAUS' : intGaus,
+    'ERFEXP' : intErfExp,
+}
+
+# Largest exponent of the primitives between lo and hi
+exponents = {
+    'EXP' : lambda lo, hi, c: max(c*lo, c*hi),
+    'GAUS' : lambda lo, hi, mean, sigma: 0.,
+    'ERFEXP' : lambda lo, hi, c, offset, width: max(c*lo, c*hi),
+}
+
+classForms = {
+    'RooExponential' : 'EXP',
+    'RooGaussian' : 'GAUS',
+    'RooErfExpPdf' : 'ERFEXP',
+}
@@ -0,0 +1,107 @@
+#! /usr/bin/env python
+
+import os, hashlib, multiprocessing
+
+
+##############
+# TOY RUNNER #
+##############
+
+# The toys of a bias/pull study are spread over a process pool. Before each toy the random generators (gRandom, used for the
+# Poisson number of events, and the RooFit one, used by generate) are seeded from the study name and the toy index only,
+# so the result of a toy does not depend on the process or on the toys before it, and any toy can be replayed alone.
+# toy(index) generates and fits one toy and returns a dict of numbers (bias, pull, status, parameters, ...), which is
+# what comes back from the workers; the pool inherits toy and everything it uses.
+
+# Inherited by the workers
+state = {}
+
+
+def toySeed(study, index):
+    return int(hashlib.md5("%s/%d" % (study, index)).hexdigest()[:8], 16) % 2147483647 + 1
+
+
+def setSeed(seed):
+    from ROOT import gRandom, RooRandom
+    gRandom.SetSeed(seed)
+    RooRandom.randomGenerator().SetSeed(seed)
+
+
+def replayToy(toy, study, index):
+    seed = toySeed(study, index)
+    setSeed(seed)
+    record = toy(index)
+    record.update({"index" : index, "seed" : seed})
+    return record
+
+
+def runToy(index):
+    return replayToy(state['toy'], state['study'], index)
+
+
+# Results file: a header with the columns, then one line per toy (index, seed, status, bias, pull and the fitted parameters),
+# appended and flushed as soon as the toy is done, so a crashed or killed study keeps the toys done so far
+def resultColumns(record):
+    return ["index", "seed", "status", "bias", "pull"] + sorted(record["parameters"].keys())
+
+
+def writeResult(f, columns, record):
+    f.write("\t".join([repr(record[c] if c in record else record["parameters"][c]) for c in columns]) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# Records of one or more results files, in the order of the indices (a line cut by a crash is skipped)
+def readResults(paths):
+    records = {}
+    for path in paths:
+        lines = open(path).read().split("\n")
+        columns = lines[0].split()
+        for line in lines[1:-1]:
+            values = line.split("\t")
+            if len(values) != len(columns): continue
+            record = {"parameters" : {}}
+            for c, v in zip(columns, values):
+                if c in ["index", "seed", "status"]: record[c] = int(v)
+                elif c in ["bias", "pull"]: record[c] = float(v)
+                else: record["parameters"][c] = float(v)
+            records[record["index"]] = record
+    return [records[i] for i in sorted(records.keys())]
+
+
+# Records of the toys, in the order of the indices. With a results file every toy is written there when done, and with
+# resume=True the toys already in the file are not run again; an existing file is only replaced with overwrite=True.
+# stop(record) is called on the records in the order of the indices (the ones read back first), and the study ends at
+# the first toy for which it returns True: the toys that are kept do not depend on the number of processes
+def runToys(toy, study, indices, jobs=0, results=None, resume=False, stop=None, overwrite=False):
+    if results and os.path.exists(results) and not resume and not overwrite: raise IOError("Results file %s already exists, resume or overwrite it" % results)
+    done = dict([(r["index"], r) for r in readResults([results])]) if results and resume and os.path.exists(results) else {}
+    if stop:
+        for i in sorted(done.keys()):
+            if stop(done[i]): return [done[j] for j in sorted(done.keys()) if j <= i]
+    todo = [i for i in indices if not i in done]
+    columns = open(results).readline().split() if len(done) > 0 else None
+    # the toys already done are written again, without the line of a toy cut by a crash, to a new file that then replaces
+    # the results in one rename: a crash at any time leaves the toys done so far in the results file
+    if len(done) > 0:
+        with open(results + ".tmp", "w") as g:
+            g.write("\t".join(columns) + "\n")
+            for i in sorted(done.keys()): writeResult(g, columns, done[i])
+        os.rename(results + ".tmp", results)
+    f = open(results, "a" if len(done) > 0 else "w") if results else None
+
+    state.update({'toy' : toy, 'study' : study})
+    pool = multiprocessing.Pool(jobs if jobs > 0 else multiprocessing.cpu_count())
+    records = []
+    for record in pool.imap(runToy, todo, chunksize=1):
+        if f:
+            if columns is None:
+                columns = resultColumns(record)
+                f.write("\t".join(columns) + "\n")
+            writeResult(f, columns, record)
+        records.append(record)
+        if stop and stop(record): break
+    pool.terminate()
+    pool.join()
+    if f: f.close()
+    return sorted([done[i] for i in indices if i in done] + records, key=lambda r: r["index"])